@@ -1 +1,2 @@
-from .server import router as server_router
\ No newline at end of file
+from .server import router as server_router
+from .health import router as health_router
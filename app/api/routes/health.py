@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Request, Response
+
+from app.core.events import is_ready
+
+
+router = APIRouter(prefix="/health")
+
+LIVE_BODY = b'{"status":"alive"}'
+READY_BODY = b'{"status":"ready"}'
+STARTING_BODY = b'{"status":"starting"}'
+DRAINING_BODY = b'{"status":"draining"}'
+
+
+@router.get("/live")
+async def get_liveness():
+    """The process is up and its event loop answers, the databases don't matter here"""
+    return Response(LIVE_BODY, media_type="application/json")
+
+
+@router.get("/ready")
+async def get_readiness(request: Request):
+    """200 while the service takes traffic and every backend passes its probes, 503 otherwise"""
+    state = request.app.state
+    if not is_ready(request.app):
+        body = DRAINING_BODY if getattr(state, "draining", False) else STARTING_BODY
+        return Response(body, status_code=503, media_type="application/json")
+    prober = getattr(state, "health_prober", None)
+    if prober is None:
+        return Response(READY_BODY, media_type="application/json")
+    return Response(prober.body, status_code=200 if prober.healthy else 503, media_type="application/json")
@@ -1,8 +1,14 @@
 import logging
+import secrets
+
+from fastapi import APIRouter, Request
+from starlette.concurrency import run_in_threadpool
 
-from fastapi import APIRouter
 from app.core.config import settings
+from app.core.db import db_connections
+from app.core.metrics import render_prometheus
 from app.core.response_factory import ResponseFactory
+from app.core.status import status_responses
 from app.models.responses import VersionResponse, StatusResponse
 
 router = APIRouter(prefix="/server")
@@ -12,29 +18,85 @@ logger = logging.getLogger(__name__)
 
 
 @router.get("/version", response_model=VersionResponse)
-def get_server_version():
-    try:
-        version_response = VersionResponse(
-            name=settings.server_name,
-            version=settings.version
-        )
-        logger.info(f"VR: {version_response.to_dict()}")
-        response = ResponseFactory.json_response(
-            version_response
-        )
-        logger.info(f"Response: {response}")
-        return response
-    except Exception as e:
-        logger.error(f"Exception", exc_info=True)
-        raise e
+async def get_server_version(request: Request):
+    version_body, _ = status_responses(request.app)
+    return version_body.response()
+
 
 @router.get("/status", response_model=StatusResponse)
-def get_server_version():
-    logger.info(f"DBS: {settings.databases.keys()}")
-    return ResponseFactory.json_response(
-        StatusResponse(
-            name=settings.server_name,
-            version=settings.version,
-            services=list(settings.databases.keys())
-        ).to_dict()
+async def get_server_status(request: Request):
+    _, status_body = status_responses(request.app)
+    return status_body.response()
+
+
+def _connection_managers(request: Request):
+    return {db: getattr(request.app.state, db) for db in db_connections if getattr(request.app.state, db, None)}
+
+
+@router.get("/databases")
+async def get_database_settings(request: Request):
+    """Effective connection and pool settings of every connected database"""
+    return ResponseFactory.json_response({
+        db: manager.describe() for db, manager in _connection_managers(request).items()
+    })
+
+
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    """Request latency and connection pool metrics in Prometheus text format"""
+    return ResponseFactory.text_response(
+        render_prometheus(
+            _connection_managers(request),
+            getattr(request.app.state, "health_prober", None),
+            getattr(request.app.state, "concurrency_limiter", None),
+            getattr(request.app.state, "loop_monitor", None)
+        ),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
     )
+
+
+def _authorized(request: Request, token) -> bool:
+    """Whether the request sends token as a bearer token"""
+    value = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not token or not value:
+        return False
+    return secrets.compare_digest(token.encode(), value.encode())
+
+
+@router.get("/loop")
+async def get_loop_stalls(request: Request):
+    """Event loop lag, threadpool use and the stacks of the last event loop stalls"""
+    loop_monitor = getattr(request.app.state, "loop_monitor", None)
+    if loop_monitor is None or not _authorized(request, settings.loop_monitor_token):
+        return ResponseFactory.error_json_response("Not found", status_code=404)
+    return ResponseFactory.json_response(loop_monitor.to_dict())
+
+
+def _profile_store(request: Request):
+    """
+    The store of request profiles, None unless profiling is on and the request is authorized
+    with the profiler token as a bearer token (not in X-Profile, that would profile it)
+    """
+    store = getattr(request.app.state, "profile_store", None)
+    if store is None or not _authorized(request, settings.profiler_token):
+        return None
+    return store
+
+
+@router.get("/profiles")
+async def list_profiles(request: Request):
+    """Names of the saved request profiles, oldest first"""
+    store = _profile_store(request)
+    if store is None:
+        return ResponseFactory.error_json_response("Not found", status_code=404)
+    return ResponseFactory.json_response({"profiles": await run_in_threadpool(store.list)})
+
+
+@router.get("/profiles/{name}")
+async def get_profile(name: str, request: Request):
+    """A saved request profile in speedscope format, it opens in https://www.speedscope.app"""
+    store = _profile_store(request)
+    path = store.path(name) if store is not None else None
+    if path is None:
+        return ResponseFactory.error_json_response("Not found", status_code=404)
+    return ResponseFactory.file_response(path, filename=name, media_type="application/json")
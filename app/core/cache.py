@@ -0,0 +1,259 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+import string
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Optional, Tuple, Union
+
+import ujson as json
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.response_factory import ResponseFactory
+
+
+logger = logging.getLogger(__name__)
+
+# Namespace of cached responses in Redis
+KEY_PREFIX = "cache:"
+
+# Injected into handlers that don't take the Request themselves
+CACHE_REQUEST_PARAM = "_cache_request"
+
+
+class CacheEntry:
+    """A response serialized once, stored and served as bytes"""
+    __slots__ = ("status_code", "headers", "body", "etag", "expires_at")
+
+    def __init__(self, status_code: int, headers: list, body: bytes, etag: str = None, expires_at: float = 0.0):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag or '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_response(cls, response: Response) -> Optional["CacheEntry"]:
+        """Entry for a response, or None if it must not be cached (errors, streams, cookies)"""
+        if response.status_code != 200 or not hasattr(response, "body"):
+            return None
+        headers = []
+        for name, value in response.raw_headers:
+            name = name.decode("latin-1")
+            if name == "set-cookie":
+                return None
+            if name != "content-length":
+                headers.append([name, value.decode("latin-1")])
+        return cls(response.status_code, headers, response.body)
+
+    def to_bytes(self) -> bytes:
+        meta = json.dumps({"status_code": self.status_code, "headers": self.headers, "etag": self.etag})
+        return meta.encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CacheEntry":
+        meta, body = data.split(b"\n", 1)
+        meta = json.loads(meta)
+        return cls(meta["status_code"], meta["headers"], body, meta["etag"])
+
+    def to_response(self, if_none_match: Optional[str] = None, cache_status: str = "HIT") -> Response:
+        if if_none_match and (if_none_match.strip() == "*" or self.etag in
+                              (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+            return Response(status_code=304, headers={"ETag": self.etag, "X-Cache": cache_status})
+        response = Response(content=self.body, status_code=self.status_code)
+        response.raw_headers.extend(
+            (name.encode("latin-1"), value.encode("latin-1")) for name, value in self.headers
+            if name not in ("etag", "x-cache")
+        )
+        response.raw_headers.append((b"etag", self.etag.encode("latin-1")))
+        response.raw_headers.append((b"x-cache", cache_status.encode("latin-1")))
+        return response
+
+
+class ResponseCache:
+    """
+    Two tier response cache: an in-process LRU in front of Redis.
+
+    Concurrent misses for the same key share one recompute. The local tier keeps
+    entries for at most local_ttl so invalidations made by other workers only
+    linger that long. The backend is anything with the RedisConnectionManager
+    get_bytes/set/delete_by_prefix methods, or None to only cache locally.
+    """
+
+    def __init__(self, max_entries: int = 1024, local_ttl: float = 1.0):
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._in_flight = {}
+
+    def _local_get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _local_put(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        entry.expires_at = time.monotonic() + min(ttl, self.local_ttl)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _remote_get(self, backend, key: str) -> Optional[CacheEntry]:
+        if backend is None:
+            return None
+        try:
+            data = await backend.get_bytes(KEY_PREFIX + key)
+        except Exception:
+            logger.warning("Response cache read of %s failed", key, exc_info=True)
+            return None
+        return CacheEntry.from_bytes(data) if data else None
+
+    async def _remote_put(self, backend, key: str, entry: CacheEntry, ttl: float) -> None:
+        if backend is None:
+            return
+        try:
+            await backend.set(KEY_PREFIX + key, entry.to_bytes(), ex=max(int(ttl), 1))
+        except Exception:
+            logger.warning("Response cache write of %s failed", key, exc_info=True)
+
+    async def get_or_compute(
+            self,
+            backend,
+            key: str,
+            ttl: float,
+            compute: Callable[[], Awaitable[Tuple[Response, Optional[CacheEntry]]]]
+    ) -> Tuple[Response, Optional[CacheEntry], str]:
+        """
+        Return (response, entry, cache status) for key, running compute on a miss.
+        compute returns the handler's response and its entry, None when it can't be cached,
+        in which case the response is returned as is.
+        """
+        entry = self._local_get(key)
+        if entry is not None:
+            return None, entry, "HIT"
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            entry = await asyncio.shield(in_flight)
+            if entry is not None:
+                return None, entry, "HIT"
+            response, entry = await compute()
+            return response, entry, "MISS"
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            entry = await self._remote_get(backend, key)
+            if entry is not None:
+                self._local_put(key, entry, ttl)
+                future.set_result(entry)
+                return None, entry, "HIT"
+            response, entry = await compute()
+            if entry is not None:
+                self._local_put(key, entry, ttl)
+                await self._remote_put(backend, key, entry, ttl)
+            future.set_result(entry)
+            return response, entry, "MISS"
+        except BaseException:
+            # Waiters recompute themselves rather than sharing the failure
+            if not future.done():
+                future.set_result(None)
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def invalidate(self, backend, prefix: str) -> int:
+        """Drop every cached response whose key starts with prefix, locally and in Redis"""
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+        if backend is None:
+            return 0
+        return await backend.delete_by_prefix(KEY_PREFIX + prefix)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+response_cache = ResponseCache(settings.cache_max_entries, settings.cache_local_ttl)
+
+
+def _backend(request: Request):
+    return getattr(request.app.state, "redis", None)
+
+
+def _build_key(request: Request, key: Union[None, str, Callable[[Request], str]]) -> str:
+    if key is None:
+        query = request.url.query
+        return f"{request.url.path}?{query}" if query else request.url.path
+    if callable(key):
+        return key(request)
+    # Path parameters win over query parameters of the same name, missing ones are left empty
+    params = defaultdict(str, request.query_params)
+    params.update(request.path_params)
+    return string.Formatter().vformat(key, (), params)
+
+
+def cached(ttl: float, key: Union[None, str, Callable[[Request], str]] = None):
+    """
+    Cache a route handler's response for ttl seconds.
+
+    The handler should return a Response or JSON-able content, only 200 responses
+    without cookies are cached. Cached responses are served with an ETag and
+    requests whose If-None-Match matches get a 304.
+
+    Args:
+        ttl: Seconds the response is cached for
+        key: Cache key, a format string filled from path and query parameters
+            (e.g. "user:{user_id}:{page}", missing ones are left empty), a callable
+            taking the Request, or by default the request path and query string
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        request_param = next(
+            (name for name, param in signature.parameters.items() if param.annotation is Request), None
+        )
+        if request_param is None:
+            signature = signature.replace(parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter(CACHE_REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+            ])
+        is_coroutine = asyncio.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs[request_param] if request_param else kwargs.pop(CACHE_REQUEST_PARAM)
+
+            async def compute():
+                if is_coroutine:
+                    result = await func(*args, **kwargs)
+                else:
+                    result = await run_in_threadpool(func, *args, **kwargs)
+                if not isinstance(result, Response):
+                    result = ResponseFactory.json_response(result)
+                return result, CacheEntry.from_response(result)
+
+            response, entry, cache_status = await response_cache.get_or_compute(
+                _backend(request), _build_key(request, key), ttl, compute
+            )
+            if entry is None:
+                return response
+            return entry.to_response(request.headers.get("if-none-match"), cache_status)
+
+        wrapper.__signature__ = signature
+        return wrapper
+    return decorator
+
+
+async def invalidate(request: Request, prefix: str) -> int:
+    """Invalidate every cached response whose key starts with prefix"""
+    return await response_cache.invalidate(_backend(request), prefix)
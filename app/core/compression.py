@@ -0,0 +1,151 @@
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+DEFAULT_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+
+# Content types worth compressing, anything else (images, archives...) is already compressed
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript",
+    "application/xml", "application/problem+json", "image/svg+xml",
+)
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """Emit everything compressed so far, so a streamed chunk can be decoded on arrival"""
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Preferred first, the codecs whose library isn't installed are left out
+ENCODERS = {
+    name: encoder for name, encoder, available in (
+        ("zstd", ZstdEncoder, zstandard is not None),
+        ("br", BrotliEncoder, brotli is not None),
+        ("gzip", GzipEncoder, True),
+    ) if available
+}
+
+
+def compress(encoding: str, level: int, body: bytes) -> bytes:
+    """Compress a whole body in one go"""
+    encoder = ENCODERS[encoding](level)
+    return encoder.compress(body) + encoder.finish()
+
+
+def negotiate(accept_encoding: str, encodings: Iterable[str]) -> Optional[str]:
+    """
+    The first of encodings (in server preference order) the client accepts, by its
+    Accept-Encoding q-values. None when the identity encoding should be sent.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressedBodyCache:
+    """
+    LRU of compressed bodies by (resource, ETag, encoding, level), so responses that carry an
+    ETag (cached responses, files, precomputed bodies) are compressed once and then reused.
+    The resource (path and query) is part of the key since an ETag only identifies a
+    representation of one resource, two routes may well both send "v1".
+    """
+
+    def __init__(self, max_entries: int = 256, max_body_size: int = 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_body_size = max_body_size
+        self.hits = 0
+        self._entries: "OrderedDict[Tuple[str, str, str, int], bytes]" = OrderedDict()
+
+    def get(self, resource: str, etag: str, encoding: str, level: int) -> Optional[bytes]:
+        key = (resource, etag, encoding, level)
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return body
+
+    def put(self, resource: str, etag: str, encoding: str, level: int, body: bytes):
+        if len(body) > self.max_body_size:
+            return
+        self._entries[(resource, etag, encoding, level)] = body
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def route_levels(levels: Dict[str, int], overrides: Optional[Dict[str, int]]) -> Dict[str, int]:
+    """
+    Levels per encoding for a route, in the server's preference order. A level of 0 turns
+    that encoding off, overrides for codecs that aren't installed are ignored.
+    """
+    if not overrides:
+        return levels
+    merged = {**levels, **overrides}
+    return {encoding: merged[encoding] for encoding in ENCODERS if merged.get(encoding, 0) > 0}
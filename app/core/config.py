@@ -1,3 +1,12 @@
+from functools import lru_cache
+
 from app.models.settings import Settings
 
-settings = Settings()
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """The process wide Settings, read from the environment and .env once"""
+    return Settings()
+
+
+settings = get_settings()
@@ -1,8 +1,20 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+
+from app.core.databases.resilience import CircuitBreaker, CircuitOpenError, OperationTimeoutError, RetryPolicy
+from app.core.metrics import PoolStats
 
 
 class BaseConnectionManager(ABC):
-    def __init__(self, user, password, port, db_name, host=None, min_pool_size=5, max_pool_size=10, idle_timeout=300.0):
+    # Errors that mean the backend is unreachable or overloaded, rather than a bad query
+    transient_errors = (ConnectionError, OSError, asyncio.TimeoutError)
+
+    def __init__(self, user, password, port, db_name, host=None, min_pool_size=5, max_pool_size=10, idle_timeout=300.0,
+                 acquire_timeout=10.0, command_timeout=None, statement_cache_size=100, keepalive=True,
+                 operation_timeout=10.0, retry_attempts=3, retry_base_delay=0.05, retry_max_delay=1.0,
+                 breaker_failure_threshold=5, breaker_reset_timeout=30.0):
         self.name = self._get_name()
         self.host = host if host else self.name
         self.port = port
@@ -10,10 +22,19 @@ class BaseConnectionManager(ABC):
         self.min_pool_size = min_pool_size
         self.max_pool_size = max_pool_size
         self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.command_timeout = command_timeout
+        self.statement_cache_size = statement_cache_size
+        self.keepalive = keepalive
+        self.operation_timeout = operation_timeout
+        self.retry = RetryPolicy(retry_attempts, retry_base_delay, retry_max_delay)
+        self.pool_stats = PoolStats()
         self.pool = None
+        self.client = None
         self._user = user
         self._password = password
         self.uri = self._build_uri()
+        self.breaker = CircuitBreaker(self.name, breaker_failure_threshold, breaker_reset_timeout)
 
     @abstractmethod
     def _get_name(self):
@@ -23,6 +44,98 @@ class BaseConnectionManager(ABC):
     def _build_uri(self):
         return f"{self.name}://{self._user}:{self._password}@{self.host}:{self.port}/{self.db_name}"
 
+    def describe(self):
+        """Return the effective connection and pool settings, without credentials"""
+        return {
+            "name": self.name,
+            "host": self.host,
+            "port": self.port,
+            "db_name": self.db_name,
+            "min_pool_size": self.min_pool_size,
+            "max_pool_size": self.max_pool_size,
+            "acquire_timeout": self.acquire_timeout,
+            "command_timeout": self.command_timeout,
+            "idle_timeout": self.idle_timeout,
+            "statement_cache_size": self.statement_cache_size,
+            "keepalive": self.keepalive,
+            "operation_timeout": self.operation_timeout,
+            "retry_attempts": self.retry.attempts,
+            "breaker_failure_threshold": self.breaker.failure_threshold,
+            "breaker_reset_timeout": self.breaker.reset_timeout,
+        }
+
+    def _pool_size(self):
+        """Number of connections the driver currently has open"""
+        return self.pool_stats.in_use
+
+    def stats(self):
+        """Uniform snapshot of the pool, whatever the driver"""
+        size = self._pool_size()
+        in_use = self.pool_stats.in_use
+        return {
+            "size": size,
+            "in_use": in_use,
+            "idle": max(size - in_use, 0),
+            "waiters": self.pool_stats.waiters,
+            "errors": self.pool_stats.errors,
+            "acquire_wait": self.pool_stats.acquire_wait.snapshot(),
+            "breaker": self.breaker.to_dict(),
+        }
+
+    @asynccontextmanager
+    async def _guard(self):
+        """
+        Run a block under the circuit breaker: fail fast while it is open and count
+        transient errors against the backend. Other errors (a bad query, a duplicate key)
+        show the backend is answering and count as successes.
+        """
+        self.breaker.before_call()
+        try:
+            yield
+        except self.transient_errors:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.record_cancelled()
+            raise
+        self.breaker.record_success()
+
+    async def _call(self, operation, idempotent=False, timeout=None):
+        """
+        Await operation(), a coroutine function, under the circuit breaker and a deadline of
+        timeout seconds (operation_timeout by default). Idempotent operations are retried on
+        transient errors with jittered exponential backoff, all attempts share the one deadline.
+        """
+        timeout = self.operation_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self._guard():
+                    if deadline is None:
+                        return await operation()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise OperationTimeoutError(f"{self.name} operation timed out after {timeout}s")
+                    try:
+                        return await asyncio.wait_for(operation(), remaining)
+                    except asyncio.TimeoutError:
+                        raise OperationTimeoutError(f"{self.name} operation timed out after {timeout}s") from None
+            except CircuitOpenError:
+                raise
+            except self.transient_errors:
+                # No point retrying once this failure opened the breaker
+                if not idempotent or attempt >= self.retry.attempts or self.breaker.state == CircuitBreaker.OPEN:
+                    raise
+                delay = self.retry.delay(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                await asyncio.sleep(delay)
+
     @abstractmethod
     async def connect(self):
         """Connect to the database"""
@@ -31,4 +144,17 @@ class BaseConnectionManager(ABC):
     @abstractmethod
     async def close(self):
         """Close the database connection"""
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    async def ping(self):
+        """Make a round trip to the database over one pooled connection"""
+        pass
+
+    async def warm_up(self):
+        """
+        Connect and ping over min_pool_size connections concurrently so the pool is
+        filled before the first request instead of paying handshakes on demand
+        """
+        await self.connect()
+        await asyncio.gather(*(self.ping() for _ in range(max(self.min_pool_size, 1))))
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+
+import bson
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriteSummary:
+    """Results of every bulk_write batch a flush sent, with error indexes relative to the whole flush"""
+
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_count = 0
+        self.upserted_ids = {}
+        self.write_errors = []
+        self.write_concern_errors = []
+        self.unprocessed_count = 0
+        self.batches = 0
+        # Operations the summary covers, the offset of the next flush's indexes in totals
+        self.operations = 0
+
+    @property
+    def ok(self):
+        return not self.write_errors and not self.write_concern_errors and not self.unprocessed_count
+
+    def add_batch(self, raw, offset):
+        """Merge a bulk_api_result (or BulkWriteError.details) of a batch starting at offset"""
+        self.batches += 1
+        self.inserted_count += raw.get("nInserted", 0)
+        self.matched_count += raw.get("nMatched", 0)
+        self.modified_count += raw.get("nModified", 0)
+        self.deleted_count += raw.get("nRemoved", 0)
+        self.upserted_count += raw.get("nUpserted", 0)
+        for upserted in raw.get("upserted", []):
+            self.upserted_ids[offset + upserted["index"]] = upserted["_id"]
+        for error in raw.get("writeErrors", []):
+            # The failed operation itself is left out so large documents aren't kept around
+            self.write_errors.append({
+                "index": offset + error["index"], "code": error.get("code"), "errmsg": error.get("errmsg")
+            })
+        self.write_concern_errors.extend(raw.get("writeConcernErrors", []))
+
+    def merge(self, other):
+        """Add the summary of the next flush, its indexes are shifted past the operations covered so far"""
+        self.inserted_count += other.inserted_count
+        self.matched_count += other.matched_count
+        self.modified_count += other.modified_count
+        self.deleted_count += other.deleted_count
+        self.upserted_count += other.upserted_count
+        for index, upserted_id in other.upserted_ids.items():
+            self.upserted_ids[self.operations + index] = upserted_id
+        self.write_errors.extend({**error, "index": self.operations + error["index"]} for error in other.write_errors)
+        self.write_concern_errors.extend(other.write_concern_errors)
+        self.unprocessed_count += other.unprocessed_count
+        self.batches += other.batches
+        self.operations += other.operations
+
+    def to_dict(self):
+        return {
+            "inserted": self.inserted_count,
+            "matched": self.matched_count,
+            "modified": self.modified_count,
+            "deleted": self.deleted_count,
+            "upserted": self.upserted_count,
+            "unprocessed": self.unprocessed_count,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+        }
+
+
+def _encoded_size(*parts):
+    return sum(len(bson.encode({"_": part})) for part in parts if part is not None)
+
+
+class MongoBulkWriter:
+    """
+    Accumulates mixed insert/update/upsert/replace/delete operations on one collection and
+    sends them with bulk_write in chunks of at most max_batch_ops operations and max_batch_bytes.
+
+    Ordered writers send the chunks one after the other and stop at the first error, unordered
+    writers send up to max_concurrency chunks at once and keep going past errors.
+
+    With flush_interval set the writer is a write-behind buffer: start() flushes in the
+    background every flush_interval seconds and whenever max_batch_ops operations are queued,
+    and close() drains whatever is left.
+
+    Batches that fail with a transient error (the backend unreachable, a timeout, its circuit
+    breaker open) go back to the front of the queue for the next flush, so delivery is at
+    least once: a batch cut off mid write may be applied twice.
+    """
+
+    def __init__(self, manager, collection_name, ordered=False, max_batch_ops=1000,
+                 max_batch_bytes=8 * 1024 * 1024, max_concurrency=4, flush_interval=None):
+        self.manager = manager
+        self.collection_name = collection_name
+        self.ordered = ordered
+        self.max_batch_ops = max_batch_ops
+        self.max_batch_bytes = max_batch_bytes
+        self.max_concurrency = max_concurrency
+        self.flush_interval = flush_interval
+        self.totals = BulkWriteSummary()
+        self._operations = []
+        self._sizes = []
+        self._flush_lock = asyncio.Lock()
+        self._flusher = None
+        self._pending_flushes = set()
+
+    def __len__(self):
+        return len(self._operations)
+
+    def _add(self, operation, size):
+        self._operations.append(operation)
+        self._sizes.append(size)
+        if self._flusher is not None and len(self._operations) >= self.max_batch_ops and not self._pending_flushes:
+            task = asyncio.ensure_future(self._background_flush())
+            self._pending_flushes.add(task)
+            task.add_done_callback(self._pending_flushes.discard)
+
+    def insert(self, document):
+        self._add(InsertOne(document), _encoded_size(document))
+
+    def update(self, filter, update, upsert=False, many=False):
+        operation = UpdateMany if many else UpdateOne
+        self._add(operation(filter, update, upsert=upsert), _encoded_size(filter, update))
+
+    def upsert(self, filter, update):
+        self.update(filter, update, upsert=True)
+
+    def replace(self, filter, document, upsert=False):
+        self._add(ReplaceOne(filter, document, upsert=upsert), _encoded_size(filter, document))
+
+    def delete(self, filter, many=False):
+        operation = DeleteMany if many else DeleteOne
+        self._add(operation(filter), _encoded_size(filter))
+
+    def _batches(self, operations, sizes):
+        """Split operations into (offset, batch) chunks within the op count and byte limits"""
+        start = 0
+        batch_bytes = 0
+        for index, size in enumerate(sizes):
+            if index > start and (index - start >= self.max_batch_ops or batch_bytes + size > self.max_batch_bytes):
+                yield start, operations[start:index]
+                start = index
+                batch_bytes = 0
+            batch_bytes += size
+        if start < len(operations):
+            yield start, operations[start:]
+
+    async def _write(self, collection, offset, batch, summary):
+        """Send one batch under the manager's circuit breaker, False if it had write errors"""
+        try:
+            async with self.manager._guard():
+                result = await collection.bulk_write(batch, ordered=self.ordered)
+            raw = result.bulk_api_result
+        except BulkWriteError as e:
+            summary.add_batch(e.details, offset)
+            return False
+        summary.add_batch(raw, offset)
+        return True
+
+    def _requeue(self, operations, sizes, failed):
+        """Put the operations of the failed (offset, batch) chunks back in front of the queue, in order"""
+        requeued_operations = []
+        requeued_sizes = []
+        for offset, batch in failed:
+            requeued_operations += operations[offset:offset + len(batch)]
+            requeued_sizes += sizes[offset:offset + len(batch)]
+        self._operations[:0] = requeued_operations
+        self._sizes[:0] = requeued_sizes
+
+    async def flush(self):
+        """
+        Send every queued operation, returning the aggregated BulkWriteSummary.
+        Raises the first error that isn't a write error once every batch was tried, the
+        batches that failed transiently are queued again and the others are counted as unprocessed.
+        """
+        async with self._flush_lock:
+            operations, self._operations = self._operations, []
+            sizes, self._sizes = self._sizes, []
+            summary = BulkWriteSummary()
+            if not operations:
+                return summary
+            batches = list(self._batches(operations, sizes))
+            # ((offset, batch), the error it failed with) of each failed batch
+            failed = []
+            try:
+                if self.manager.db is None:
+                    await self.manager.connect()
+                collection = self.manager.db[self.collection_name]
+            except BaseException:
+                self._requeue(operations, sizes, batches)
+                raise
+
+            if self.ordered:
+                for position, (offset, batch) in enumerate(batches):
+                    try:
+                        if not await self._write(collection, offset, batch, summary):
+                            summary.unprocessed_count = sum(len(rest) for _, rest in batches[position + 1:])
+                            break
+                    except Exception as e:
+                        # Later batches depend on this one, they are kept or dropped with it
+                        failed = [(rest, e) for rest in batches[position:]]
+                        break
+            else:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+
+                async def write(offset, batch):
+                    async with semaphore:
+                        return await self._write(collection, offset, batch, summary)
+
+                results = await asyncio.gather(
+                    *(write(offset, batch) for offset, batch in batches), return_exceptions=True
+                )
+                failed = [(batch, result) for batch, result in zip(batches, results)
+                          if isinstance(result, BaseException)]
+
+            # Indexes in totals count every operation a flush took, requeued ones count again
+            summary.operations = len(operations)
+            # Each batch is kept or dropped by its own error
+            transient = [batch for batch, e in failed if isinstance(e, self.manager.transient_errors)]
+            self._requeue(operations, sizes, transient)
+            summary.unprocessed_count += sum(
+                len(batch) for (_, batch), e in failed if not isinstance(e, self.manager.transient_errors)
+            )
+            self.totals.merge(summary)
+            if failed:
+                raise failed[0][1]
+            return summary
+
+    async def _background_flush(self):
+        try:
+            summary = await self.flush()
+        except Exception:
+            logger.error("Write-behind flush to %s failed, %s operations queued for the next one",
+                         self.collection_name, len(self._operations), exc_info=True)
+            return
+        if not summary.ok:
+            logger.warning("Write-behind flush to %s had %s write errors and %s unprocessed operations",
+                           self.collection_name, len(summary.write_errors), summary.unprocessed_count)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Shielded so close() cancelling the loop doesn't lose a batch mid flight
+            await asyncio.shield(self._background_flush())
+
+    def start(self):
+        """Start flushing in the background, only for writers with a flush_interval"""
+        if self.flush_interval is None:
+            raise ValueError("start() needs a flush_interval")
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self):
+        """Stop background flushing and drain the queued operations"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._pending_flushes:
+            await asyncio.gather(*self._pending_flushes, return_exceptions=True)
+        return await self.flush()
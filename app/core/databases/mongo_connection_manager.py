@@ -1,8 +1,77 @@
+import logging
+
 import motor.motor_asyncio
+from pymongo import monitoring
+from pymongo.errors import ConnectionFailure
+
 from app.core.databases.base_connection_manager import BaseConnectionManager
+from app.core.databases.mongo_bulk_writer import MongoBulkWriter
+from app.core.metrics import PoolStats
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Feeds PyMongo's connection pool (CMAP) events into a PoolStats.
+    Events are published from PyMongo's threads, the counters tolerate the rare lost update.
+    """
+
+    def __init__(self, pool_stats: PoolStats):
+        self.pool_stats = pool_stats
+        self.size = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.size += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.size -= 1
+
+    def connection_check_out_started(self, event):
+        self.pool_stats.waiters += 1
+
+    def connection_check_out_failed(self, event):
+        self.pool_stats.waiters -= 1
+        self.pool_stats.errors += 1
+
+    def connection_checked_out(self, event):
+        self.pool_stats.waiters -= 1
+        self.pool_stats.in_use += 1
+        # The checkout duration is only reported by newer PyMongo releases
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            self.pool_stats.acquire_wait.observe(duration)
+
+    def connection_checked_in(self, event):
+        self.pool_stats.released()
 
 
 class MongoConnectionManager(BaseConnectionManager):
+    # AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError and WaitQueueTimeoutError
+    transient_errors = BaseConnectionManager.transient_errors + (ConnectionFailure,)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.db = None
+        self._pool_listener = PoolStatsListener(self.pool_stats)
+        self._write_behind = []
+
     def _get_name(self):
         return "mongodb"
 
@@ -10,63 +79,134 @@ class MongoConnectionManager(BaseConnectionManager):
         auth_part = f"{self._user}:{self._password}@" if self._user and self._password else ""
         return f"mongodb://{auth_part}{self.host}:{self.port}/{self.db_name}"
 
+    def describe(self):
+        # PyMongo always enables TCP keepalive and has no statement cache
+        description = super().describe()
+        description.pop("statement_cache_size")
+        description["keepalive"] = True
+        return description
+
     async def connect(self):
-        if self.pool is None:
+        if self.client is None:
             # Motor doesn't use a traditional connection pool like asyncpg
             # but it does manage connections internally
             client = motor.motor_asyncio.AsyncIOMotorClient(
                 self.uri,
                 maxPoolSize=self.max_pool_size,
                 minPoolSize=self.min_pool_size,
-                maxIdleTimeMS=int(self.idle_timeout * 1000)
+                maxIdleTimeMS=int(self.idle_timeout * 1000),
+                waitQueueTimeoutMS=int(self.acquire_timeout * 1000),
+                socketTimeoutMS=int(self.command_timeout * 1000) if self.command_timeout else None,
+                event_listeners=[self._pool_listener],
             )
             self.client = client
             self.db = client[self.db_name]
         return self.db
 
     async def close(self):
-        if self.client:
-            self.client.close()
-            self.client = None
-            self.db = None
+        # Drain the write-behind buffers while the client can still write
+        writers, self._write_behind = self._write_behind, []
+        try:
+            for writer in writers:
+                try:
+                    summary = await writer.close()
+                except Exception:
+                    logger.error("Final flush to %s failed with %s operations still queued",
+                                 writer.collection_name, len(writer), exc_info=True)
+                    continue
+                if not summary.ok:
+                    logger.warning("Final flush to %s had %s write errors",
+                                   writer.collection_name, len(summary.write_errors))
+        finally:
+            if self.client:
+                self.client.close()
+                self.client = None
+                self.db = None
+
+    def _pool_size(self):
+        return self._pool_listener.size
+
+    async def ping(self):
+        if self.client is None:
+            await self.connect()
+        return await self.client.admin.command("ping")
 
     def get_collection(self, collection_name):
-        if not self.db:
+        if self.db is None:
             raise RuntimeError("Database not connected. Call connect() first.")
         return self.db[collection_name]
 
     async def find_one(self, collection_name, query, *args, **kwargs):
-        if not self.db:
+        if self.db is None:
             await self.connect()
-        return await self.db[collection_name].find_one(query, *args, **kwargs)
+        return await self._call(lambda: self.db[collection_name].find_one(query, *args, **kwargs), idempotent=True)
 
     async def find_many(self, collection_name, query, *args, **kwargs):
-        if not self.db:
+        if self.db is None:
+            await self.connect()
+        return await self._call(
+            lambda: self.db[collection_name].find(query, *args, **kwargs).to_list(length=None), idempotent=True
+        )
+
+    async def iter_many(self, collection_name, query, projection=None, batch_size=500, limit=0, sort=None, **kwargs):
+        """
+        Yield the matching documents one at a time without loading the result set.
+        Documents are fetched batch_size at a time, so memory is bounded by one batch.
+        projection and limit are applied by the server.
+        """
+        if self.db is None:
             await self.connect()
-        cursor = self.db[collection_name].find(query, *args, **kwargs)
-        return await cursor.to_list(length=None)
+        if sort is not None:
+            kwargs["sort"] = sort
+        cursor = self.db[collection_name].find(query, projection, limit=limit, batch_size=batch_size, **kwargs)
+        try:
+            async with self._guard():
+                async for document in cursor:
+                    yield document
+        finally:
+            # Kill the server side cursor when the consumer stops early, e.g. a client disconnect
+            await cursor.close()
+
+    stream = iter_many
 
     async def insert_one(self, collection_name, document):
-        if not self.db:
+        if self.db is None:
             await self.connect()
-        return await self.db[collection_name].insert_one(document)
+        return await self._call(lambda: self.db[collection_name].insert_one(document))
 
     async def insert_many(self, collection_name, documents):
-        if not self.db:
+        if self.db is None:
             await self.connect()
-        return await self.db[collection_name].insert_many(documents)
+        return await self._call(lambda: self.db[collection_name].insert_many(documents))
 
     async def update_one(self, collection_name, filter, update, *args, **kwargs):
-        if not self.db:
+        if self.db is None:
             await self.connect()
-        return await self.db[collection_name].update_one(filter, update, *args, **kwargs)
+        return await self._call(lambda: self.db[collection_name].update_one(filter, update, *args, **kwargs))
+
+    def bulk_writer(self, collection_name, ordered=False, **kwargs):
+        """
+        Writer that accumulates operations and sends them with bulk_write on flush().
+        See MongoBulkWriter for the batching options.
+        """
+        return MongoBulkWriter(self, collection_name, ordered=ordered, **kwargs)
+
+    def write_behind(self, collection_name, flush_interval=1.0, **kwargs):
+        """
+        Bulk writer flushed in the background every flush_interval seconds or once
+        max_batch_ops operations are queued. It is drained when the manager closes.
+        """
+        writer = MongoBulkWriter(self, collection_name, flush_interval=flush_interval, **kwargs)
+        writer.start()
+        self._write_behind.append(writer)
+        return writer
 
     async def delete_one(self, collection_name, filter):
-        if not self.db:
+        if self.db is None:
             await self.connect()
-        return await self.db[collection_name].delete_one(filter)
+        return await self._call(lambda: self.db[collection_name].delete_one(filter))
 
     async def delete_many(self, collection_name, filter):
-        if not self.db:
+        if self.db is None:
             await self.connect()
-        return await self.db[collection_name].delete_many(filter)
\ No newline at end of file
+        return await self._call(lambda: self.db[collection_name].delete_many(filter), idempotent=True)
\ No newline at end of file
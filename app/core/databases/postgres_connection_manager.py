@@ -1,9 +1,24 @@
+from contextlib import asynccontextmanager
+
 import asyncpg
 
 from app.core.databases.base_connection_manager import BaseConnectionManager
 
 
 class PostgresConnectionManager(BaseConnectionManager):
+    transient_errors = BaseConnectionManager.transient_errors + (
+        asyncpg.PostgresConnectionError,
+        asyncpg.exceptions.CannotConnectNowError,
+        asyncpg.exceptions.TooManyConnectionsError,
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # name -> SQL of the queries prepared on every connection
+        self.prepared_queries = {}
+        # backend pid -> {name: PreparedStatement} of each open connection
+        self._prepared = {}
+
     def _get_name(self):
         return "postgresql"
 
@@ -14,6 +29,12 @@ class PostgresConnectionManager(BaseConnectionManager):
                 min_size=self.min_pool_size,
                 max_size=self.max_pool_size,
                 max_inactive_connection_lifetime=self.idle_timeout,
+                timeout=self.acquire_timeout,
+                command_timeout=self.command_timeout,
+                statement_cache_size=self.statement_cache_size,
+                # asyncpg has no client side keepalive option, ask the server to probe idle connections instead
+                server_settings={"tcp_keepalives_idle": "60"} if self.keepalive else None,
+                init=self._init_connection,
             )
         return self.pool
 
@@ -21,23 +42,141 @@ class PostgresConnectionManager(BaseConnectionManager):
         if self.pool:
             await self.pool.close()
             self.pool = None
+            self._prepared = {}
+
+    async def _init_connection(self, connection):
+        """Pool init hook, prepares the registered queries once per new connection"""
+        pid = connection.get_server_pid()
+        self._prepared[pid] = {
+            name: await connection.prepare(query) for name, query in self.prepared_queries.items()
+        }
+        connection.add_termination_listener(lambda _: self._prepared.pop(pid, None))
+
+    def register_query(self, name, query):
+        """
+        Register a query to prepare on every pool connection, run it with the *_prepared methods.
+        Register before connect() so the statements are prepared as the connections open,
+        connections opened earlier prepare it on first use.
+        """
+        self.prepared_queries[name] = query
+
+    async def _prepared_statement(self, connection, name):
+        statements = self._prepared.setdefault(connection.get_server_pid(), {})
+        statement = statements.get(name)
+        if statement is None:
+            statement = statements[name] = await connection.prepare(self.prepared_queries[name])
+        return statement
+
+    def _pool_size(self):
+        return self.pool.get_size() if self.pool else 0
+
+    @asynccontextmanager
+    async def _acquire(self):
+        """Acquire a pooled connection, recording the wait in pool_stats"""
+        connection = await self.get_connection()
+        try:
+            yield connection
+        finally:
+            await self.release_connection(connection)
+
+    async def ping(self):
+        async with self._acquire() as connection:
+            return await connection.fetchval("SELECT 1")
 
     async def get_connection(self):
         if not self.pool:
             await self.connect()
-        return await self.pool.acquire()
+        with self.pool_stats.acquiring():
+            return await self.pool.acquire(timeout=self.acquire_timeout)
 
     async def release_connection(self, connection):
+        self.pool_stats.released()
         await self.pool.release(connection)
 
+    async def _run(self, method, *args, idempotent=False):
+        """Call connection.<method>(*args) on a pooled connection under the deadline, retries and breaker"""
+        async def operation():
+            async with self._acquire() as connection:
+                return await getattr(connection, method)(*args)
+        return await self._call(operation, idempotent=idempotent)
+
+    async def _run_prepared(self, name, method, *args, idempotent=False):
+        async def operation():
+            async with self._acquire() as connection:
+                statement = await self._prepared_statement(connection, name)
+                return await getattr(statement, method)(*args)
+        return await self._call(operation, idempotent=idempotent)
+
+    # The fetch methods are retried on transient errors, pass idempotent=False
+    # for queries with side effects such as INSERT ... RETURNING
+
     async def execute(self, query, *args):
-        async with self.pool.acquire() as connection:
-            return await connection.execute(query, *args)
+        return await self._run("execute", query, *args)
+
+    async def fetch(self, query, *args, idempotent=True):
+        return await self._run("fetch", query, *args, idempotent=idempotent)
+
+    async def fetchval(self, query, *args, idempotent=True):
+        return await self._run("fetchval", query, *args, idempotent=idempotent)
+
+    async def executemany(self, query, args):
+        """Run query once per argument tuple in args, pipelined over one connection"""
+        # Bulk operations get no deadline, they take as long as the data they carry
+        async with self._guard(), self._acquire() as connection:
+            return await connection.executemany(query, args)
+
+    async def fetch_prepared(self, name, *args, idempotent=True):
+        return await self._run_prepared(name, "fetch", *args, idempotent=idempotent)
+
+    async def fetchrow_prepared(self, name, *args, idempotent=True):
+        return await self._run_prepared(name, "fetchrow", *args, idempotent=idempotent)
+
+    async def fetchval_prepared(self, name, *args, idempotent=True):
+        return await self._run_prepared(name, "fetchval", *args, idempotent=idempotent)
+
+    async def executemany_prepared(self, name, args):
+        async with self._guard(), self._acquire() as connection:
+            statement = await self._prepared_statement(connection, name)
+            return await statement.executemany(args)
+
+    async def copy_records_to_table(self, table_name, records, columns=None, schema_name=None):
+        """
+        Bulk load records (an iterable or async iterable of tuples) into a table with COPY.
+        This is the fastest ingest path, much faster than INSERTs.
+        """
+        async with self._guard(), self._acquire() as connection:
+            return await connection.copy_records_to_table(
+                table_name, records=records, columns=columns, schema_name=schema_name
+            )
+
+    async def copy_from_query(self, query, *args, output, format="csv", header=True):
+        """
+        Export the result of query with COPY ... TO STDOUT.
+        output is a path, a binary file-like object or a coroutine function called with each chunk of bytes.
+        """
+        async with self._guard(), self._acquire() as connection:
+            return await connection.copy_from_query(query, *args, output=output, format=format, header=header)
+
+    @asynccontextmanager
+    async def transaction(self, isolation=None, readonly=False, deferrable=False):
+        """
+        Pin one pooled connection for several statements in a transaction.
 
-    async def fetch(self, query, *args):
-        async with self.pool.acquire() as connection:
-            return await connection.fetch(query, *args)
+            async with postgres.transaction() as connection:
+                await connection.execute(...)
+                await connection.execute(...)
+        """
+        async with self._guard(), self._acquire() as connection:
+            async with connection.transaction(isolation=isolation, readonly=readonly, deferrable=deferrable):
+                yield connection
 
-    async def fetchval(self, query, *args):
-        async with self.pool.acquire() as connection:
-            return await connection.fetchval(query, *args)
\ No newline at end of file
+    async def iter_rows(self, query, *args, prefetch=500, readonly=True):
+        """
+        Yield the rows of query one at a time from a server side cursor.
+        The cursor fetches prefetch rows per round trip inside a transaction pinned to one
+        connection, so memory is bounded by the prefetch window rather than the result size.
+        Stopping early (e.g. a client disconnect) rolls the transaction back and releases the connection.
+        """
+        async with self.transaction(readonly=readonly) as connection:
+            async for record in connection.cursor(query, *args, prefetch=prefetch):
+                yield record
@@ -1,18 +1,129 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import redis.asyncio as redis
+from redis.client import NEVER_DECODE
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 
 from app.core.databases.base_connection_manager import BaseConnectionManager
+from app.core.metrics import PoolStats
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """BlockingConnectionPool that records acquisitions and releases in a PoolStats"""
+
+    def __init__(self, *args, pool_stats: PoolStats = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_stats = pool_stats or PoolStats()
+
+    async def get_connection(self, command_name, *keys, **options):
+        with self.pool_stats.acquiring():
+            return await super().get_connection(command_name, *keys, **options)
+
+    async def release(self, connection):
+        await super().release(connection)
+        self.pool_stats.released()
+
+
+class PipelineBatch:
+    """
+    Commands queued on a redis pipeline, sent in one round trip when the pipeline() block exits.
+    The replies are in `results`, in the order the commands were queued.
+    """
+
+    def __init__(self, pipe):
+        self._pipe = pipe
+        self.results = None
+
+    def __getattr__(self, name):
+        return getattr(self._pipe, name)
+
+    def __len__(self):
+        return len(self._pipe)
+
+
+class GetBatcher:
+    """
+    Coalesces the GETs issued in the same event loop tick into MGETs of at most max_batch keys.
+    Duplicate keys are only fetched once.
+    """
+
+    def __init__(self, manager, max_batch=1000):
+        self.manager = manager
+        self.max_batch = max_batch
+        self._pending = {}
+        self._flushes = set()
+
+    def get(self, key):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            loop.call_soon(self._flush)
+        self._pending.setdefault(key, []).append(future)
+        return future
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch):
+            batch = {key: pending[key] for key in keys[start:start + self.max_batch]}
+            task = asyncio.ensure_future(self._fetch(batch))
+            # Keep a reference so the task isn't garbage collected mid flight
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _fetch(self, batch):
+        try:
+            values = await self.manager.mget(*batch)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for futures, value in zip(batch.values(), values):
+            for future in futures:
+                if not future.done():
+                    future.set_result(value)
 
 
 class RedisConnectionManager(BaseConnectionManager):
+    transient_errors = BaseConnectionManager.transient_errors + (RedisConnectionError, RedisTimeoutError)
+
+    def __init__(self, *args, auto_batch=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.auto_batch = auto_batch
+        self._batcher = GetBatcher(self) if auto_batch else None
+
     def _get_name(self):
         return "redis"
 
+    def _build_uri(self):
+        auth_part = f"{self._user or ''}:{self._password}@" if self._password else ""
+        # Redis databases are numbered, the default db_name is just the service prefix
+        db_part = f"/{self.db_name}" if str(self.db_name).isdigit() else ""
+        return f"redis://{auth_part}{self.host}:{self.port}{db_part}"
+
+    def describe(self):
+        # Redis has no prepared statements and no idle lifetime in redis-py's pool
+        description = super().describe()
+        description.pop("statement_cache_size")
+        description.pop("idle_timeout")
+        description["auto_batch"] = self.auto_batch
+        return description
+
     async def connect(self):
         if self.pool is None:
-            self.pool = redis.ConnectionPool.from_url(
+            # A blocking pool waits up to acquire_timeout for a free connection instead of failing at max size
+            self.pool = InstrumentedConnectionPool.from_url(
                 self.uri,
                 max_connections=self.max_pool_size,
-                decode_responses=True
+                timeout=self.acquire_timeout,
+                socket_timeout=self.command_timeout,
+                socket_connect_timeout=self.acquire_timeout,
+                socket_keepalive=self.keepalive,
+                decode_responses=True,
+                pool_stats=self.pool_stats
             )
             self.client = redis.Redis(connection_pool=self.pool)
         return self.client
@@ -20,30 +131,109 @@ class RedisConnectionManager(BaseConnectionManager):
     async def close(self):
         if self.client:
             await self.client.close()
+            # The pool was created separately so closing the client leaves its connections open
+            await self.pool.disconnect()
             self.pool = None
             self.client = None
 
+    def _pool_size(self):
+        return len(self.pool._connections) if self.pool else 0
+
+    async def ping(self):
+        if not self.client:
+            await self.connect()
+        return await self.client.ping()
+
     async def get(self, key):
         if not self.client:
             await self.connect()
-        return await self.client.get(key)
+        if self._batcher is not None:
+            return await self._batcher.get(key)
+        return await self._call(lambda: self.client.get(key), idempotent=True)
+
+    async def mget(self, *keys):
+        """Values of all keys in one round trip, None for missing keys"""
+        if not self.client:
+            await self.connect()
+        if not keys:
+            return []
+        return await self._call(lambda: self.client.mget(keys), idempotent=True)
+
+    async def get_bytes(self, key):
+        """GET without decoding the reply, for binary values such as cached response bodies"""
+        if not self.client:
+            await self.connect()
+        return await self._call(
+            lambda: self.client.execute_command("GET", key, **{NEVER_DECODE: True}), idempotent=True
+        )
 
     async def set(self, key, value, ex=None):
         if not self.client:
             await self.connect()
-        return await self.client.set(key, value, ex=ex)
+        return await self._call(lambda: self.client.set(key, value, ex=ex), idempotent=True)
+
+    async def mset(self, mapping, ex=None):
+        """
+        Set all key/value pairs in one round trip.
+        MSET has no expiry, so with ex the SETs are pipelined instead.
+        """
+        if not self.client:
+            await self.connect()
+        if not mapping:
+            return True
+        if ex is None:
+            return await self._call(lambda: self.client.mset(mapping), idempotent=True)
+        async with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ex)
+        return all(pipe.results)
+
+    @asynccontextmanager
+    async def pipeline(self, transaction=False):
+        """
+        Queue any commands on the yielded batch and send them in one round trip on exit.
+        With transaction=True they are wrapped in MULTI/EXEC and applied atomically.
+
+            async with redis_manager.pipeline() as pipe:
+                pipe.get("a")
+                pipe.incr("b")
+            a, b = pipe.results
+        """
+        if not self.client:
+            await self.connect()
+        async with self._guard(), self.client.pipeline(transaction=transaction) as pipe:
+            batch = PipelineBatch(pipe)
+            yield batch
+            batch.results = await pipe.execute() if len(pipe) else []
 
     async def delete(self, *keys):
         if not self.client:
             await self.connect()
-        return await self.client.delete(*keys)
+        return await self._call(lambda: self.client.delete(*keys), idempotent=True)
+
+    async def delete_by_prefix(self, prefix, batch_size=500):
+        """Delete every key starting with prefix, scanning incrementally instead of blocking on KEYS"""
+        if not self.client:
+            await self.connect()
+        deleted = 0
+        batch = []
+        pattern = "".join(f"\\{char}" if char in "*?[]\\" else char for char in prefix) + "*"
+        async with self._guard():
+            async for key in self.client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += await self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += await self.client.unlink(*batch)
+        return deleted
 
     async def exists(self, *keys):
         if not self.client:
             await self.connect()
-        return await self.client.exists(*keys)
+        return await self._call(lambda: self.client.exists(*keys), idempotent=True)
 
     async def publish(self, channel, message):
         if not self.client:
             await self.connect()
-        return await self.client.publish(channel, message)
\ No newline at end of file
+        return await self._call(lambda: self.client.publish(channel, message))
\ No newline at end of file
@@ -0,0 +1,95 @@
+import asyncio
+import random
+import time
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised without calling the backend while its circuit breaker is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} circuit breaker is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fails calls to a backend fast once it looks down.
+
+    closed: calls go through, failure_threshold consecutive transient failures open the breaker.
+    open: calls raise CircuitOpenError until reset_timeout seconds have passed.
+    half_open: one trial call goes through, its success closes the breaker and its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN:
+            retry_after = self._opened_at + self.reset_timeout - time.monotonic()
+            if retry_after > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, retry_after)
+            self.state = self.HALF_OPEN
+        if self._trial_in_flight:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, 0.0)
+        self._trial_in_flight = True
+
+    def record_success(self):
+        self._trial_in_flight = False
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """The call ended without telling whether the backend works, e.g. it was cancelled"""
+        self._trial_in_flight = False
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, so retrying clients don't hit a recovering backend in lockstep"""
+
+    def __init__(self, attempts=3, base_delay=0.05, max_delay=1.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number attempt (starting at 1)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class OperationTimeoutError(asyncio.TimeoutError):
+    """An operation, including its retries, didn't finish before its deadline"""
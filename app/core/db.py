@@ -1,44 +1,79 @@
+import asyncio
+import importlib
 import logging
+import time
 
 from fastapi import FastAPI
 from app.core.config import settings
-from app.core.databases.mongo_connection_manager import MongoConnectionManager
-from app.core.databases.postgres_connection_manager import PostgresConnectionManager
-from app.core.databases.redis_connection_manager import RedisConnectionManager
 
 logger = logging.getLogger(__name__)
 
 
+# Connection manager of each supported database. They are imported on first use
+# so only the drivers of the configured databases are loaded.
+db_connections = {
+    'redis': 'app.core.databases.redis_connection_manager.RedisConnectionManager',
+    'mongo': 'app.core.databases.mongo_connection_manager.MongoConnectionManager',
+    'postgres': 'app.core.databases.postgres_connection_manager.PostgresConnectionManager'
+}
+
+
+def connection_manager_class(db: str):
+    module_name, class_name = db_connections[db].rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+async def _warm_up(db, manager):
+    start_time = time.perf_counter()
+    await manager.warm_up()
+    logger.info("Warmed up %s pool with %s connections in %.3fs",
+                db, manager.min_pool_size, time.perf_counter() - start_time)
+
+
 async def connect_db(app: FastAPI):
-    db_connections = {
-        'redis': RedisConnectionManager,
-        'mongo': MongoConnectionManager,
-        'postgres': PostgresConnectionManager
-    }
+    """
+    Create a connection manager for every configured database and warm up all of
+    their pools concurrently. Raises if any pool fails or the startup deadline passes,
+    app.state.db_ready is only set once every pool is warm.
+    """
+    app.state.db_ready = False
+    managers = {}
     for db, db_settings in settings.databases.items():
         if db not in db_connections:
             raise ConnectionError(f"Connection to {db} not configure")
-        setattr(
-            app.state,
-            db,
-            db_connections[db](db_settings.user, db_settings.password, db_settings.port, db_settings.db_name)
+        managers[db] = connection_manager_class(db)(
+            db_settings.user, db_settings.password, db_settings.port, db_settings.db_name,
+            **db_settings.manager_options()
         )
+        setattr(app.state, db, managers[db])
         logger.info(f"Set {db} connection")
 
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(_warm_up(db, manager) for db, manager in managers.items())),
+            timeout=settings.db_startup_timeout
+        )
+    except asyncio.TimeoutError:
+        await close_db(app)
+        raise ConnectionError(
+            f"Database pools {list(managers)} not warm within {settings.db_startup_timeout}s"
+        ) from None
+    except Exception:
+        # Startup fails so the lifespan shutdown never runs, don't leak the pools that did open
+        await close_db(app)
+        raise
+    app.state.db_ready = True
+
 
 async def close_db(app: FastAPI):
-    db_close_map = {
-        "mongo": lambda client: client.close(),  # Not async
-        "redis": lambda client: client.close(),  # Async
-        "pg_pool": lambda client: client.close()  # Async
+    """Close every connection manager on app.state concurrently"""
+    app.state.db_ready = False
+    managers = {
+        db: getattr(app.state, db) for db in db_connections if getattr(app.state, db, None)
     }
-
-    # Handle all database connections
-    for db_name, close_func in db_close_map.items():
-        if hasattr(app.state, db_name):
-            db_client = getattr(app.state, db_name)
-            if db_client:
-                close_result = close_func(db_client)
-                # If it's an awaitable, await it
-                if hasattr(close_result, "__await__"):
-                    await close_result
+    results = await asyncio.gather(*(manager.close() for manager in managers.values()), return_exceptions=True)
+    for db, result in zip(managers, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to close {db} connection", exc_info=result)
+        else:
+            logger.info(f"Closed {db} connection")
@@ -2,10 +2,16 @@ from fastapi import FastAPI
 from contextlib import asynccontextmanager
 import logging
 import signal
-import sys
+import threading
+import time
 import asyncio
 
-from app.core.db import connect_db, close_db
+from app.core.db import connect_db, close_db, db_connections
+from app.core.health import HealthProber
+from app.core.logging_config import AsyncLogging
+from app.core.loop_monitor import LoopMonitor
+from app.core.middleware import in_flight_requests
+from app.core.status import setup_status_responses
 from app.models.responses import StatusResponse
 from app.core.config import settings
 
@@ -13,39 +19,69 @@ from app.core.config import settings
 logger = logging.getLogger(__name__)
 
 
-main_loop = None
-
-
-def setup_signal_handlers():
-    global main_loop
-    main_loop = asyncio.get_event_loop()
-
-    def handle_signal(sig, frame):
-        logger.info(f"Received signal {sig}, initiating shutdown...")
-        # Schedule the shutdown coroutine on the existing event loop
-        if main_loop and main_loop.is_running():
-            logger.info(f"Adding shutdown to running loop")
-            main_loop.create_task(shutdown_wrapper())
-        else:
-            # Fallback for when the loop isn't running
-            logger.info(f"Starting loop for shutdown")
-            temp_loop = asyncio.new_event_loop()
-            temp_loop.run_until_complete(shutdown())
-            temp_loop.close()
-            sys.exit(0)
-
-    async def shutdown_wrapper():
-        await shutdown()
-        # Stop the event loop after shutdown completes
-        main_loop.stop()
-
-    # Register the handlers
-    signal.signal(signal.SIGINT, handle_signal)
-    signal.signal(signal.SIGTERM, handle_signal)
+def is_ready(app: FastAPI) -> bool:
+    """The service takes traffic once every pool is warm and until it starts draining"""
+    return getattr(app.state, "db_ready", False) and not getattr(app.state, "draining", False)
+
+
+def setup_signal_handlers(app: FastAPI):
+    """
+    Chain in front of the server's SIGINT/SIGTERM handlers instead of replacing them.
+    On the first signal readiness starts failing, and after settings.shutdown_delay the
+    signal is passed on so the server stops accepting connections and drains.
+    Nothing is installed when there is no server handler to chain to (e.g. in tests).
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    app.state.previous_signal_handlers = {}
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous_handler = signal.getsignal(sig)
+        if not callable(previous_handler):
+            continue
+        app.state.previous_signal_handlers[sig] = previous_handler
+
+        def handle_signal(sig, frame, previous_handler=previous_handler):
+            if getattr(app.state, "draining", False):
+                # A second signal goes straight through, e.g. to force exit
+                app.state.signal_forwarded = True
+                previous_handler(sig, frame)
+                return
+            app.state.draining = True
+            app.state.drain_started = time.perf_counter()
+            logger.info("Received signal %s, readiness failing, %s requests in flight",
+                        signal.Signals(sig).name, in_flight_requests.count)
+
+            def stop_accepting():
+                if getattr(app.state, "signal_forwarded", False):
+                    return
+                app.state.signal_forwarded = True
+                logger.info("Stopped accepting connections after %.3fs",
+                            time.perf_counter() - app.state.drain_started)
+                previous_handler(sig, frame)
+
+            if settings.shutdown_delay > 0:
+                loop.call_soon_threadsafe(loop.call_later, settings.shutdown_delay, stop_accepting)
+            else:
+                stop_accepting()
+
+        signal.signal(sig, handle_signal)
+
+
+def restore_signal_handlers(app: FastAPI):
+    for sig, previous_handler in getattr(app.state, "previous_signal_handlers", {}).items():
+        signal.signal(sig, previous_handler)
+    app.state.previous_signal_handlers = {}
 
 
 async def startup(app: FastAPI):
     # Add startup process here
+    if settings.async_logging:
+        app.state.async_logging = AsyncLogging(settings.log_queue_size, settings.log_queue_policy)
+        app.state.async_logging.start()
+    app.state.draining = False
+    app.state.signal_forwarded = False
     await connect_db(app)
     logger.info(f"{settings.server_name} is ready")
     service_info = StatusResponse(
@@ -56,20 +92,75 @@ async def startup(app: FastAPI):
     )
     logger.info(f"Service info: {service_info.__dict__}")
     print(f"Service info: {service_info.__dict__}")
-    setup_signal_handlers()
+    setup_status_responses(app)
+    setup_signal_handlers(app)
 
 
 async def shutdown(app: FastAPI):
     # Add shutdown process here
+    shutdown_started = time.perf_counter()
+    app.state.draining = True
+    if in_flight_requests.count:
+        logger.info("Waiting up to %ss for %s in flight requests",
+                    settings.shutdown_drain_timeout, in_flight_requests.count)
+    drained = await in_flight_requests.wait_idle(settings.shutdown_drain_timeout)
+    drain_finished = time.perf_counter()
+    if drained:
+        logger.info("Drained in flight requests in %.3fs", drain_finished - shutdown_started)
+    else:
+        logger.warning("Gave up on %s in flight requests after %.3fs",
+                       in_flight_requests.count, drain_finished - shutdown_started)
     await close_db(app)
-    pending = asyncio.all_tasks(asyncio.get_event_loop())
-    pending.discard(asyncio.current_task())
-    await asyncio.gather(*pending, return_exceptions=True)
-    logger.info(f"{settings.server_name} is shutdown")
+    logger.info("Closed database pools in %.3fs", time.perf_counter() - drain_finished)
+    restore_signal_handlers(app)
+    drain_started = getattr(app.state, "drain_started", shutdown_started)
+    logger.info(f"{settings.server_name} is shutdown after {time.perf_counter() - drain_started:.3f}s")
+
+
+def stop_async_logging(app: FastAPI):
+    """Flush the queued log records and put the real handlers back, if async logging was started"""
+    if getattr(app.state, "async_logging", None):
+        app.state.async_logging.stop()
+
+
+def start_health_prober(app: FastAPI):
+    managers = {db: getattr(app.state, db) for db in db_connections if getattr(app.state, db, None)}
+    app.state.health_prober = HealthProber(
+        managers,
+        interval=settings.health_check_interval,
+        timeout=settings.health_check_timeout,
+        failure_threshold=settings.health_failure_threshold,
+        success_threshold=settings.health_success_threshold
+    )
+    app.state.health_prober.start()
+
+
+def start_loop_monitor(app: FastAPI):
+    app.state.loop_monitor = None
+    if not settings.loop_monitor:
+        return
+    app.state.loop_monitor = LoopMonitor(
+        interval=settings.loop_monitor_interval,
+        threshold=settings.loop_block_threshold,
+        history=settings.loop_block_history
+    )
+    app.state.loop_monitor.start()
 
 
 @asynccontextmanager
 async def service_lifespan(app: FastAPI):
-    await startup(app)
-    yield
-    await shutdown(app)
+    # Started first so stalls during startup (imports, pool warm up) are caught too
+    start_loop_monitor(app)
+    try:
+        await startup(app)
+        start_health_prober(app)
+        try:
+            yield
+        finally:
+            await app.state.health_prober.stop()
+            await shutdown(app)
+    finally:
+        # Also when startup fails, so its error is logged and no thread outlives the app
+        if app.state.loop_monitor is not None:
+            await app.state.loop_monitor.stop()
+        stop_async_logging(app)
@@ -0,0 +1,304 @@
+import json
+import mimetypes
+import os
+import stat
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+
+# Bytes read per chunk when the server can't send the file itself
+FILE_CHUNK_SIZE = 256 * 1024
+
+# More ranges than this in one request are answered with the whole file
+MAX_RANGES = 16
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class FileChangedError(OSError):
+    """
+    The file shrank or went away after its headers were sent. The response can't be
+    finished with the promised Content-Length, raising makes the server abort the connection.
+    """
+
+
+class FileMetadata:
+    """What a response needs to know about a file, from one os.stat"""
+    __slots__ = ("size", "mtime", "etag", "last_modified", "media_type", "checked_at")
+
+    def __init__(self, st: os.stat_result, media_type: str):
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.media_type = media_type
+        self.checked_at = time.monotonic()
+
+
+class FileMetadataCache:
+    """
+    LRU of FileMetadata by path, so hot files are served without a stat per request.
+    Entries are trusted for ttl seconds, a file replaced in place is picked up after that.
+    Missing files are not cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, FileMetadata]" = OrderedDict()
+
+    async def get(self, path: str, media_type: Optional[str] = None) -> Optional[FileMetadata]:
+        """Metadata of the regular file at path, or None if there is none. Stats off the event loop."""
+        metadata = self._entries.get(path)
+        if metadata is not None and time.monotonic() - metadata.checked_at < self.ttl:
+            self._entries.move_to_end(path)
+            return metadata
+        try:
+            st = await run_in_threadpool(os.stat, path)
+        except (FileNotFoundError, NotADirectoryError):
+            self._entries.pop(path, None)
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            self._entries.pop(path, None)
+            return None
+        metadata = FileMetadata(st, media_type or mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self._entries[path] = metadata
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return metadata
+
+    def discard(self, path: str):
+        self._entries.pop(path, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+file_metadata = FileMetadataCache(settings.file_cache_max_entries, settings.file_cache_ttl)
+
+
+def parse_ranges(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a "bytes=" Range header into sorted, merged (start, end) inclusive ranges.
+    Returns None when the header should be ignored (not bytes, malformed or too many ranges),
+    and an empty list when no range is satisfiable.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+    ranges = []
+    for spec in specs.split(","):
+        start, dash, end = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if not start:
+                # Suffix range, the last `end` bytes
+                length = int(end)
+                if length <= 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+                continue
+            start = int(start)
+            end = int(end) if end else None
+        except ValueError:
+            return None
+        if end is None:
+            end = size - 1
+        elif start > end:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _not_modified(headers: Headers, metadata: FileMetadata) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or metadata.etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return metadata.mtime <= int(parsedate_to_datetime(if_modified_since).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _range_applies(headers: Headers, metadata: FileMetadata) -> bool:
+    """A Range is only honoured when If-Range, if sent, still matches the file"""
+    if_range = headers.get("if-range")
+    return if_range is None or if_range == metadata.etag or if_range == metadata.last_modified
+
+
+class FastFileResponse(Response):
+    """
+    Serves a file with conditional and byte range requests.
+
+    The file is stat'ed off the event loop (through the FileMetadataCache) and answered with
+    304 for a matching If-None-Match/If-Modified-Since, 206 for one range, 206
+    multipart/byteranges for several, and 416 for unsatisfiable ranges.
+
+    When the server offers the ASGI zero-copy send extension the byte ranges are handed to it
+    with the open file, so it can use sendfile(2) without the bytes passing through Python.
+    Otherwise they are read in FILE_CHUNK_SIZE chunks in the threadpool.
+    """
+
+    def __init__(self, path: str, filename: Optional[str] = None, media_type: Optional[str] = None,
+                 status_code: int = 200, headers: Optional[Dict[str, str]] = None,
+                 metadata_cache: FileMetadataCache = file_metadata):
+        self.path = path
+        self.filename = filename
+        self.media_type = media_type
+        self.status_code = status_code
+        self.metadata_cache = metadata_cache
+        self.background = None
+        self.body = b""
+        self.init_headers(headers)
+        if filename is not None:
+            quoted = quote(filename)
+            if quoted != filename:
+                disposition = f"attachment; filename*=utf-8''{quoted}"
+            else:
+                disposition = f'attachment; filename="{filename}"'
+            self.headers.setdefault("content-disposition", disposition)
+
+    async def _send_not_found(self, send: Send):
+        body = json.dumps({"detail": f"File not found: {self.filename or os.path.basename(self.path)}"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 404,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        metadata = await self.metadata_cache.get(self.path, self.media_type)
+        if metadata is None:
+            await self._send_not_found(send)
+            return
+
+        request_headers = Headers(scope=scope)
+        send_body = scope.get("method", "GET") != "HEAD"
+        self.headers["etag"] = metadata.etag
+        self.headers["last-modified"] = metadata.last_modified
+        self.headers["accept-ranges"] = "bytes"
+
+        if self.status_code == 200 and _not_modified(request_headers, metadata):
+            # A 304 carries the validators but no representation headers
+            if "content-length" in self.headers:
+                del self.headers["content-length"]
+            await send({"type": "http.response.start", "status": 304, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        ranges = None
+        range_header = request_headers.get("range")
+        if self.status_code == 200 and range_header and _range_applies(request_headers, metadata):
+            ranges = parse_ranges(range_header, metadata.size)
+
+        if ranges is None:
+            self.headers["content-type"] = metadata.media_type
+            self.headers["content-length"] = str(metadata.size)
+            parts = [(b"", 0, metadata.size - 1)] if metadata.size else []
+            status_code = self.status_code
+        elif not ranges:
+            self.headers["content-range"] = f"bytes */{metadata.size}"
+            self.headers["content-length"] = "0"
+            await send({"type": "http.response.start", "status": 416, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers["content-type"] = metadata.media_type
+            self.headers["content-range"] = f"bytes {start}-{end}/{metadata.size}"
+            self.headers["content-length"] = str(end - start + 1)
+            parts = [(b"", start, end)]
+            status_code = 206
+        else:
+            boundary = os.urandom(12).hex()
+            parts = [
+                (
+                    (f"--{boundary}\r\nContent-Type: {metadata.media_type}\r\n"
+                     f"Content-Range: bytes {start}-{end}/{metadata.size}\r\n\r\n").encode(),
+                    start, end
+                )
+                for start, end in ranges
+            ]
+            # Every part after the first starts on a new line
+            parts = [(head if i == 0 else b"\r\n" + head, start, end) for i, (head, start, end) in enumerate(parts)]
+            closing = f"\r\n--{boundary}--\r\n".encode()
+            length = sum(len(head) + end - start + 1 for head, start, end in parts) + len(closing)
+            self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+            self.headers["content-length"] = str(length)
+            parts.append((closing, 0, -1))
+            status_code = 206
+
+        await send({"type": "http.response.start", "status": status_code, "headers": self.raw_headers})
+        if not send_body or not parts:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        try:
+            file = await run_in_threadpool(open, self.path, "rb")
+        except FileNotFoundError as e:
+            self.metadata_cache.discard(self.path)
+            raise FileChangedError(f"{self.path} was removed since it was stat'ed") from e
+        try:
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await self._zerocopy_parts(file, parts, send)
+            else:
+                await self._read_parts(file, parts, send)
+        except FileChangedError:
+            # Stat it again on the next request instead of promising the old size until the TTL
+            self.metadata_cache.discard(self.path)
+            raise
+        finally:
+            await run_in_threadpool(file.close)
+
+    @staticmethod
+    async def _zerocopy_parts(file, parts, send: Send):
+        for head, start, end in parts:
+            if head:
+                await send({"type": "http.response.body", "body": head, "more_body": True})
+            if end >= start:
+                await send({
+                    "type": ZEROCOPY_EXTENSION, "file": file, "offset": start, "count": end - start + 1,
+                    "more_body": True,
+                })
+        await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    async def _read_parts(file, parts, send: Send):
+        fd = file.fileno()
+        for head, start, end in parts:
+            if head:
+                await send({"type": "http.response.body", "body": head, "more_body": True})
+            offset = start
+            while offset <= end:
+                chunk = await run_in_threadpool(os.pread, fd, min(FILE_CHUNK_SIZE, end - offset + 1), offset)
+                if not chunk:
+                    raise FileChangedError(f"{file.name} was truncated to {offset} bytes while it was sent")
+                offset += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from app.core.response_factory import dumps_json
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackendHealth:
+    """
+    Probe results of one backend. The healthy flag only flips after failure_threshold
+    consecutive failed probes, and back after success_threshold consecutive successful
+    ones, so a single slow ping doesn't flap readiness.
+    """
+
+    def __init__(self):
+        # The pools were warmed up (and so reachable) before the first probe
+        self.healthy = True
+        self.latency: Optional[float] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+
+    def record(self, latency: float, error: Optional[str], failure_threshold: int, success_threshold: int):
+        self.latency = latency
+        self.last_checked = time.time()
+        self.last_error = error
+        if error is None:
+            self.consecutive_failures = 0
+            self.consecutive_successes += 1
+            if not self.healthy and self.consecutive_successes >= success_threshold:
+                self.healthy = True
+        else:
+            self.consecutive_successes = 0
+            self.consecutive_failures += 1
+            if self.healthy and self.consecutive_failures >= failure_threshold:
+                self.healthy = False
+
+    def to_dict(self):
+        return {
+            "healthy": self.healthy,
+            "latency": self.latency,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class HealthProber:
+    """
+    Pings every connection manager in the background and keeps the results in memory,
+    so readiness checks are answered from the last snapshot without touching a database.
+    A ping that fails or takes longer than timeout counts as a failed probe.
+    """
+
+    def __init__(self, managers: Dict[str, object], interval: float = 5.0, timeout: float = 2.0,
+                 failure_threshold: int = 3, success_threshold: int = 2):
+        self.managers = managers
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.success_threshold = success_threshold
+        self.backends = {db: BackendHealth() for db in managers}
+        self.healthy = True
+        self.body = b""
+        self._task = None
+        self._encode()
+
+    def _encode(self):
+        self.healthy = all(backend.healthy for backend in self.backends.values())
+        self.body = dumps_json({
+            "status": "ready" if self.healthy else "unhealthy",
+            "backends": {db: backend.to_dict() for db, backend in self.backends.items()},
+        })
+
+    async def _probe(self, db, manager):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(manager.ping(), self.timeout)
+            error = None
+        except asyncio.TimeoutError:
+            error = f"ping timed out after {self.timeout}s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        backend = self.backends[db]
+        was_healthy = backend.healthy
+        backend.record(time.perf_counter() - start, error, self.failure_threshold, self.success_threshold)
+        if was_healthy and not backend.healthy:
+            logger.warning("%s is unhealthy after %s failed probes: %s", db, backend.consecutive_failures, error)
+        elif not was_healthy and backend.healthy:
+            logger.info("%s is healthy again", db)
+
+    async def probe_once(self):
+        """Probe every backend concurrently and update the snapshot"""
+        await asyncio.gather(*(self._probe(db, manager) for db, manager in self.managers.items()))
+        self._encode()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.probe_once()
+            except Exception:
+                logger.error("Health probe failed", exc_info=True)
+
+    def start(self):
+        if self._task is None and self.managers:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
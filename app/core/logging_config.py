@@ -1,32 +1,93 @@
+import itertools
+import json
 import logging
-import uuid
+import logging.config
+import os
+import queue
 from contextvars import ContextVar
 from logging import LogRecord
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 
 # Context variable to store trace_id for the current execution context
 trace_id_var: ContextVar[str] = ContextVar('trace_id', default='')
 
+# Value logged for records emitted outside of a request
+NO_TRACE_ID = '-'
+
+logger = logging.getLogger(__name__)
+
+# Resolved from this file so the service can be started from any working directory
+LOGGING_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'logging_config.json')
+
+_trace_id_prefix = os.urandom(4).hex()
+_trace_id_counter = itertools.count(1)
+
+# W3C trace IDs are lowercase hex
+_HEX_DIGITS = '0123456789abcdef'
+
+
+def _reset_trace_id_source() -> None:
+    """Give forked worker processes their own prefix so IDs stay unique across workers."""
+    global _trace_id_prefix, _trace_id_counter
+    _trace_id_prefix = os.urandom(4).hex()
+    _trace_id_counter = itertools.count(1)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_trace_id_source)
+
+
+def new_trace_id() -> str:
+    """
+    Generate a trace ID from a random per-process prefix and a counter.
+    This avoids the os.urandom syscall uuid4 makes for every ID.
+    """
+    return f"{_trace_id_prefix}{next(_trace_id_counter):012x}"
+
 def get_trace_id() -> str:
-    """Get the current trace ID or generate a new one if none exists."""
-    trace_id = trace_id_var.get()
-    if not trace_id:
-        trace_id = str(uuid.uuid4())
-        trace_id_var.set(trace_id)
-    return trace_id
+    """Get the current trace ID, or NO_TRACE_ID outside of a traced context."""
+    return trace_id_var.get() or NO_TRACE_ID
 
-def set_trace_id(trace_id: str = None) -> None:
-    """Set the trace ID for the current execution context."""
+def set_trace_id(trace_id: str = None) -> str:
+    """Set the trace ID for the current execution context, generating one if none is given."""
     if trace_id is None:
-        trace_id = str(uuid.uuid4())
+        trace_id = new_trace_id()
     trace_id_var.set(trace_id)
+    return trace_id
+
+def trace_id_from_headers(headers) -> str:
+    """
+    Extract a trace ID from raw ASGI headers.
+    X-Request-ID is used as is, otherwise the trace-id field of a W3C traceparent header.
+    Returns None when neither header carries a usable value.
+    """
+    traceparent = None
+    for name, value in headers:
+        if name == b'x-request-id':
+            if 0 < len(value) <= 128:
+                trace_id = value.decode('latin-1')
+                if trace_id.isprintable():
+                    return trace_id
+        elif name == b'traceparent':
+            traceparent = value
+    if traceparent:
+        parts = traceparent.split(b'-')
+        if len(parts) >= 4 and len(parts[1]) == 32:
+            trace_id = parts[1].decode('latin-1')
+            if not trace_id.strip(_HEX_DIGITS) and trace_id.strip('0'):
+                return trace_id
+    return None
 
 class TraceIdFilter(logging.Filter):
     """
     Logging filter that adds a trace_id attribute to LogRecord instances.
-    If no trace_id is set in the current context, a new one is generated.
+    Records logged outside of a request get NO_TRACE_ID, no ID is generated here.
+    Records that already carry a trace_id (e.g. captured before being queued) are left as is.
     """
     def filter(self, record: LogRecord) -> bool:
-        record.trace_id = get_trace_id()
+        if not getattr(record, 'trace_id', None):
+            record.trace_id = trace_id_var.get() or NO_TRACE_ID
         return True
 
 class RequestFormatter(logging.Formatter):
@@ -36,5 +97,126 @@ class RequestFormatter(logging.Formatter):
     """
     def format(self, record: LogRecord) -> str:
         if not hasattr(record, 'trace_id'):
-            record.trace_id = get_trace_id()
-        return super().format(record)
\ No newline at end of file
+            record.trace_id = trace_id_var.get() or NO_TRACE_ID
+        return super().format(record)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler for a bounded queue.
+    With the "drop" policy a full queue never blocks the caller, the record is counted in `dropped` instead.
+    With the "block" policy the caller waits for the listener to make room.
+    """
+    policies = ("drop", "block")
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "drop"):
+        if policy not in self.policies:
+            raise ValueError(f"Unknown log queue policy {policy}, expected one of {self.policies}")
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+        # The trace ID lives in a ContextVar so it has to be captured before the record changes thread
+        self.addFilter(TraceIdFilter())
+
+    def enqueue(self, record: LogRecord) -> None:
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """QueueListener whose stop sentinel waits for room in a full bounded queue instead of raising"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class AsyncLogging:
+    """
+    Moves the configured handlers of the given loggers behind bounded QueueHandlers.
+    The original handlers are owned by a background QueueListener thread so that
+    blocking writes (stdout, file locks) stay off the event loop thread.
+    """
+
+    def __init__(self, max_size: int = 10000, policy: str = "drop",
+                 logger_names=("", "uvicorn", "uvicorn.error", "uvicorn.access")):
+        self.max_size = max_size
+        self.policy = policy
+        self.logger_names = logger_names
+        self._original_handlers = {}
+        self._queue_handlers = []
+        self._listeners = []
+        self._dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        """Total records dropped because a queue was full, including previous runs"""
+        return self._dropped + sum(handler.dropped for handler in self._queue_handlers)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._listeners)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        # Loggers sharing the same handlers share one queue and listener
+        queue_handlers = {}
+        for name in self.logger_names:
+            target = logging.getLogger(name)
+            handlers = tuple(target.handlers)
+            if not handlers:
+                continue
+            if handlers not in queue_handlers:
+                queue_handler = BoundedQueueHandler(queue.Queue(self.max_size), self.policy)
+                listener = DrainingQueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+                queue_handlers[handlers] = queue_handler
+                self._queue_handlers.append(queue_handler)
+                self._listeners.append(listener)
+            self._original_handlers[name] = handlers
+            target.handlers = [queue_handlers[handlers]]
+        for listener in self._listeners:
+            listener.start()
+        logger.info("Async logging started for %s handler set(s)", len(self._listeners))
+
+    def stop(self) -> None:
+        """Drain the queues, flush the real handlers and put them back on their loggers"""
+        if not self.running:
+            return
+        for listener in self._listeners:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.flush()
+        for name, handlers in self._original_handlers.items():
+            logging.getLogger(name).handlers = list(handlers)
+        dropped = sum(handler.dropped for handler in self._queue_handlers)
+        self._dropped += dropped
+        self._original_handlers = {}
+        self._queue_handlers = []
+        self._listeners = []
+        if dropped:
+            logger.warning("Async logging dropped %s records because the queue was full", dropped)
+
+
+def load_logging_config(path: str = LOGGING_CONFIG_PATH, log_directory: Optional[str] = None) -> dict:
+    """
+    The dictConfig in path (logging_config.json next to this module by default), with the
+    file handlers writing to log_directory (created if missing) instead of the paths in the file
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+    if log_directory is not None:
+        for handler in config.get("handlers", {}).values():
+            if "filename" in handler:
+                handler["filename"] = os.path.join(log_directory, os.path.basename(handler["filename"]))
+        os.makedirs(log_directory, exist_ok=True)
+    return config
+
+
+def configure_logging(path: str = LOGGING_CONFIG_PATH, log_directory: Optional[str] = None) -> None:
+    """Apply the dictConfig in path, see load_logging_config"""
+    logging.config.dictConfig(load_logging_config(path, log_directory))
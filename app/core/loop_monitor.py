@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+import anyio.to_thread
+
+from app.core.metrics import LOOP_LAG_BUCKETS, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames kept of a captured stack
+STACK_LIMIT = 30
+
+
+class LoopMonitor:
+    """
+    Watches the event loop for stalls.
+
+    A task sleeps interval seconds at a time and records how late it wakes up, that lag is
+    how long every ready callback (a request, a timer) waited behind whatever held the loop.
+
+    A watchdog thread checks on the task every threshold / 2 seconds. Once it is threshold
+    seconds overdue the loop is blocked, and the watchdog captures the loop thread's stack
+    while it still points at the blocking code, logs it and keeps it in stalls. Code that
+    holds the GIL in one C call can't be caught this way, its lag is still recorded.
+
+    Every sample also reads the anyio thread limiter, which sync route handlers and
+    run_in_threadpool run under, to count how often all its worker threads were busy.
+    """
+
+    def __init__(self, interval: float = 0.25, threshold: float = 0.1, history: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = Histogram(LOOP_LAG_BUCKETS)
+        self.max_lag = 0.0
+        self.blocked = 0
+        self.stalls = deque(maxlen=history)
+        self.threads_in_use = 0
+        self.threads_limit = 0
+        self.threads_waiting = 0
+        self.threadpool_saturated = 0
+        self._due: Optional[float] = None
+        self._loop_thread_id: Optional[int] = None
+        self._limiter = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    def _sample_threadpool(self):
+        statistics = self._limiter.statistics()
+        self.threads_in_use = statistics.borrowed_tokens
+        self.threads_limit = statistics.total_tokens
+        self.threads_waiting = statistics.tasks_waiting
+        if statistics.tasks_waiting or statistics.borrowed_tokens >= statistics.total_tokens:
+            self.threadpool_saturated += 1
+
+    async def _run(self):
+        while True:
+            self._due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - self._due, 0.0)
+            self._due = None
+            self.lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                logger.warning("Event loop was blocked for %.3fs", lag)
+            self._sample_threadpool()
+
+    def _capture(self, overdue: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.format_stack(frame, limit=STACK_LIMIT)
+        del frame
+        self.blocked += 1
+        self.stalls.append({"at": time.time(), "blocked_for": round(overdue, 3), "stack": stack})
+        logger.warning("Event loop blocked for %.3fs so far in:\n%s", overdue, "".join(stack))
+
+    def _watch(self):
+        poll = max(self.threshold / 2, 0.005)
+        captured_due = None
+        while not self._stopped.wait(poll):
+            due = self._due
+            if due is None or due == captured_due:
+                continue
+            overdue = time.monotonic() - due
+            if overdue >= self.threshold:
+                # Once per stall, the first stack is the one that blocked
+                captured_due = due
+                self._capture(overdue)
+
+    def start(self):
+        """Start monitoring the running loop"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._limiter = anyio.to_thread.current_default_thread_limiter()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._due = None
+        await asyncio.get_running_loop().run_in_executor(None, self._watchdog.join)
+        self._watchdog = None
+
+    def to_dict(self):
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            # The buckets are exported by /server/metrics
+            "lag": {"count": self.lag.count, "sum": self.lag.sum, "max": self.max_lag},
+            "blocked": self.blocked,
+            "threadpool": {
+                "in_use": self.threads_in_use,
+                "limit": self.threads_limit,
+                "waiting": self.threads_waiting,
+                "saturated": self.threadpool_saturated,
+            },
+            "stalls": list(self.stalls),
+        }
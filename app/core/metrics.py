@@ -0,0 +1,213 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+
+# Upper bounds in seconds, +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ACQUIRE_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+QUEUE_WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LOOP_LAG_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Methods labelled as they are, any other (clients can send arbitrary ones) is labelled "other"
+METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+class Histogram:
+    """
+    Fixed bucket histogram.
+    Observations are plain integer increments without locking, which is safe on the event loop
+    thread and at worst loses a count when driver threads race on the same bucket.
+    """
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def snapshot(self) -> Dict:
+        """
+        Cumulative bucket counts keyed by upper bound, as exposed to Prometheus: the bounds are
+        their le label ("0.005", "+Inf") so the snapshot also encodes as JSON (e.g. /server/status)
+        """
+        cumulative = {}
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative[_format_value(bound)] = total
+        return {"buckets": cumulative, "sum": self.sum, "count": total}
+
+
+class PoolStats:
+    """Connection pool counters every connection manager keeps, whatever its driver"""
+
+    def __init__(self):
+        self.in_use = 0
+        self.waiters = 0
+        self.errors = 0
+        self.acquire_wait = Histogram(ACQUIRE_WAIT_BUCKETS)
+
+    @contextmanager
+    def acquiring(self):
+        """Time a connection acquisition, counting the caller as a waiter until it gets one"""
+        self.waiters += 1
+        start_time = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.errors += 1
+            raise
+        else:
+            self.in_use += 1
+        finally:
+            self.waiters -= 1
+            self.acquire_wait.observe(time.perf_counter() - start_time)
+
+    def released(self) -> None:
+        self.in_use -= 1
+
+
+class RequestMetrics:
+    """Request latency histograms labelled by method, route template and status code"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.histograms: Dict[Tuple[str, str, int], Histogram] = {}
+
+    def observe(self, method: str, route: str, status_code: int, duration: float) -> None:
+        key = (method if method in METHODS else "other", route, status_code)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(duration)
+
+
+request_metrics = RequestMetrics()
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_histogram(name: str, description: str, series: Iterable[Tuple[Dict, Histogram]]) -> List[str]:
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        snapshot = histogram.snapshot()
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+    return lines
+
+
+def render_samples(name: str, description: str, metric_type: str, series: Iterable[Tuple[Dict, float]]) -> List[str]:
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+    for labels, value in series:
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return lines
+
+
+def render_prometheus(managers: Dict[str, object], health_prober=None, concurrency_limiter=None,
+                      loop_monitor=None) -> str:
+    """
+    Render request latency and the stats of the given connection managers in Prometheus text format,
+    plus the last probe results of health_prober, the counters of concurrency_limiter and the
+    event loop lag and threadpool use seen by loop_monitor when given
+    """
+    pool_stats = {db: manager.stats() for db, manager in managers.items()}
+    lines = render_histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template",
+        (
+            ({"method": method, "route": route, "status": status_code}, histogram)
+            for (method, route, status_code), histogram in list(request_metrics.histograms.items())
+        )
+    )
+    for field, metric_type, description in (
+        ("size", "gauge", "Open connections in the pool"),
+        ("in_use", "gauge", "Connections checked out of the pool"),
+        ("idle", "gauge", "Open connections waiting in the pool"),
+        ("waiters", "gauge", "Callers waiting to acquire a connection"),
+        ("errors", "counter", "Failed connection acquisitions"),
+    ):
+        name = f"db_pool_{field}_total" if metric_type == "counter" else f"db_pool_{field}"
+        lines += render_samples(
+            name, description, metric_type, (({"db": db}, stats[field]) for db, stats in pool_stats.items())
+        )
+    lines += render_samples(
+        "db_circuit_breaker_open", "Whether the backend's circuit breaker fails calls fast", "gauge",
+        (({"db": db}, int(stats["breaker"]["state"] != "closed")) for db, stats in pool_stats.items())
+    )
+    lines += render_samples(
+        "db_circuit_breaker_rejected_total", "Calls failed fast by an open circuit breaker", "counter",
+        (({"db": db}, stats["breaker"]["rejected"]) for db, stats in pool_stats.items())
+    )
+    lines += render_histogram(
+        "db_pool_acquire_wait_seconds",
+        "Time spent waiting for a pooled connection",
+        (({"db": db}, manager.pool_stats.acquire_wait) for db, manager in managers.items())
+    )
+    if concurrency_limiter is not None:
+        for name, metric_type, description, value in (
+            ("http_concurrency_limit", "gauge", "Current concurrency limit", int(concurrency_limiter.limit)),
+            ("http_concurrency_in_flight", "gauge", "Requests holding a concurrency slot", concurrency_limiter.in_flight),
+            ("http_concurrency_queued", "gauge", "Requests waiting for a concurrency slot", concurrency_limiter.queued),
+            ("http_concurrency_accepted_total", "counter", "Requests admitted by the limiter", concurrency_limiter.accepted),
+        ):
+            lines += render_samples(name, description, metric_type, (({}, value),))
+        lines += render_samples(
+            "http_concurrency_rejected_total", "Requests shed with a 503 by the limiter", "counter",
+            (({"reason": reason}, count) for reason, count in concurrency_limiter.rejected.items())
+        )
+        lines += render_histogram(
+            "http_concurrency_queue_wait_seconds",
+            "Time admitted requests waited for a concurrency slot",
+            (({"route": route}, histogram) for route, histogram in list(concurrency_limiter.queue_wait.items()))
+        )
+    if health_prober is not None:
+        backends = health_prober.backends.items()
+        lines += render_samples(
+            "db_up", "Whether the backend passes its background health probes", "gauge",
+            (({"db": db}, int(backend.healthy)) for db, backend in backends)
+        )
+        lines += render_samples(
+            "db_probe_latency_seconds", "Latency of the last background health probe", "gauge",
+            (({"db": db}, backend.latency) for db, backend in backends if backend.latency is not None)
+        )
+    if loop_monitor is not None:
+        lines += render_histogram(
+            "event_loop_lag_seconds", "How late the event loop ran a callback scheduled on time",
+            (({}, loop_monitor.lag),)
+        )
+        for name, metric_type, description, value in (
+            ("event_loop_blocked_total", "counter", "Event loop stalls whose stack was captured", loop_monitor.blocked),
+            ("threadpool_threads_in_use", "gauge", "Worker threads running sync handlers", loop_monitor.threads_in_use),
+            ("threadpool_threads_limit", "gauge", "Worker threads sync handlers may use", loop_monitor.threads_limit),
+            ("threadpool_waiting", "gauge", "Calls waiting for a free worker thread", loop_monitor.threads_waiting),
+            ("threadpool_saturated_total", "counter", "Lag samples that found every worker thread busy",
+             loop_monitor.threadpool_saturated),
+        ):
+            lines += render_samples(name, description, metric_type, (({}, value),))
+    return "\n".join(lines) + "\n"
@@ -1,9 +1,25 @@
+import asyncio
 import logging
+import math
+import random
 import time
+from collections import deque
 from contextvars import ContextVar
+from typing import Dict, Iterable, Optional
 
 from fastapi import FastAPI
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.compression import (
+    DEFAULT_LEVELS, ENCODERS, CompressedBodyCache, compress, is_compressible, negotiate, route_levels
+)
+from app.core.config import settings
+from app.core.logging_config import new_trace_id, trace_id_from_headers, trace_id_var
+from app.core.metrics import QUEUE_WAIT_BUCKETS, Histogram, request_metrics
+from app.core.profiler import PROFILE_HEADER, PROFILE_ID_HEADER, ProfileStore, RequestProfiler, authorized
 
 
 logger = logging.getLogger(__name__)
@@ -11,17 +27,508 @@ logger = logging.getLogger(__name__)
 
 ctx = ContextVar("request_context")
 
+TRACE_ID_HEADER = "X-Request-ID"
+
+# Route label for requests no route matched, so unknown URLs can't grow the metric cardinality
+UNMATCHED_ROUTE = "unmatched"
+
+
+class InFlightRequests:
+    """Counts the HTTP requests currently being handled so shutdown can wait for them"""
+
+    def __init__(self):
+        self.count = 0
+        self._idle = None
+
+    def started(self) -> None:
+        self.count += 1
+
+    def finished(self) -> None:
+        self.count -= 1
+        if self.count == 0 and self._idle is not None:
+            self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no request is in flight, returns False if the timeout passed first"""
+        if self.count == 0:
+            return True
+        self._idle = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._idle = None
+
+
+in_flight_requests = InFlightRequests()
+
+
+def route_template(scope: Scope) -> str:
+    """The path template of the route that handled the request, e.g. /items/{item_id}"""
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class CustomMiddleware:
+    """
+    Pure ASGI middleware that logs every HTTP request, adds an X-Process-Time header
+    and records the request latency per route template.
+
+    The request's trace ID is taken from an incoming X-Request-ID or traceparent header,
+    or generated once here, and echoed back in the X-Request-ID response header.
+
+    Unlike BaseHTTPMiddleware it does not spawn a task or buffer the response through a
+    memory stream, so streaming bodies are passed straight through to the server.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        in_flight_requests.started()
+        trace_id = trace_id_from_headers(scope["headers"]) or new_trace_id()
+        trace_token = trace_id_var.set(trace_id)
+        method = scope["method"]
+        path = scope["path"]
+        logger.info("Before %s %s", method, path)
+        start_time = time.perf_counter_ns()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                process_time = (time.perf_counter_ns() - start_time) / 1e9
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", str(process_time))
+                headers.append(TRACE_ID_HEADER, trace_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            process_time = (time.perf_counter_ns() - start_time) / 1e9
+            request_metrics.observe(method, route_template(scope), status_code, process_time)
+            logger.info("After %s %s %s in %.3fs", method, path, status_code, process_time)
+            trace_id_var.reset(trace_token)
+            in_flight_requests.finished()
+
+
+class ConcurrencyLimiter:
+    """
+    Bounds the requests handled at once. Requests over the limit wait in a FIFO queue of at
+    most max_queue for up to queue_timeout seconds, and are rejected once either runs out.
+
+    With adaptive=True the limit moves between min_limit and max_limit with AIMD: it grows by
+    about one per limit's worth of requests answered within latency_tolerance times the
+    baseline latency, and is multiplied by backoff (at most once per baseline latency) when
+    a request is slower than that or the app answers 503/504. The baseline follows drops in
+    latency immediately and rises slowly, so it tracks the latency of an unloaded service.
+    """
+
+    def __init__(self, limit: int, adaptive: bool = False, min_limit: int = 1, max_queue: int = 100,
+                 queue_timeout: float = 0.5, latency_tolerance: float = 2.0, backoff: float = 0.9):
+        self.max_limit = limit
+        self.min_limit = min(min_limit, limit)
+        self.limit = float(limit)
+        self.adaptive = adaptive
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.baseline: Optional[float] = None
+        self.in_flight = 0
+        self.accepted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+        self.queue_wait: Dict[str, Histogram] = {}
+        self._waiters = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot, queueing if needed. Returns None once admitted, or why the request is rejected"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.accepted += 1
+            return None
+        if len(self._waiters) >= self.max_queue or self.queue_timeout <= 0:
+            self.rejected["queue_full"] += 1
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not (waiter.done() and not waiter.cancelled()):
+                self._remove(waiter)
+                self.rejected["queue_timeout"] += 1
+                return "queue_timeout"
+            # The slot was handed over in the iteration the wait timed out (possible since
+            # Python 3.12), the request holds it so it is admitted
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the request went away
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        self.accepted += 1
+        return None
+
+    def _remove(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def release(self):
+        """Give the slot of a finished request to the next queued one, if the limit allows"""
+        self.in_flight -= 1
+        self._wake()
+
+    def observe(self, route: str, queue_wait: float, latency: float, status_code: int):
+        histogram = self.queue_wait.get(route)
+        if histogram is None:
+            histogram = self.queue_wait[route] = Histogram(QUEUE_WAIT_BUCKETS)
+        histogram.observe(queue_wait)
+        if not self.adaptive:
+            return
+        if self.baseline is None:
+            self.baseline = latency
+        overloaded = status_code in (503, 504) or latency > self.baseline * self.latency_tolerance
+        if overloaded:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.baseline:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self.baseline = min(latency, self.baseline + 0.01 * (latency - self.baseline))
+            self._wake()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+
+OVERLOADED_BODY = b'{"detail":"Service overloaded, retry later"}'
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Pure ASGI middleware that sheds load with a ConcurrencyLimiter. Rejected requests get a
+    503 with Retry-After before any work is done for them. Paths starting with one of
+    exempt_paths (health checks, metrics) are never limited.
+
+    The adaptive limit is fed the time to the response start, so long streaming bodies
+    don't read as overload.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: ConcurrencyLimiter, exempt_paths: Iterable[str] = ()):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = tuple(exempt_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        queued_at = time.perf_counter()
+        rejection = await self.limiter.acquire()
+        if rejection is not None:
+            logger.warning("Shed %s %s: %s", scope["method"], scope["path"], rejection)
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(OVERLOADED_BODY)).encode()),
+                    (b"retry-after", str(self.limiter.retry_after()).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": OVERLOADED_BODY})
+            return
+
+        start_time = time.perf_counter()
+        latency = None
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal latency, status_code
+            if message["type"] == "http.response.start":
+                latency = time.perf_counter() - start_time
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.limiter.release()
+            if latency is None:
+                latency = time.perf_counter() - start_time
+            self.limiter.observe(route_template(scope), start_time - queued_at, latency, status_code)
+
+
+class _CompressingSend:
+    """The send of one response through CompressionMiddleware"""
+
+    def __init__(self, middleware: "CompressionMiddleware", scope: Scope, send: Send, accept_encoding: str):
+        self.middleware = middleware
+        self.scope = scope
+        self.send = send
+        self.accept_encoding = accept_encoding
+        self.start = None
+        self.passthrough = False
+        self.encoding = None
+        self.level = 0
+        self.encoder = None
+        self.buffer = []
+        self.buffered = 0
+
+    def _choose_encoding(self, message: Message) -> bool:
+        """Whether to compress the response started by message, sets encoding and level"""
+        if message["status"] < 200 or message["status"] in (204, 206, 304):
+            return False
+        headers = Headers(raw=message["headers"])
+        # Range capable responses (files) must keep their byte offsets
+        if "content-encoding" in headers or "accept-ranges" in headers:
+            return False
+        if not is_compressible(headers.get("content-type", "")) or "no-transform" in headers.get("cache-control", ""):
+            return False
+        MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+        levels = route_levels(self.middleware.levels, self.middleware.route_levels.get(route_template(self.scope)))
+        self.encoding = negotiate(self.accept_encoding, levels)
+        if self.encoding is None:
+            return False
+        self.level = levels[self.encoding]
+        return True
+
+    def _encoded_headers(self, content_length: Optional[int] = None) -> MutableHeaders:
+        headers = MutableHeaders(scope=self.start)
+        headers["content-encoding"] = self.encoding
+        if content_length is None:
+            del headers["content-length"]
+        else:
+            headers["content-length"] = str(content_length)
+        # The compressed representation differs byte for byte, only a weak validator still holds
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = f"W/{etag}"
+        return headers
+
+    async def _send_whole(self, body: bytes):
+        if len(body) < self.middleware.minimum_size:
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+        etag = Headers(raw=self.start["headers"]).get("etag")
+        body_cache = self.middleware.body_cache
+        resource = self.scope["path"]
+        if self.scope.get("query_string"):
+            resource += "?" + self.scope["query_string"].decode("latin-1")
+        compressed = body_cache.get(resource, etag, self.encoding, self.level) if etag else None
+        if compressed is None:
+            compressed = compress(self.encoding, self.level, body)
+            if etag:
+                body_cache.put(resource, etag, self.encoding, self.level, compressed)
+        self._encoded_headers(len(compressed))
+        await self.send(self.start)
+        await self.send({"type": "http.response.body", "body": compressed})
+
+    async def __call__(self, message: Message):
+        if self.passthrough:
+            await self.send(message)
+            return
+        if message["type"] == "http.response.start":
+            self.start = message
+            if not self._choose_encoding(message):
+                self.passthrough = True
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is None:
+            self.buffer.append(body)
+            self.buffered += len(body)
+            if not more_body:
+                await self._send_whole(b"".join(self.buffer))
+                return
+            if self.buffered < self.middleware.minimum_size:
+                # Too little to tell yet whether the stream is worth compressing
+                return
+            self.encoder = ENCODERS[self.encoding](self.level)
+            self._encoded_headers()
+            await self.send(self.start)
+            body = b"".join(self.buffer)
+            self.buffer = []
+
+        # Flush every chunk so stream consumers can decode it as soon as it arrives
+        data = self.encoder.compress(body) + (self.encoder.flush() if more_body else self.encoder.finish())
+        if data or not more_body:
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware that compresses response bodies with zstd, brotli or gzip,
+    whichever the client accepts first in that order among the installed codecs.
+
+    Whole bodies under minimum_size are sent as they are. Streamed bodies are buffered up to
+    minimum_size, then compressed and flushed chunk by chunk, never buffered whole. Levels
+    come from levels, overridden per route template by route_levels (a level of 0 turns a
+    codec off for the route). Bodies with an ETag are compressed once and reused from an LRU.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, levels: Optional[Dict[str, int]] = None,
+                 route_levels: Optional[Dict[str, Dict[str, int]]] = None,
+                 body_cache: Optional[CompressedBodyCache] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {
+            encoding: level for encoding, level in {**DEFAULT_LEVELS, **(levels or {})}.items()
+            if encoding in ENCODERS and level > 0
+        }
+        # Keep the server's preference order
+        self.levels = {encoding: self.levels[encoding] for encoding in ENCODERS if encoding in self.levels}
+        self.route_levels = route_levels or {}
+        self.body_cache = body_cache or CompressedBodyCache()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        if not accept_encoding:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(self, scope, send, accept_encoding))
+
+
+class ProfilerMiddleware:
+    """
+    Pure ASGI middleware that profiles single requests with a RequestProfiler: requests sending
+    the token in the X-Profile header, and a route_rates fraction of the requests to each
+    route template. The profile is saved to the ProfileStore in speedscope format once the
+    response is sent, under the name returned in the X-Profile-Id header.
+
+    Requests that aren't profiled only pay for the trigger check, no sampler thread runs.
+    """
+
+    def __init__(self, app: ASGIApp, store: ProfileStore, token: Optional[str] = None,
+                 route_rates: Optional[Dict[str, float]] = None, interval: float = 0.005):
+        self.app = app
+        self.store = store
+        self.token = token
+        self.route_rates = route_rates or {}
+        self.interval = interval
+        self.header = PROFILE_HEADER.lower().encode()
+        self._routes = None
+
+    def _sampled_routes(self, scope: Scope):
+        """The (route, rate) of route_rates, the routes are looked up on the first request"""
+        if self._routes is None:
+            self._routes = [
+                (route, self.route_rates[route.path]) for route in scope["app"].routes
+                if getattr(route, "path", None) in self.route_rates
+            ]
+        return self._routes
+
+    def _triggered(self, scope: Scope) -> bool:
+        if self.token:
+            for key, value in scope["headers"]:
+                if key == self.header:
+                    if authorized(self.token, value):
+                        return True
+                    break
+        if self.route_rates:
+            for route, rate in self._sampled_routes(scope):
+                if route.matches(scope)[0] == Match.FULL:
+                    return random.random() < rate
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._triggered(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = self.store.new_name(trace_id_var.get())
+        profiler = RequestProfiler(asyncio.current_task(), self.interval)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, name)
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            title = f"{scope['method']} {scope['path']}"
+            await run_in_threadpool(self._save, profiler, name, title)
 
-class CustomMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        logger.info(f"Before {request.method} {request.url} {call_next}")
-        request.state.start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - request.state.start_time
-        logger.info(f"After {request.method} {request.url} {response.status_code} in {round(process_time, 3)}s")
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
+    def _save(self, profiler: RequestProfiler, name: str, title: str):
+        profiler.join()
+        try:
+            self.store.save(name, profiler.to_speedscope(title))
+        except OSError:
+            logger.error("Failed to save profile %s", name, exc_info=True)
+            return
+        logger.info("Profiled %s in %.3fs with %s samples as %s", title, profiler.duration, len(profiler.samples), name)
 
 
 def add_middleware(app: FastAPI):
-    app.add_middleware(CustomMiddleware)
\ No newline at end of file
+    # The last middleware added runs first, so the limiter sits inside CustomMiddleware
+    # and shed requests are still logged, traced and counted
+    if settings.compression:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.compression_minimum_size,
+            levels=settings.compression_levels,
+            route_levels=settings.compression_route_levels
+        )
+    if settings.concurrency_limit:
+        app.state.concurrency_limiter = ConcurrencyLimiter(
+            settings.concurrency_limit,
+            adaptive=settings.concurrency_adaptive,
+            min_limit=settings.concurrency_min_limit,
+            max_queue=settings.concurrency_max_queue,
+            queue_timeout=settings.concurrency_queue_timeout,
+            latency_tolerance=settings.concurrency_latency_tolerance
+        )
+        app.add_middleware(
+            ConcurrencyLimitMiddleware,
+            limiter=app.state.concurrency_limiter,
+            exempt_paths=settings.concurrency_exempt_paths
+        )
+    if settings.profiler_token or settings.profiler_route_rates:
+        # Right inside CustomMiddleware, so profiles carry the trace ID and include queueing
+        app.state.profile_store = ProfileStore(settings.profiler_directory, settings.profiler_max_profiles)
+        app.add_middleware(
+            ProfilerMiddleware,
+            store=app.state.profile_store,
+            token=settings.profiler_token,
+            route_rates=settings.profiler_route_rates,
+            interval=settings.profiler_interval
+        )
+    app.add_middleware(CustomMiddleware)
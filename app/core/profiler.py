@@ -0,0 +1,185 @@
+import asyncio
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.response_factory import dumps_json
+
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# Pseudo frames ending the stack of a sample taken while the request's task was suspended
+WAITING = ("[waiting]", "", 0)
+LOOP_BUSY = ("[loop running another task]", "", 0)
+
+Frame = Tuple[str, str, int]
+
+
+def authorized(token: Optional[str], value) -> bool:
+    """Whether value (str or bytes, e.g. an X-Profile header) is the profiler token"""
+    if not token or not value:
+        return False
+    if isinstance(value, str):
+        value = value.encode()
+    return secrets.compare_digest(token.encode(), value)
+
+
+def _frame(frame) -> Frame:
+    code = frame.f_code
+    return code.co_qualname, code.co_filename, code.co_firstlineno
+
+
+def _await_chain(coro) -> List:
+    """Frames of coro and the coroutines, generators and async generators it awaits, outermost first"""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+
+class RequestProfiler:
+    """
+    Samples the stack of one asyncio task every interval seconds from a background thread.
+
+    When the task is running, the sample is the event loop thread's stack from the task's
+    coroutine down. When it is suspended, the sample is its chain of awaits, ending in
+    [waiting] (for I/O, a timer, a worker thread) or [loop running another task] (ready
+    but queued behind other requests), so the profile accounts for the request's wall time.
+    """
+
+    def __init__(self, task: asyncio.Task, interval: float = 0.005):
+        self.task = task
+        self.interval = interval
+        self.samples: List[List[Frame]] = []
+        self.weights: List[float] = []
+        self.started = 0.0
+        self.duration = 0.0
+        self._loop = task.get_loop()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _stack(self) -> List[Frame]:
+        coro = self.task.get_coro()
+        current = asyncio.current_task(self._loop)
+        if current is not self.task:
+            return [_frame(frame) for frame in _await_chain(coro)] + [WAITING if current is None else LOOP_BUSY]
+        frame = sys._current_frames().get(self._thread_id)
+        root = coro.cr_frame
+        stack = []
+        while frame is not None:
+            stack.append(_frame(frame))
+            if frame is root:
+                break
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self):
+        last = self.started
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            try:
+                stack = self._stack()
+            except (AttributeError, RuntimeError):
+                # The task moved on while its frames were read, skip this sample
+                stack = None
+            if stack:
+                self.samples.append(stack)
+                self.weights.append(now - last)
+            last = now
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling, doesn't wait for the sampler thread, see join"""
+        self.duration = time.perf_counter() - self.started
+        self._stopped.set()
+
+    def join(self):
+        self._thread.join()
+
+    def to_speedscope(self, name: str) -> Dict:
+        """The samples as a speedscope sampled profile, weighted by the seconds each one stands for"""
+        frames: Dict[Frame, int] = {}
+        samples = [[frames.setdefault(frame, len(frames)) for frame in stack] for stack in self.samples]
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "app.core.profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [
+                {"name": function, "file": file, "line": line} if file else {"name": function}
+                for function, file, line in frames
+            ]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": self.weights,
+            }],
+        }
+
+
+class ProfileStore:
+    """
+    Ring buffer of profiles in a directory: once max_profiles are kept, saving one deletes
+    the oldest. Names start with the time they were taken so they sort oldest first, the
+    directory can be shared by several workers.
+    """
+
+    SUFFIX = ".speedscope.json"
+    NAME_PATTERN = re.compile(r"^\d{8}T\d{9}-\d+-[A-Za-z0-9-]{0,64}\.speedscope\.json$")
+
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def new_name(self, trace_id: str = "") -> str:
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        trace_id = re.sub(r"[^A-Za-z0-9-]", "", trace_id)[:64]
+        return f"{stamp}-{os.getpid()}-{trace_id}{self.SUFFIX}"
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of the profile called name, None for names this store doesn't write (e.g. ../x)"""
+        if not self.NAME_PATTERN.match(name):
+            return None
+        return os.path.join(self.directory, name)
+
+    def list(self) -> List[str]:
+        """Names of the kept profiles, oldest first"""
+        try:
+            return sorted(name for name in os.listdir(self.directory) if self.NAME_PATTERN.match(name))
+        except FileNotFoundError:
+            return []
+
+    def save(self, name: str, profile: Dict):
+        """Write profile (blocking, call it off the event loop) and drop the oldest beyond max_profiles"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as file:
+            file.write(dumps_json(profile))
+        os.replace(path + ".tmp", path)
+        for old in self.list()[:-self.max_profiles]:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except FileNotFoundError:
+                pass
@@ -1,20 +1,134 @@
+import csv
+import io
+import json
 import logging
-from typing import Any, Dict, List, Optional, Union
+import sys
+from decimal import Decimal
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Union
 from fastapi import HTTPException, status
 from fastapi.responses import (
     JSONResponse,
     HTMLResponse,
-    FileResponse,
     StreamingResponse,
     RedirectResponse,
     PlainTextResponse
 )
 from fastapi.encoders import jsonable_encoder
-import os
+from pydantic import BaseModel
+from pydantic_core import to_json
+import orjson
+
+from app.core.file_response import FastFileResponse
 
 
 logger = logging.getLogger(__name__)
 
+# Serialized items are coalesced into chunks of about this many bytes per send
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize the types orjson doesn't know natively (models, ObjectId, Decimal, sets...)"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        # Same as jsonable_encoder
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        # Bytes that aren't UTF-8 (e.g. a bytea column) don't fail the response
+        return value.decode(errors="replace")
+    if hasattr(value, "items"):
+        # Mapping-like rows such as asyncpg Records
+        return dict(value.items())
+    # Looked up instead of imported, no value can be an ObjectId before bson is loaded
+    bson = sys.modules.get("bson")
+    if bson is not None and isinstance(value, bson.ObjectId):
+        return str(value)
+    # Paths, timedeltas... and an error for types nothing knows, instead of their repr
+    return jsonable_encoder(value)
+
+
+def dumps_json(item: Any) -> bytes:
+    """Serialize to compact JSON bytes the way every response body of the service is."""
+    try:
+        return orjson.dumps(item, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # e.g. integers beyond 64 bits, which orjson rejects
+        return json.dumps(jsonable_encoder(item), separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson instead of the stdlib json module.
+    Content that is already serialized bytes is sent as is.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps_json(content)
+
+
+async def _iterate(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _chunked(parts: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[bytes]:
+    """Join small parts into chunks of about chunk_size bytes, holding at most one chunk in memory"""
+    buffer = []
+    size = 0
+    async for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+async def _ndjson_parts(items: Union[Iterable, AsyncIterable]) -> AsyncIterator[bytes]:
+    async for item in _iterate(items):
+        yield dumps_json(item) + b"\n"
+
+
+async def _csv_parts(rows: Union[Iterable, AsyncIterable], columns: Optional[List[str]], header: bool) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    first = True
+    async for row in _iterate(rows):
+        if first:
+            first = False
+            if columns is None and hasattr(row, "keys"):
+                columns = list(row.keys())
+            if header and columns:
+                writer.writerow(columns)
+        if hasattr(row, "keys"):
+            row = [row[column] for column in columns] if columns else list(row.values())
+        writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if first and header and columns:
+        writer.writerow(columns)
+        yield buffer.getvalue().encode()
+
+
+async def _json_array_parts(items: Union[Iterable, AsyncIterable]) -> AsyncIterator[bytes]:
+    separator = b"["
+    async for item in _iterate(items):
+        yield separator + dumps_json(item)
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
 
 class ResponseFactory:
     """
@@ -39,13 +153,15 @@ class ResponseFactory:
         Returns:
             JSONResponse: A FastAPI JSONResponse object
         """
-        # Convert content to a JSON-compatible format
-        logger.info(f"Converting {content}")
-        json_content = jsonable_encoder(content)
-        logger.info(f"Converted {content}")
-
-        return JSONResponse(
-            content=json_content,
+        # Serialize straight to bytes, pydantic models with their compiled serializer,
+        # everything else with orjson, instead of a jsonable_encoder pass and a stdlib json pass
+        if isinstance(content, BaseModel):
+            body = to_json(content)
+        else:
+            body = dumps_json(content)
+
+        return FastJSONResponse(
+            content=body,
             status_code=status_code,
             headers=headers
         )
@@ -80,9 +196,11 @@ class ResponseFactory:
             media_type: Optional[str] = None,
             status_code: int = status.HTTP_200_OK,
             headers: Optional[Dict[str, str]] = None
-    ) -> FileResponse:
+    ) -> FastFileResponse:
         """
         Create a file download response.
+        The file is stat'ed off the event loop when the response is sent, and conditional
+        (ETag/Last-Modified) and byte range requests are answered with 304, 206 or 416.
 
         Args:
             path: Path to the file to be served
@@ -92,18 +210,9 @@ class ResponseFactory:
             headers: Optional dictionary of headers
 
         Returns:
-            FileResponse: A FastAPI FileResponse object
-
-        Raises:
-            HTTPException: If the file does not exist
+            FastFileResponse: A response that answers 404 if the file does not exist
         """
-        if not os.path.isfile(path):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"File not found: {filename or path}"
-            )
-
-        return FileResponse(
+        return FastFileResponse(
             path=path,
             filename=filename,
             media_type=media_type,
@@ -137,6 +246,93 @@ class ResponseFactory:
             headers=headers
         )
 
+    @staticmethod
+    def ndjson_response(
+            items: Union[Iterable, AsyncIterable],
+            status_code: int = status.HTTP_200_OK,
+            headers: Optional[Dict[str, str]] = None,
+            chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> StreamingResponse:
+        """
+        Stream items as newline delimited JSON while they are produced.
+
+        Args:
+            items: An iterable or async iterable of JSON-able items, e.g. MongoConnectionManager.iter_many
+                or PostgresConnectionManager.iter_rows
+            status_code: HTTP status code (default: 200 OK)
+            headers: Optional dictionary of headers
+            chunk_size: Approximate number of bytes sent per chunk
+
+        Returns:
+            StreamingResponse: A FastAPI StreamingResponse object
+        """
+        return ResponseFactory.streaming_response(
+            content=_chunked(_ndjson_parts(items), chunk_size),
+            media_type="application/x-ndjson",
+            status_code=status_code,
+            headers=headers
+        )
+
+    @staticmethod
+    def json_array_response(
+            items: Union[Iterable, AsyncIterable],
+            status_code: int = status.HTTP_200_OK,
+            headers: Optional[Dict[str, str]] = None,
+            chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> StreamingResponse:
+        """
+        Stream items as a single JSON array while they are produced.
+
+        Args:
+            items: An iterable or async iterable of JSON-able items, e.g. MongoConnectionManager.iter_many
+            status_code: HTTP status code (default: 200 OK)
+            headers: Optional dictionary of headers
+            chunk_size: Approximate number of bytes sent per chunk
+
+        Returns:
+            StreamingResponse: A FastAPI StreamingResponse object
+        """
+        return ResponseFactory.streaming_response(
+            content=_chunked(_json_array_parts(items), chunk_size),
+            media_type="application/json",
+            status_code=status_code,
+            headers=headers
+        )
+
+    @staticmethod
+    def csv_response(
+            rows: Union[Iterable, AsyncIterable],
+            columns: Optional[List[str]] = None,
+            header: bool = True,
+            filename: Optional[str] = None,
+            status_code: int = status.HTTP_200_OK,
+            headers: Optional[Dict[str, str]] = None,
+            chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> StreamingResponse:
+        """
+        Stream rows as CSV while they are produced, e.g. from PostgresConnectionManager.iter_rows.
+
+        Args:
+            rows: An iterable or async iterable of sequences or mappings (dicts, asyncpg Records)
+            columns: Column order, taken from the first mapping row if not provided
+            header: Whether to write the column names as the first line
+            filename: Optional filename to download the CSV as
+            status_code: HTTP status code (default: 200 OK)
+            headers: Optional dictionary of headers
+            chunk_size: Approximate number of bytes sent per chunk
+
+        Returns:
+            StreamingResponse: A FastAPI StreamingResponse object
+        """
+        if filename:
+            headers = {**(headers or {}), "Content-Disposition": f'attachment; filename="{filename}"'}
+        return ResponseFactory.streaming_response(
+            content=_chunked(_csv_parts(rows, columns, header), chunk_size),
+            media_type="text/csv; charset=utf-8",
+            status_code=status_code,
+            headers=headers
+        )
+
     @staticmethod
     def text_response(
             content: str,
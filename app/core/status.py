@@ -0,0 +1,82 @@
+import time
+from typing import Any, Callable
+
+from fastapi import FastAPI, Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from app.core.config import settings
+from app.core.db import db_connections
+from app.core.response_factory import dumps_json
+from app.models.responses import StatusResponse, VersionResponse
+
+
+class PrecomputedJSON:
+    """
+    JSON body that only changes with its timestamp (or other slowly moving content).
+    build is called at most once per refresh_interval seconds, every request in between
+    is answered with the same pre-encoded bytes.
+    """
+
+    def __init__(self, build: Callable[[], Any], refresh_interval: float = 1.0):
+        self.build = build
+        self.refresh_interval = refresh_interval
+        self._body = b""
+        self._expires = 0.0
+
+    def refresh(self) -> bytes:
+        content = self.build()
+        if isinstance(content, BaseModel):
+            self._body = to_json(content, exclude_none=True)
+        else:
+            self._body = dumps_json(content)
+        self._expires = time.monotonic() + self.refresh_interval
+        return self._body
+
+    def body(self) -> bytes:
+        if time.monotonic() >= self._expires:
+            return self.refresh()
+        return self._body
+
+    def response(self) -> Response:
+        return Response(self.body(), media_type="application/json")
+
+
+def _pool_stats(app: FastAPI):
+    """Pool snapshot of every manager, with the last background probe result when the prober runs"""
+    managers = {db: getattr(app.state, db, None) for db in db_connections}
+    prober = getattr(app.state, "health_prober", None)
+    pools = {}
+    for db, manager in managers.items():
+        if manager is None:
+            continue
+        pools[db] = manager.stats()
+        if prober is not None and db in prober.backends:
+            pools[db].update(prober.backends[db].to_dict())
+    return pools
+
+
+def setup_status_responses(app: FastAPI):
+    """Build and encode the /server/version and /server/status bodies, called once at startup"""
+    app.state.version_body = PrecomputedJSON(
+        lambda: VersionResponse(name=settings.server_name, version=settings.version),
+        settings.status_refresh_interval
+    )
+    app.state.status_body = PrecomputedJSON(
+        lambda: StatusResponse(
+            name=settings.server_name,
+            version=settings.version,
+            services=list(settings.databases.keys()),
+            pools=_pool_stats(app) if settings.status_include_pools else None
+        ),
+        settings.status_refresh_interval
+    )
+    app.state.version_body.refresh()
+    app.state.status_body.refresh()
+
+
+def status_responses(app: FastAPI):
+    """(version, status) bodies of app, built on first use when startup didn't run (e.g. in tests)"""
+    if getattr(app.state, "status_body", None) is None:
+        setup_status_responses(app)
+    return app.state.version_body, app.state.status_body
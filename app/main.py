@@ -1,5 +1,4 @@
-import json
-import logging.config
+import logging
 from fastapi import FastAPI
 
 from app.core.config import settings
@@ -7,12 +6,11 @@ from app.api import routes
 from app.core.events import service_lifespan
 
 from app.core.exception_handlers import add_exception_handlers
+from app.core.logging_config import configure_logging
 from app.core.middleware import add_middleware
 
 
-with open('app/core/logging_config.json', 'r') as f:
-    config = json.load(f)
-    logging.config.dictConfig(config)
+configure_logging(log_directory=settings.log_directory)
 
 
 
@@ -26,6 +24,7 @@ app = FastAPI(
     lifespan=service_lifespan
 )
 app.include_router(router=routes.server_router)
+app.include_router(router=routes.health_router)
 add_middleware(app)
 add_exception_handlers(app)
 
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, model_validator
 from datetime import datetime, timezone
-from typing import Optional, Dict, List
+from typing import Any, Optional, Dict, List
 import ujson as json
 
 
@@ -17,9 +17,9 @@ class BaseWithTimestamp(BaseModel):
         return data
 
     def to_dict(self, remove_none=True):
-        response = self.model_dump()
+        response = self.model_dump(exclude_none=remove_none)
         if remove_none:
-            response = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in response.items() if v is not None}
+            response = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in response.items()}
         return response
 
     def __str__(self):
@@ -34,4 +34,5 @@ class VersionResponse(BaseWithTimestamp):
 
 class StatusResponse(VersionResponse):
     services: List[str]
+    pools: Optional[Dict[str, Dict[str, Any]]] = None
 
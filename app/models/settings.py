@@ -1,21 +1,62 @@
 import os
 import logging
 
-from pydantic import model_validator, Field
+from pydantic import BaseModel, model_validator, Field
 from pydantic_settings import BaseSettings
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Literal
 
 
 logger = logging.getLogger(__name__)
 
 
-class DatabaseSettings(BaseSettings):
+class DatabaseSettings(BaseModel):
+    """
+    Settings of one database, filled by Settings from its <DB>_<FIELD> variables (e.g.
+    POSTGRES_MAX_POOL_SIZE) only, not from bare environment variables such as HOST
+    """
     name: str
     port: int
+    host: Optional[str] = None
     user: Optional[str] = None
     password: Optional[str] = None
     db_name: Optional[str] = None
 
+    # Pool settings
+    min_pool_size: int = Field(default=5, ge=0)
+    max_pool_size: int = Field(default=10, ge=1)
+    acquire_timeout: float = 10.0
+    command_timeout: Optional[float] = None
+    idle_timeout: float = 300.0
+    statement_cache_size: int = 100
+    keepalive: bool = True
+    auto_batch: Optional[bool] = None  # Redis only, coalesce concurrent GETs into MGETs
+
+    # Resilience settings
+    operation_timeout: float = 10.0  # deadline of one operation, retries included
+    retry_attempts: int = Field(default=3, ge=1)  # attempts of idempotent operations on transient errors
+    retry_base_delay: float = 0.05
+    retry_max_delay: float = 1.0
+    breaker_failure_threshold: int = Field(default=5, ge=1)
+    breaker_reset_timeout: float = 30.0  # seconds an open breaker fails fast before a trial call
+
+    @model_validator(mode='after')
+    def check_pool_size(self):
+        if self.min_pool_size > self.max_pool_size:
+            raise ValueError(f"{self.name} min_pool_size {self.min_pool_size} is above max_pool_size {self.max_pool_size}")
+        return self
+
+    def manager_options(self):
+        """Keyword arguments for the connection manager of this database"""
+        return self.model_dump(exclude={"name", "user", "password", "port", "db_name"}, exclude_none=True)
+
+
+DATABASE_OPTIONS = (
+    "host", "min_pool_size", "max_pool_size", "acquire_timeout", "command_timeout",
+    "idle_timeout", "statement_cache_size", "keepalive", "auto_batch",
+    "operation_timeout", "retry_attempts", "retry_base_delay", "retry_max_delay",
+    "breaker_failure_threshold", "breaker_reset_timeout"
+)
+
 
 class Settings(BaseSettings):
     server_name: str
@@ -24,8 +65,76 @@ class Settings(BaseSettings):
     internal_port: int
     external_port: int
 
+    # Server settings, used by app.serve
+    workers: int = 0  # 0 sizes the worker count from the available CPUs
+    backlog: int = 2048
+    keep_alive_timeout: int = 5
+    limit_concurrency: Optional[int] = None
+    limit_max_requests: Optional[int] = None
+    limit_max_requests_jitter: int = 0
+    shutdown_delay: float = 0.0  # seconds readiness fails before the server stops accepting connections
+    shutdown_drain_timeout: float = 30.0
+
+    # Load shedding settings, the limiter is off unless concurrency_limit is set
+    concurrency_limit: Optional[int] = None  # requests handled at once, the upper bound when adaptive
+    concurrency_adaptive: bool = False
+    concurrency_min_limit: int = 1
+    concurrency_max_queue: int = 100
+    concurrency_queue_timeout: float = 0.5  # seconds a request waits for a slot before a 503
+    concurrency_latency_tolerance: float = 2.0
+    concurrency_exempt_paths: List[str] = [
+        "/health/", "/server/version", "/server/status", "/server/metrics", "/server/loop"
+    ]
+
+    # Response compression settings
+    compression: bool = True
+    compression_minimum_size: int = 1024  # bytes, smaller bodies are sent as they are
+    compression_levels: Dict[str, int] = Field(default_factory=dict)  # e.g. {"gzip": 6, "br": 4, "zstd": 3}
+    compression_route_levels: Dict[str, Dict[str, int]] = Field(default_factory=dict)  # by route template
+
+    # Request profiler settings, off unless a token or a route sampling rate is set
+    # Requests sending the token in the X-Profile header are profiled. Sent as a bearer token it
+    # opens /server/profiles, which answers 404 without it
+    profiler_token: Optional[str] = None
+    profiler_route_rates: Dict[str, float] = Field(default_factory=dict)  # fraction profiled by route template
+    profiler_interval: float = 0.005  # seconds between stack samples
+    profiler_directory: str = "profiles"
+    profiler_max_profiles: int = 50  # the oldest profile is deleted beyond this
+
+    # Health check response settings
+    status_refresh_interval: float = 1.0  # seconds the /server/version and /server/status bodies are reused
+    status_include_pools: bool = False
+
+    # Background health probe settings
+    health_check_interval: float = 5.0
+    health_check_timeout: float = 2.0
+    health_failure_threshold: int = 3  # consecutive failed probes before a backend is unhealthy
+    health_success_threshold: int = 2  # consecutive successful probes before it is healthy again
+
+    # Event loop monitor settings
+    loop_monitor: bool = True
+    loop_monitor_interval: float = 0.25  # seconds between event loop lag samples
+    loop_block_threshold: float = 0.1  # seconds of lag after which the blocking stack is captured
+    loop_block_history: int = 20  # captured stacks kept for /server/loop
+    loop_monitor_token: Optional[str] = None  # bearer token opening /server/loop, which answers 404 without it
+
+    # Response cache settings
+    cache_max_entries: int = 1024
+    cache_local_ttl: float = 1.0  # seconds a worker serves an entry without checking Redis
+
+    # File response settings
+    file_cache_max_entries: int = 1024  # files whose stat and ETag are kept in memory
+    file_cache_ttl: float = 1.0  # seconds a cached stat is trusted
+
+    # Logging settings
+    log_directory: str = "logs"  # where the file handlers write, relative to the working directory
+    async_logging: bool = False
+    log_queue_size: int = 10000
+    log_queue_policy: Literal["drop", "block"] = "drop"
+
     # Database settings
     databases: Optional[Dict[str, DatabaseSettings]] = Field(default_factory=dict)
+    db_startup_timeout: float = 30.0
 
     class Config:
         env_file = ".env" if os.path.isfile(".env") else None
@@ -37,8 +146,7 @@ class Settings(BaseSettings):
     def load_databases(cls, values):
         # Initialize databases if not present
         db_list = ['postgres', 'mongo', 'redis']
-        logger.info(f"values are: {values}")
-        logger.info(f"env file is {os.path.isfile('.env')}")
+        # values and the environment hold the database passwords, never log them
         if os.path.isfile(".env") is False:
             db_envs = {
                 k.lower(): v for k, v in os.environ.items() if any(db in k.lower() for db in db_list)
@@ -57,13 +165,17 @@ class Settings(BaseSettings):
                 if prefix in db_list:
                     db_prefixes.add(prefix)
 
-        logger.info(f"Processing databases: {db_prefixes} from {db_envs}")
         # Build database settings for each identified database
         for prefix in db_prefixes:
             port_key = f"{prefix}_port"
             user_key = f"{prefix}_user"
             password_key = f"{prefix}_password"
             name_key = f"{prefix}_db"
+            # Optional per database overrides, e.g. POSTGRES_MAX_POOL_SIZE
+            options = {
+                option: db_envs[f"{prefix}_{option}"]
+                for option in DATABASE_OPTIONS if f"{prefix}_{option}" in db_envs
+            }
 
             if port_key in db_envs:
                 db_settings = DatabaseSettings(
@@ -72,10 +184,8 @@ class Settings(BaseSettings):
                     user=db_envs.get(user_key),
                     password=db_envs.get(password_key),
                     db_name=db_envs.get(name_key, prefix),
+                    **options
                 )
                 values['databases'][prefix] = db_settings
-        logger.info(f"DBS: {values['databases'].keys()}")
+        logger.debug("Configured databases: %s", list(values['databases']))
         return values
-
-
-settings = Settings()
\ No newline at end of file
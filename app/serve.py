@@ -0,0 +1,97 @@
+"""
+Production entry point.
+
+    python -m app.serve
+
+Runs uvicorn with as many workers as the container may use, uvloop and httptools
+when they are installed, and the socket and worker limits from Settings.
+For development use `python -m app.main`, which runs a single reloading worker.
+"""
+import importlib.util
+import logging
+import logging.config
+import math
+import os
+
+import uvicorn
+
+from app.core.config import settings
+from app.core.logging_config import load_logging_config
+
+
+logger = logging.getLogger(__name__)
+
+def _cgroup_cpu_limit():
+    """CPU limit from the cgroup quota (v2, then v1), or None when unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus():
+    """CPUs this process may run on, bounded by the container's CPU quota"""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(cpus, 1)
+
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def build_options():
+    """uvicorn.run keyword arguments for the production server"""
+    return dict(
+        app="app.main:app",
+        host="0.0.0.0",
+        port=settings.internal_port,
+        workers=settings.workers or available_cpus(),
+        loop="uvloop" if _installed("uvloop") else "asyncio",
+        http="httptools" if _installed("httptools") else "h11",
+        backlog=settings.backlog,
+        timeout_keep_alive=settings.keep_alive_timeout,
+        limit_concurrency=settings.limit_concurrency,
+        limit_max_requests=settings.limit_max_requests,
+        # Each worker adds up to this many requests to its limit, so they recycle one at a time
+        limit_max_requests_jitter=settings.limit_max_requests_jitter,
+        timeout_graceful_shutdown=settings.shutdown_drain_timeout,
+        log_config=load_logging_config(log_directory=settings.log_directory),
+        proxy_headers=True,
+    )
+
+
+def main():
+    options = build_options()
+    logging.config.dictConfig(options["log_config"])
+    logger.info(
+        "Starting %s worker(s) with loop=%s http=%s backlog=%s limit_concurrency=%s limit_max_requests=%s",
+        options["workers"], options["loop"], options["http"], options["backlog"],
+        options["limit_concurrency"], options["limit_max_requests"]
+    )
+    # With several workers uvicorn supervises them and replaces those that exit,
+    # e.g. after reaching limit_max_requests
+    uvicorn.run(**options)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,30 @@
-import os.path
 import unittest
-import requests
+from unittest import mock
 
-from app.models.settings import Settings
+from app.core.config import get_settings
+from client.load_test import (
+    SCENARIOS, LatencyRecorder, closed_loop, compare_results, load_client, local_app, open_loop, percentile
+)
 
+settings = get_settings()
 
-print(f"Starting tests on .env {os.path.isfile('.env')}")
-if os.path.isfile('.env') is False:
-    print(f"Current folder {os.curdir}: {os.listdir(os.curdir)}")
-settings = Settings()
-print(f"Service name: {settings.server_name}")
 
+class ServiceTestCase(unittest.IsolatedAsyncioTestCase):
+    """The service in-process, with local database stand-ins"""
 
-class MyTestCase(unittest.TestCase):
-    def test_version(self):
-        response = requests.get(f"http://localhost:{settings.external_port}/server/version")
-        print(response.json())
+    async def asyncSetUp(self):
+        self.app = await self.enterAsyncContext(local_app(latency=0.0001))
+        self.client = await self.enterAsyncContext(load_client(self.app))
+
+    async def test_version(self):
+        response = await self.client.get("/server/version")
         self.assertEqual(200, response.status_code)
         response_json = response.json()
         self.assertEqual(settings.server_name, response_json.get("name"))
         self.assertEqual(settings.version, response_json.get("version"))
 
-    def test_status(self):
-        response = requests.get(f"http://localhost:{settings.external_port}/server/status")
-        print(response.json())
+    async def test_status(self):
+        response = await self.client.get("/server/status")
         self.assertEqual(200, response.status_code)
         response_json = response.json()
         self.assertEqual(settings.server_name, response_json.get("name"))
@@ -31,7 +32,76 @@ class MyTestCase(unittest.TestCase):
         for service in settings.databases:
             self.assertTrue(service in response_json.get('services', {}))
 
+    async def test_status_pools_encode_the_histogram_bounds(self):
+        with mock.patch.object(settings, "status_include_pools", True):
+            self.app.state.status_body.refresh()
+            response = await self.client.get("/server/status")
+        buckets = response.json()["pools"]["postgres"]["acquire_wait"]["buckets"]
+        self.assertEqual("+Inf", list(buckets)[-1])
+        self.assertEqual(buckets["+Inf"], response.json()["pools"]["postgres"]["acquire_wait"]["count"])
+
+    async def test_loop_stalls_need_the_token(self):
+        with mock.patch.object(settings, "loop_monitor_token", "secret-token"):
+            response = await self.client.get("/server/loop")
+            self.assertEqual(404, response.status_code)
+            response = await self.client.get("/server/loop", headers={"Authorization": "Bearer wrong"})
+            self.assertEqual(404, response.status_code)
+            response = await self.client.get("/server/loop", headers={"Authorization": "Bearer secret-token"})
+            self.assertEqual(200, response.status_code)
+            self.assertIn("stalls", response.json())
+
+    async def test_every_scenario_answers(self):
+        for scenario in SCENARIOS.values():
+            recorder, _ = await closed_loop(self.client, scenario, concurrency=4, duration=0.05)
+            summary = recorder.summary(0.05)
+            self.assertGreater(summary["requests"], 0, scenario.name)
+            self.assertEqual({}, summary["error_types"], scenario.name)
+
+    async def test_open_loop_keeps_its_rate(self):
+        recorder, elapsed = await open_loop(self.client, SCENARIOS["health_live"], rps=200, duration=0.25)
+        self.assertEqual(50, len(recorder.latencies))
+        self.assertLess(elapsed, 0.5)
+
+
+class ResultsTestCase(unittest.TestCase):
+    @staticmethod
+    def results(p50, p99, throughput=1000.0, error_rate=0.0):
+        return {"mode": "closed", "scenarios": {"version": {
+            "throughput": throughput, "error_rate": error_rate, "latency_ms": {"p50": p50, "p99": p99},
+        }}}
+
+    def test_percentile(self):
+        ordered = [i / 1000 for i in range(1, 1001)]
+        self.assertEqual(0.5, percentile(ordered, 0.5))
+        self.assertEqual(0.99, percentile(ordered, 0.99))
+        self.assertEqual(1.0, percentile(ordered, 1.0))
+        self.assertEqual(0.0, percentile([], 0.5))
+
+    def test_errors_are_counted(self):
+        recorder = LatencyRecorder()
+        recorder.record(0.001, status=200)
+        recorder.record(0.002, status=503)
+        recorder.record(0.003, error="ConnectError")
+        summary = recorder.summary(1.0)
+        self.assertEqual(3, summary["requests"])
+        self.assertEqual(2, summary["errors"])
+        self.assertEqual({"http_503": 1, "ConnectError": 1}, summary["error_types"])
+
+    def test_regression_beyond_threshold(self):
+        baseline = self.results(p50=2.0, p99=10.0)
+        self.assertEqual([], compare_results(self.results(p50=2.1, p99=10.5), baseline, threshold=0.1))
+        regressions = compare_results(self.results(p50=2.1, p99=14.0), baseline, threshold=0.1)
+        self.assertEqual(["version: p99 10.000ms -> 14.000ms"], regressions)
+
+    def test_small_absolute_changes_are_noise(self):
+        baseline = self.results(p50=0.1, p99=0.3)
+        self.assertEqual([], compare_results(self.results(p50=0.2, p99=0.6), baseline, min_delta_ms=0.5))
+
+    def test_throughput_and_error_regressions(self):
+        baseline = self.results(p50=1.0, p99=2.0)
+        regressions = compare_results(self.results(p50=1.0, p99=2.0, throughput=800.0, error_rate=0.01), baseline)
+        self.assertEqual(2, len(regressions))
+
 
 if __name__ == '__main__':
-    input(f"Service name: {settings.server_name}")
     unittest.main()
@@ -0,0 +1,58 @@
+"""
+CPU cost against bytes saved of each response compression codec and level.
+
+Compresses a large JSON body in one go, the way CompressionMiddleware handles whole
+bodies, and an NDJSON stream in 64KB chunks with a flush after each, the way it
+handles streamed bodies. Codecs whose library isn't installed are skipped.
+
+    python -m client.bench_compression --items 20000
+"""
+import argparse
+import time
+
+from app.core.compression import ENCODERS
+from app.core.response_factory import STREAM_CHUNK_SIZE, dumps_json
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 8, 11), "zstd": (1, 3, 9, 19)}
+
+
+def build_payloads(items):
+    rows = [{"id": i, "name": f"item-{i}", "score": i * 0.5, "tags": ["a", "b"], "active": i % 2 == 0}
+            for i in range(items)]
+    ndjson = b"".join(dumps_json(row) + b"\n" for row in rows)
+    chunks = [ndjson[start:start + STREAM_CHUNK_SIZE] for start in range(0, len(ndjson), STREAM_CHUNK_SIZE)]
+    return {"json body": [dumps_json({"items": rows})], "ndjson stream": chunks}
+
+
+def compress_chunks(encoding, level, chunks):
+    encoder = ENCODERS[encoding](level)
+    size = 0
+    for chunk in chunks[:-1]:
+        size += len(encoder.compress(chunk)) + len(encoder.flush())
+    size += len(encoder.compress(chunks[-1])) + len(encoder.finish())
+    return size
+
+
+def main(args):
+    print(f"{'payload':<14} {'codec':<8} {'ratio':>7} {'MB/s':>8} {'CPU ms/MB':>10} {'KB saved/CPU ms':>16}")
+    for payload, chunks in build_payloads(args.items).items():
+        original = sum(len(chunk) for chunk in chunks)
+        for encoding in ENCODERS:
+            for level in LEVELS[encoding]:
+                cpu = time.process_time()
+                wall = time.perf_counter()
+                for _ in range(args.runs):
+                    compressed = compress_chunks(encoding, level, chunks)
+                cpu = (time.process_time() - cpu) / args.runs
+                wall = (time.perf_counter() - wall) / args.runs
+                megabytes = original / 1024 ** 2
+                saved_kb = (original - compressed) / 1024
+                print(f"{payload:<14} {encoding + ':' + str(level):<8} {original / compressed:>7.1f} "
+                      f"{megabytes / wall:>8.0f} {cpu * 1000 / megabytes:>10.1f} {saved_kb / (cpu * 1000):>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=3)
+    main(parser.parse_args())
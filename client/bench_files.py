@@ -0,0 +1,90 @@
+"""
+Large file throughput and CPU cost per GB served.
+
+Serves one large file through Starlette's FileResponse and through FastFileResponse,
+both reading chunks in Python and handing the file to a server that offers the ASGI
+zero-copy send extension (emulated here with os.sendfile into /dev/null). The ASGI
+app is called in process, so the numbers are the app side cost without a network.
+
+    python -m client.bench_files --size-mb 512 --runs 3
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from starlette.responses import FileResponse
+
+from app.core.file_response import ZEROCOPY_EXTENSION, FastFileResponse
+
+
+def build_scope(zerocopy):
+    return {
+        "type": "http", "method": "GET", "path": "/file", "headers": [],
+        "extensions": {ZEROCOPY_EXTENSION: {}} if zerocopy else {},
+    }
+
+
+class Sink:
+    """ASGI send that drops the body, using sendfile for zero-copy messages"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.devnull = os.open(os.devnull, os.O_WRONLY)
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.body":
+            self.bytes += len(message.get("body", b""))
+        elif message["type"] == ZEROCOPY_EXTENSION:
+            fd, offset, count = message["file"].fileno(), message["offset"], message["count"]
+            while count:
+                sent = os.sendfile(self.devnull, fd, offset, count)
+                offset += sent
+                count -= sent
+                self.bytes += sent
+
+    def close(self):
+        os.close(self.devnull)
+
+
+async def receive():
+    # The client never disconnects
+    await asyncio.Event().wait()
+
+
+async def serve(build_response, zerocopy):
+    sink = Sink()
+    wall, cpu = time.perf_counter(), time.process_time()
+    await build_response()(build_scope(zerocopy), receive, sink)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    sink.close()
+    return sink.bytes, wall, cpu
+
+
+async def main(args):
+    with tempfile.NamedTemporaryFile(suffix=".bin") as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            f.write(block)
+        f.flush()
+        path = f.name
+        print(f"{'response':<28} {'MB/s':>10} {'CPU s/GB':>10}")
+        for name, build_response, zerocopy in (
+            ("starlette FileResponse", lambda: FileResponse(path), False),
+            ("FastFileResponse chunked", lambda: FastFileResponse(path), False),
+            ("FastFileResponse zero-copy", lambda: FastFileResponse(path), True),
+        ):
+            results = [await serve(build_response, zerocopy) for _ in range(args.runs)]
+            served = sum(result[0] for result in results)
+            wall = sum(result[1] for result in results)
+            cpu = sum(result[2] for result in results)
+            gigabytes = served / 1024 ** 3
+            print(f"{name:<28} {served / 1024 ** 2 / wall:>10.0f} {cpu / gigabytes:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--runs", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,65 @@
+"""
+Cold start cost of importing the service, the way a fresh worker pays it.
+
+Imports app.main in new interpreters with -X importtime and reports the median
+wall time, the cumulative import time of app.main and the slowest top level
+imports. Run it with and without databases configured to see what the drivers cost.
+
+    python -m client.bench_import --runs 10 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def import_once(module):
+    """(wall seconds, {module: cumulative microseconds}) of importing module in a new interpreter"""
+    with tempfile.TemporaryDirectory(prefix="bench-import-logs-") as log_directory:
+        # app.main configures file logging on import, keep it out of the working tree
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, check=True,
+            env={**os.environ, "LOG_DIRECTORY": log_directory}
+        )
+        elapsed = time.perf_counter() - start
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nesting is shown by two spaces per level, keep what the module imports
+        # directly and the app's own modules
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth > 1 and not name.strip().startswith("app"):
+            continue
+        cumulative[name.strip()] = int(cumulative_us)
+    return elapsed, cumulative
+
+
+def main(args):
+    runs = [import_once(args.module) for _ in range(args.runs)]
+    walls = [wall for wall, _ in runs]
+    totals = [cumulative.get(args.module, 0) for _, cumulative in runs]
+    print(f"{args.module}: median wall {statistics.median(walls) * 1000:.1f}ms, "
+          f"median import {statistics.median(totals) / 1000:.1f}ms over {args.runs} runs")
+    medians = {
+        name: statistics.median(cumulative.get(name, 0) for _, cumulative in runs)
+        for name in runs[-1][1] if name != args.module
+    }
+    print(f"{'module':<56} {'cumulative ms':>14}")
+    for name, micros in sorted(medians.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<56} {micros / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    main(parser.parse_args())
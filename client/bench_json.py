@@ -0,0 +1,75 @@
+"""
+Throughput of building JSON responses, the old ResponseFactory path against the new one.
+
+The old path ran jsonable_encoder over the content and rendered it with the stdlib
+json module, the new one serializes straight to bytes with orjson (or the compiled
+pydantic serializer for models). Payloads are dicts and pydantic models of a few sizes.
+
+    python -m client.bench_json --seconds 1
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.response_factory import ResponseFactory
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+    score: float
+    tags: List[str]
+    created: datetime
+
+
+class Page(BaseModel):
+    items: List[Item]
+    total: int
+
+
+def build_payloads():
+    now = datetime.now(timezone.utc)
+    payloads = {}
+    for size_name, count in (("small", 1), ("medium", 100), ("large", 10000)):
+        page = Page(
+            items=[Item(id=i, name=f"item-{i}", score=i * 0.5, tags=["a", "b"], created=now) for i in range(count)],
+            total=count,
+        )
+        payloads[f"{size_name} dict"] = page.model_dump()
+        payloads[f"{size_name} model"] = page
+    return payloads
+
+
+def old_json_response(content):
+    return JSONResponse(content=jsonable_encoder(content))
+
+
+def measure(build, content, seconds):
+    calls = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        build(content)
+        calls += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return calls / (now - start)
+
+
+def main(args):
+    print(f"{'payload':<16} {'old responses/s':>16} {'new responses/s':>16} {'speedup':>8}")
+    for name, content in build_payloads().items():
+        old = measure(old_json_response, content, args.seconds)
+        new = measure(ResponseFactory.json_response, content, args.seconds)
+        print(f"{name:<16} {old:>16.0f} {new:>16.0f} {new / old:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    main(parser.parse_args())
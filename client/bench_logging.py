@@ -0,0 +1,81 @@
+"""
+Benchmark of logging throughput with the trace ID filter and formatter.
+
+"before" reproduces the previous TraceIdFilter, which generated a uuid4 for
+every record logged outside of a request. "after" is the current filter,
+which only reads the ContextVar. Both runs format into an in-memory stream so
+I/O does not hide the difference.
+
+    python -m client.bench_logging --records 200000
+"""
+import argparse
+import io
+import logging
+import time
+import uuid
+
+from app.core.logging_config import (
+    RequestFormatter,
+    TraceIdFilter,
+    new_trace_id,
+    set_trace_id,
+    trace_id_var,
+)
+
+FORMAT = "[%(asctime)s] %(name)s.%(funcName)s() (ln %(lineno)d):%(levelname)s - %(processName)s - %(trace_id)s - %(message)s"
+
+
+class LegacyTraceIdFilter(logging.Filter):
+    """The uuid4 generating filter this benchmark is measured against"""
+
+    def filter(self, record):
+        trace_id = trace_id_var.get()
+        if not trace_id:
+            trace_id = str(uuid.uuid4())
+        record.trace_id = trace_id
+        return True
+
+
+def build_logger(name, log_filter):
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(RequestFormatter(FORMAT))
+    handler.addFilter(log_filter)
+    bench_logger = logging.getLogger(name)
+    bench_logger.handlers = [handler]
+    bench_logger.propagate = False
+    bench_logger.setLevel(logging.INFO)
+    return bench_logger
+
+
+def run(bench_logger, count):
+    start = time.perf_counter()
+    for i in range(count):
+        bench_logger.info("Record %s", i)
+    return count / (time.perf_counter() - start)
+
+
+def run_ids(generate, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        generate()
+    return count / (time.perf_counter() - start)
+
+
+def main(count):
+    print(f"{'id generation uuid4':<32} {run_ids(lambda: str(uuid.uuid4()), count):>12.0f} ids/s")
+    print(f"{'id generation new_trace_id':<32} {run_ids(new_trace_id, count):>12.0f} ids/s")
+    for scope in ("outside request", "inside request"):
+        if scope == "inside request":
+            set_trace_id()
+        for name, log_filter in (("before", LegacyTraceIdFilter()), ("after", TraceIdFilter())):
+            bench_logger = build_logger(f"bench.{name}", log_filter)
+            run(bench_logger, count // 10)  # warm up
+            rate = run(bench_logger, count)
+            print(f"{scope + ' ' + name:<32} {rate:>12.0f} records/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200000)
+    args = parser.parse_args()
+    main(args.records)
@@ -0,0 +1,117 @@
+"""
+Microbenchmark comparing the pure ASGI CustomMiddleware with the previous
+BaseHTTPMiddleware implementation.
+
+Requests are driven straight through the ASGI interface so the numbers only
+reflect middleware overhead, not socket or HTTP parsing costs.
+
+    python -m client.bench_middleware --requests 20000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.core.middleware import CustomMiddleware
+
+
+logger = logging.getLogger("bench")
+
+
+class LegacyMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware based middleware this benchmark is measured against"""
+
+    async def dispatch(self, request, call_next):
+        logger.info(f"Before {request.method} {request.url} {call_next}")
+        request.state.start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - request.state.start_time
+        logger.info(f"After {request.method} {request.url} {response.status_code} in {round(process_time, 3)}s")
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+
+async def plain(request):
+    return PlainTextResponse("ok")
+
+
+async def stream(request):
+    async def body():
+        for _ in range(16):
+            yield b"x" * 1024
+    return StreamingResponse(body(), media_type="application/octet-stream")
+
+
+def build_app(middleware_class):
+    return Starlette(
+        routes=[Route("/plain", plain), Route("/stream", stream)],
+        middleware=[Middleware(middleware_class)],
+    )
+
+
+def make_scope(path):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+def make_receive():
+    """
+    receive of one request: the empty body once, then it waits like a client that stays
+    connected. Answering http.request again would be a second body, and http.disconnect
+    would cut streaming responses short.
+    """
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.get_running_loop().create_future()
+
+    return receive
+
+
+async def run(app, path, count):
+    async def send(message):
+        pass
+
+    scope = make_scope(path)
+    start = time.perf_counter()
+    for _ in range(count):
+        await app(dict(scope), make_receive(), send)
+    return count / (time.perf_counter() - start)
+
+
+async def main(count):
+    for path in ("/plain", "/stream"):
+        for name, middleware_class in (("BaseHTTPMiddleware", LegacyMiddleware), ("pure ASGI", CustomMiddleware)):
+            app = build_app(middleware_class)
+            await run(app, path, count // 10)  # warm up
+            rate = await run(app, path, count)
+            print(f"{path:<8} {name:<20} {rate:>10.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--log", action="store_true", help="Emit the INFO log lines instead of discarding them")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.log else logging.WARNING)
+    asyncio.run(main(args.requests))
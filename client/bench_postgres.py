@@ -0,0 +1,71 @@
+"""
+Row insert throughput of PostgresConnectionManager ingest paths.
+
+Inserts the same rows into a temporary table with a loop of execute(),
+executemany(), executemany over a prepared query and copy_records_to_table().
+Needs a Postgres server, configured through the usual POSTGRES_* settings.
+
+    python -m client.bench_postgres --rows 20000
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.databases.postgres_connection_manager import PostgresConnectionManager
+
+TABLE = "bench_ingest"
+INSERT = f"INSERT INTO {TABLE} (id, name, score) VALUES ($1, $2, $3)"
+
+
+async def execute_loop(manager, rows):
+    for row in rows:
+        await manager.execute(INSERT, *row)
+
+
+async def executemany(manager, rows):
+    await manager.executemany(INSERT, rows)
+
+
+async def executemany_prepared(manager, rows):
+    await manager.executemany_prepared("insert", rows)
+
+
+async def copy(manager, rows):
+    await manager.copy_records_to_table(TABLE, rows, columns=["id", "name", "score"])
+
+
+async def main(args):
+    db_settings = settings.databases["postgres"]
+    manager = PostgresConnectionManager(
+        db_settings.user, db_settings.password, db_settings.port, db_settings.db_name,
+        **db_settings.manager_options()
+    )
+    manager.register_query("insert", INSERT)
+    await manager.warm_up()
+    rows = [(i, f"name-{i}", i * 0.5) for i in range(args.rows)]
+    await manager.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {TABLE} (id int, name text, score float8)")
+    print(f"{'method':<24} {'rows/s':>12}")
+    try:
+        for name, method in (
+            ("execute loop", execute_loop),
+            ("executemany", executemany),
+            ("executemany prepared", executemany_prepared),
+            ("COPY", copy),
+        ):
+            await manager.execute(f"TRUNCATE {TABLE}")
+            start = time.perf_counter()
+            await method(manager, rows)
+            elapsed = time.perf_counter() - start
+            inserted = await manager.fetchval(f"SELECT count(*) FROM {TABLE}")
+            assert inserted == len(rows), f"{name} inserted {inserted} of {len(rows)} rows"
+            print(f"{name:<24} {len(rows) / elapsed:>12.0f}")
+    finally:
+        await manager.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+"""
+Round trips and latency of reading many Redis keys per request.
+
+Compares a loop of GETs, concurrent GETs, MGET, a pipeline and auto-batched
+concurrent GETs. Round trips are counted as connection acquisitions from the
+manager's pool, since every command or pipeline acquires a connection once.
+Needs a Redis server, configured through the usual REDIS_* settings.
+
+    python -m client.bench_redis --keys 50 --iterations 200
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.databases.redis_connection_manager import RedisConnectionManager
+
+
+def build_manager(auto_batch):
+    db_settings = settings.databases["redis"]
+    options = {**db_settings.manager_options(), "auto_batch": auto_batch}
+    return RedisConnectionManager(
+        db_settings.user, db_settings.password, db_settings.port, db_settings.db_name, **options
+    )
+
+
+async def get_loop(manager, keys):
+    return [await manager.get(key) for key in keys]
+
+
+async def get_concurrent(manager, keys):
+    return await asyncio.gather(*(manager.get(key) for key in keys))
+
+
+async def mget(manager, keys):
+    return await manager.mget(*keys)
+
+
+async def pipeline(manager, keys):
+    async with manager.pipeline() as pipe:
+        for key in keys:
+            pipe.get(key)
+    return pipe.results
+
+
+async def measure(manager, scenario, keys, iterations):
+    round_trips = manager.pool_stats.acquire_wait.count
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await scenario(manager, keys)
+    elapsed = time.perf_counter() - start
+    round_trips = manager.pool_stats.acquire_wait.count - round_trips
+    return elapsed / iterations * 1000, round_trips / iterations
+
+
+async def main(args):
+    keys = [f"bench:{i}" for i in range(args.keys)]
+    plain = build_manager(auto_batch=False)
+    batched = build_manager(auto_batch=True)
+    await plain.warm_up()
+    await batched.warm_up()
+    await plain.mset({key: "x" * args.value_size for key in keys})
+    print(f"{'scenario':<28} {'ms/request':>12} {'round trips/request':>20}")
+    try:
+        for name, manager, scenario in (
+            ("GET loop", plain, get_loop),
+            ("concurrent GET", plain, get_concurrent),
+            ("MGET", plain, mget),
+            ("pipeline", plain, pipeline),
+            ("auto-batched concurrent GET", batched, get_concurrent),
+        ):
+            await measure(manager, scenario, keys, 5)  # warm up
+            latency, round_trips = await measure(manager, scenario, keys, args.iterations)
+            print(f"{name:<28} {latency:>12.3f} {round_trips:>20.1f}")
+    finally:
+        await plain.delete(*keys)
+        await plain.close()
+        await batched.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--value-size", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
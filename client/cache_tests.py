@@ -0,0 +1,135 @@
+import asyncio
+import fnmatch
+import unittest
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from app.core.cache import KEY_PREFIX, CacheEntry, ResponseCache, _build_key
+
+
+class LocalRedis:
+    """In-memory stand-in for the RedisConnectionManager methods the response cache uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.reads = 0
+
+    async def get_bytes(self, key):
+        self.reads += 1
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    async def delete_by_prefix(self, prefix, batch_size=500):
+        keys = [key for key in self.data if fnmatch.fnmatchcase(key, f"{prefix}*")]
+        for key in keys:
+            del self.data[key]
+        return len(keys)
+
+
+class ResponseCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.redis = LocalRedis()
+        self.cache = ResponseCache(max_entries=2, local_ttl=60)
+        self.calls = 0
+
+    async def compute(self, content=None, status_code=200):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        response = JSONResponse(content or {"calls": self.calls}, status_code=status_code)
+        return response, CacheEntry.from_response(response)
+
+    async def test_miss_then_hit(self):
+        response, entry, status = await self.cache.get_or_compute(self.redis, "/a", 10, self.compute)
+        self.assertEqual("MISS", status)
+        self.assertIn(KEY_PREFIX + "/a", self.redis.data)
+        _, cached_entry, status = await self.cache.get_or_compute(self.redis, "/a", 10, self.compute)
+        self.assertEqual("HIT", status)
+        self.assertEqual(entry.body, cached_entry.body)
+        self.assertEqual(1, self.calls)
+
+    async def test_remote_hit_after_local_eviction(self):
+        await self.cache.get_or_compute(self.redis, "/a", 10, self.compute)
+        self.cache.clear()
+        _, entry, status = await self.cache.get_or_compute(self.redis, "/a", 10, self.compute)
+        self.assertEqual("HIT", status)
+        self.assertEqual(1, self.calls)
+        self.assertEqual(b'{"calls":1}', entry.body)
+
+    async def test_concurrent_misses_compute_once(self):
+        results = await asyncio.gather(
+            *(self.cache.get_or_compute(self.redis, "/a", 10, self.compute) for _ in range(20))
+        )
+        self.assertEqual(1, self.calls)
+        self.assertEqual({b'{"calls":1}'}, {entry.body for _, entry, _ in results})
+
+    async def test_errors_are_not_cached(self):
+        response, entry, _ = await self.cache.get_or_compute(
+            self.redis, "/a", 10, lambda: self.compute(status_code=500)
+        )
+        self.assertIsNone(entry)
+        self.assertEqual(500, response.status_code)
+        self.assertEqual({}, self.redis.data)
+
+    async def test_lru_evicts_oldest(self):
+        for key in ("/a", "/b", "/c"):
+            await self.cache.get_or_compute(None, key, 10, self.compute)
+        await self.cache.get_or_compute(None, "/a", 10, self.compute)
+        self.assertEqual(4, self.calls)
+
+    async def test_invalidate_by_prefix(self):
+        for key in ("/items/1", "/items/2", "/users/1"):
+            await self.cache.get_or_compute(self.redis, key, 10, self.compute)
+        deleted = await self.cache.invalidate(self.redis, "/items/")
+        self.assertEqual(2, deleted)
+        self.assertEqual([KEY_PREFIX + "/users/1"], list(self.redis.data))
+        _, _, status = await self.cache.get_or_compute(self.redis, "/items/1", 10, self.compute)
+        self.assertEqual("MISS", status)
+
+    def test_etag_not_modified(self):
+        entry = CacheEntry.from_response(JSONResponse({"a": 1}))
+        self.assertEqual(304, entry.to_response(if_none_match=entry.etag).status_code)
+        self.assertEqual(304, entry.to_response(if_none_match=f'"other", W/{entry.etag}').status_code)
+        response = entry.to_response(if_none_match='"other"')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(entry.etag, response.headers["etag"])
+        self.assertEqual("application/json", response.headers["content-type"])
+
+    def test_round_trip_bytes(self):
+        entry = CacheEntry.from_response(Response(b"\x00\xff\nbody", media_type="application/octet-stream"))
+        restored = CacheEntry.from_bytes(entry.to_bytes())
+        self.assertEqual(entry.body, restored.body)
+        self.assertEqual(entry.etag, restored.etag)
+        self.assertEqual(entry.headers, restored.headers)
+
+    def test_cookies_are_not_cached(self):
+        response = JSONResponse({"a": 1})
+        response.set_cookie("session", "secret")
+        self.assertIsNone(CacheEntry.from_response(response))
+
+
+class BuildKeyTestCase(unittest.TestCase):
+    @staticmethod
+    def request(query_string, **path_params):
+        return Request({
+            "type": "http", "method": "GET", "path": "/users/1", "query_string": query_string, "headers": [],
+            "path_params": path_params,
+        })
+
+    def test_path_params_win_over_query_params(self):
+        request = self.request(b"user_id=2&page=3", user_id=1)
+        self.assertEqual("user:1:3", _build_key(request, "user:{user_id}:{page}"))
+
+    def test_missing_params_are_left_empty(self):
+        request = self.request(b"", user_id=1)
+        self.assertEqual("user:1:", _build_key(request, "user:{user_id}:{page}"))
+
+    def test_default_key_is_the_path_and_query(self):
+        self.assertEqual("/users/1?page=3", _build_key(self.request(b"page=3"), None))
+
+
+if __name__ == '__main__':
+    unittest.main()
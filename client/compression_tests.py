@@ -0,0 +1,143 @@
+import gzip
+import unittest
+import zlib
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from app.core.compression import ENCODERS, GzipEncoder, negotiate
+from app.core.middleware import CompressionMiddleware
+from app.core.response_factory import ResponseFactory
+
+
+def build_app(**options):
+    return CompressionMiddleware(build_routes(), minimum_size=500, **options)
+
+
+def build_routes():
+    app = FastAPI()
+
+    @app.get("/small")
+    async def small():
+        return ResponseFactory.json_response({"a": 1})
+
+    @app.get("/large")
+    async def large():
+        return ResponseFactory.json_response({"items": [{"id": i, "name": f"item-{i}"} for i in range(500)]})
+
+    @app.get("/etag")
+    async def etag():
+        return ResponseFactory.json_response({"items": list(range(1000))}, headers={"etag": '"v1"'})
+
+    @app.get("/etag-other")
+    async def etag_other():
+        return ResponseFactory.json_response({"other": list(range(1000, 2000))}, headers={"etag": '"v1"'})
+
+    @app.get("/stream")
+    async def stream():
+        return ResponseFactory.ndjson_response({"id": i, "name": f"item-{i}"} for i in range(20000))
+
+    @app.get("/image")
+    async def image():
+        return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+    return app
+
+
+class CompressionMiddlewareTestCase(unittest.IsolatedAsyncioTestCase):
+    async def get(self, path, accept_encoding="gzip", **options):
+        transport = httpx.ASGITransport(app=build_app(**options))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            request = client.build_request("GET", path, headers={"accept-encoding": accept_encoding})
+            response = await client.send(request, stream=True)
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+            await response.aclose()
+            return response, raw
+
+    async def test_large_body_is_compressed(self):
+        response, raw = await self.get("/large")
+        self.assertEqual("gzip", response.headers["content-encoding"])
+        self.assertEqual(str(len(raw)), response.headers["content-length"])
+        self.assertIn(b'"item-499"', gzip.decompress(raw))
+        self.assertIn("Accept-Encoding", response.headers["vary"])
+
+    async def test_small_body_is_not_compressed(self):
+        response, raw = await self.get("/small")
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(b'{"a":1}', raw)
+
+    async def test_identity_when_not_accepted(self):
+        response, raw = await self.get("/large", accept_encoding="gzip;q=0, identity")
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertIn("Accept-Encoding", response.headers["vary"])
+
+    async def test_incompressible_types_are_skipped(self):
+        response, raw = await self.get("/image")
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertNotIn("vary", response.headers)
+
+    async def test_stream_is_compressed_chunk_by_chunk(self):
+        response, raw = await self.get("/stream")
+        self.assertEqual("gzip", response.headers["content-encoding"])
+        self.assertNotIn("content-length", response.headers)
+        lines = gzip.decompress(raw).splitlines()
+        self.assertEqual(20000, len(lines))
+        self.assertLess(len(raw), sum(len(line) + 1 for line in lines) / 3)
+
+    async def test_streamed_chunks_decode_on_arrival(self):
+        transport = httpx.ASGITransport(app=build_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async with client.stream("GET", "/stream", headers={"accept-encoding": "gzip"}) as response:
+                decoder = zlib.decompressobj(31)
+                async for chunk in response.aiter_raw():
+                    # Every chunk ends on a sync flush, so it decodes to whole NDJSON lines
+                    self.assertTrue(decoder.decompress(chunk).endswith(b"\n"))
+                    break
+
+    async def test_route_level_zero_turns_compression_off(self):
+        response, _ = await self.get("/large", route_levels={"/large": {"gzip": 0}})
+        self.assertNotIn("content-encoding", response.headers)
+
+    async def test_compressed_bodies_are_reused_by_etag(self):
+        middleware = build_app()
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/etag", headers={"accept-encoding": "gzip"})
+            second = await client.get("/etag", headers={"accept-encoding": "gzip"})
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(1, middleware.body_cache.hits)
+        self.assertEqual('W/"v1"', second.headers["etag"])
+
+    async def test_routes_sharing_an_etag_keep_their_bodies(self):
+        middleware = build_app()
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/etag", headers={"accept-encoding": "gzip"})
+            other = await client.get("/etag-other", headers={"accept-encoding": "gzip"})
+        self.assertEqual("gzip", other.headers["content-encoding"])
+        self.assertIn("other", other.json())
+        self.assertNotEqual(first.json(), other.json())
+        self.assertEqual(0, middleware.body_cache.hits)
+
+    async def test_route_levels_of_missing_codecs_are_ignored(self):
+        with mock.patch.dict(ENCODERS, clear=True, gzip=GzipEncoder):
+            response, _ = await self.get(
+                "/large", accept_encoding="zstd, br, gzip;q=0.5", route_levels={"/large": {"zstd": 1, "br": 1}}
+            )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("gzip", response.headers["content-encoding"])
+
+
+class NegotiateTestCase(unittest.TestCase):
+    def test_negotiate(self):
+        self.assertEqual("br", negotiate("gzip, br", ["zstd", "br", "gzip"]))
+        self.assertEqual("gzip", negotiate("br;q=0, gzip;q=0.5", ["zstd", "br", "gzip"]))
+        self.assertEqual("zstd", negotiate("*", ["zstd", "br", "gzip"]))
+        self.assertIsNone(negotiate("identity", ["zstd", "br", "gzip"]))
+        self.assertIsNone(negotiate("*;q=0", ["gzip"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from app.core import config
+from app.core.config import get_settings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRIVERS = ("asyncpg", "motor", "pymongo")
+
+IMPORT_APP = f"""
+import json, sys
+import app.main
+from app.core.config import settings
+from app.core.db import connection_manager_class
+loaded = lambda: [name for name in {DRIVERS!r} if name in sys.modules]
+result = {{"databases": sorted(settings.databases), "after_import": loaded()}}
+connection_manager_class("postgres")
+result["after_postgres"] = loaded()
+print(json.dumps(result))
+"""
+
+
+class GetSettingsTestCase(unittest.TestCase):
+    def test_settings_are_read_once(self):
+        self.assertIs(get_settings(), get_settings())
+        self.assertIs(config.settings, get_settings())
+
+
+class DriverImportTestCase(unittest.TestCase):
+    """Importing the app loads no database driver, a driver loads with its connection manager"""
+
+    def test_configured_drivers_load_on_first_use(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ, "PYTHONPATH": ROOT, "LOG_DIRECTORY": os.path.join(directory, "logs"),
+                "SERVER_NAME": "config_tests", "VERSION": "0.0.0", "API_VERSION": "v1",
+                "INTERNAL_PORT": "8000", "EXTERNAL_PORT": "8000", "POSTGRES_PORT": "5432", "MONGO_PORT": "27017",
+            }
+            # No .env in the working directory, the databases come from the environment
+            output = subprocess.run(
+                [sys.executable, "-c", IMPORT_APP], cwd=directory, env=env, capture_output=True, text=True, check=True
+            ).stdout
+        result = json.loads(output.splitlines()[-1])
+        self.assertEqual(["mongo", "postgres"], result["databases"])
+        self.assertEqual([], result["after_import"])
+        self.assertEqual(["asyncpg"], result["after_postgres"])
+
+
+if __name__ == '__main__':
+    unittest.main()
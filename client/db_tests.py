@@ -0,0 +1,109 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+
+from app.core import db
+from app.core.config import settings
+from app.core.db import close_db, connect_db
+from app.models.settings import DatabaseSettings
+
+
+class LocalManager:
+    """Connection manager stand-in, warm_up takes warm_up_time and close fails with close_error"""
+
+    warm_up_time = 0.01
+    warm_up_error = None
+    close_error = None
+
+    def __init__(self, user, password, port, db_name, **options):
+        self.min_pool_size = options.get("min_pool_size", 5)
+        self.warmed_up = False
+        self.closed = False
+
+    async def warm_up(self):
+        await asyncio.sleep(self.warm_up_time)
+        if self.warm_up_error is not None:
+            raise self.warm_up_error
+        self.warmed_up = True
+
+    async def close(self):
+        await asyncio.sleep(0)
+        self.closed = True
+        if self.close_error is not None:
+            raise self.close_error
+
+
+class HangingManager(LocalManager):
+    warm_up_time = 60
+
+
+class RefusedManager(LocalManager):
+    warm_up_error = ConnectionRefusedError("connection refused")
+
+
+class FailingCloseManager(LocalManager):
+    close_error = RuntimeError("pool already closed")
+
+
+class ConnectDbTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.app = FastAPI()
+
+    def configure(self, **managers):
+        """Configure each named database with the given connection manager class"""
+        for patcher in (
+            mock.patch.multiple(
+                settings,
+                databases={name: DatabaseSettings(name=name, port=1) for name in managers},
+                db_startup_timeout=0.2,
+            ),
+            mock.patch.dict(
+                db.db_connections, {name: f"{__name__}.{manager.__name__}" for name, manager in managers.items()}
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_pools_warm_up_concurrently(self):
+        self.configure(redis=LocalManager, postgres=LocalManager)
+        LocalManager.warm_up_time = 0.1
+        self.addCleanup(setattr, LocalManager, "warm_up_time", 0.01)
+        start_time = time.perf_counter()
+        await connect_db(self.app)
+        self.assertLess(time.perf_counter() - start_time, 0.18)
+        self.assertTrue(self.app.state.db_ready)
+        self.assertTrue(self.app.state.redis.warmed_up)
+        self.assertTrue(self.app.state.postgres.warmed_up)
+
+    async def test_startup_timeout_closes_every_pool(self):
+        self.configure(redis=LocalManager, postgres=HangingManager)
+        with self.assertRaisesRegex(ConnectionError, r"not warm within 0.2s"):
+            await connect_db(self.app)
+        self.assertFalse(self.app.state.db_ready)
+        self.assertTrue(self.app.state.redis.closed)
+        self.assertTrue(self.app.state.postgres.closed)
+
+    async def test_failed_warm_up_closes_every_pool(self):
+        self.configure(redis=LocalManager, mongo=RefusedManager)
+        with self.assertRaises(ConnectionRefusedError):
+            await connect_db(self.app)
+        self.assertFalse(self.app.state.db_ready)
+        self.assertTrue(self.app.state.redis.closed)
+
+    async def test_close_error_doesnt_stop_the_others(self):
+        self.app.state.redis = LocalManager(None, None, 1, "redis")
+        self.app.state.mongo = FailingCloseManager(None, None, 1, "mongo")
+        self.app.state.postgres = LocalManager(None, None, 1, "postgres")
+        self.app.state.db_ready = True
+        with self.assertLogs("app.core.db", "ERROR") as logs:
+            await close_db(self.app)
+        self.assertFalse(self.app.state.db_ready)
+        self.assertTrue(all(getattr(self.app.state, name).closed for name in ("redis", "mongo", "postgres")))
+        self.assertIn("Failed to close mongo connection", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
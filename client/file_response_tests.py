@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from app.core.file_response import FileChangedError, FileMetadataCache, FastFileResponse, parse_ranges
+
+
+class ParseRangesTestCase(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual([(0, 9)], parse_ranges("bytes=0-9", 100))
+        self.assertEqual([(90, 99)], parse_ranges("bytes=-10", 100))
+        self.assertEqual([(50, 99)], parse_ranges("bytes=50-", 100))
+        self.assertEqual([(0, 99)], parse_ranges("bytes=0-1000", 100))
+        self.assertEqual([(0, 19), (50, 59)], parse_ranges("bytes=50-59, 0-9, 5-19", 100))
+        self.assertEqual([], parse_ranges("bytes=200-300", 100))
+        self.assertIsNone(parse_ranges("bytes=9-0", 100))
+        self.assertIsNone(parse_ranges("items=0-9", 100))
+        self.assertIsNone(parse_ranges("bytes=a-b", 100))
+
+
+class FastFileResponseTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.content = bytes(range(256)) * 40
+        handle, self.path = tempfile.mkstemp(suffix=".bin")
+        os.write(handle, self.content)
+        os.close(handle)
+        self.cache = FileMetadataCache(ttl=60)
+
+        async def serve(request):
+            path = self.path if request.path_params["name"] == "file.bin" else self.path + ".missing"
+            return FastFileResponse(path, metadata_cache=self.cache)
+
+        app = Starlette(routes=[Route("/{name}", serve, methods=["GET", "HEAD"])])
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        os.unlink(self.path)
+
+    async def test_full_file(self):
+        response = await self.client.get("/file.bin")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(self.content, response.content)
+        self.assertEqual("bytes", response.headers["accept-ranges"])
+        self.assertEqual(str(len(self.content)), response.headers["content-length"])
+
+    async def test_missing_file(self):
+        response = await self.client.get("/other.bin")
+        self.assertEqual(404, response.status_code)
+        self.assertIn("not found", response.json()["detail"])
+
+    async def test_truncated_file_aborts_the_response(self):
+        await self.client.get("/file.bin")
+        os.truncate(self.path, 100)
+        with self.assertRaises(FileChangedError):
+            await self.client.get("/file.bin")
+        # The stale size isn't served again
+        response = await self.client.get("/file.bin")
+        self.assertEqual(self.content[:100], response.content)
+        self.assertEqual("100", response.headers["content-length"])
+
+    async def test_conditional(self):
+        response = await self.client.get("/file.bin")
+        etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+        response = await self.client.get("/file.bin", headers={"if-none-match": etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.content)
+        response = await self.client.get("/file.bin", headers={"if-modified-since": last_modified})
+        self.assertEqual(304, response.status_code)
+        response = await self.client.get("/file.bin", headers={"if-none-match": '"other"'})
+        self.assertEqual(200, response.status_code)
+
+    async def test_single_range(self):
+        response = await self.client.get("/file.bin", headers={"range": "bytes=100-199"})
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(self.content[100:200], response.content)
+        self.assertEqual(f"bytes 100-199/{len(self.content)}", response.headers["content-range"])
+
+    async def test_multi_range(self):
+        response = await self.client.get("/file.bin", headers={"range": "bytes=0-9,-5"})
+        self.assertEqual(206, response.status_code)
+        content_type = response.headers["content-type"]
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        boundary = content_type.split("=", 1)[1].encode()
+        self.assertEqual(int(response.headers["content-length"]), len(response.content))
+        parts = response.content.split(b"--" + boundary)
+        self.assertEqual(b"--\r\n", parts[-1])
+        self.assertTrue(parts[1].endswith(b"\r\n\r\n" + self.content[:10] + b"\r\n"))
+        self.assertTrue(parts[2].endswith(b"\r\n\r\n" + self.content[-5:] + b"\r\n"))
+
+    async def test_unsatisfiable_range(self):
+        response = await self.client.get("/file.bin", headers={"range": f"bytes={len(self.content)}-"})
+        self.assertEqual(416, response.status_code)
+        self.assertEqual(f"bytes */{len(self.content)}", response.headers["content-range"])
+
+    async def test_stale_if_range_sends_whole_file(self):
+        response = await self.client.get("/file.bin", headers={"range": "bytes=0-9", "if-range": '"old"'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(self.content, response.content)
+
+    async def test_head(self):
+        response = await self.client.head("/file.bin")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b"", response.content)
+        self.assertEqual(str(len(self.content)), response.headers["content-length"])
+
+
+if __name__ == '__main__':
+    unittest.main()
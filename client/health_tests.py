@@ -0,0 +1,74 @@
+import asyncio
+import json
+import unittest
+
+from app.core.health import HealthProber
+
+
+class LocalBackend:
+    """Connection manager stand-in whose ping fails, hangs or succeeds on demand"""
+
+    def __init__(self):
+        self.mode = "ok"
+        self.pings = 0
+
+    async def ping(self):
+        self.pings += 1
+        if self.mode == "down":
+            raise ConnectionError("connection refused")
+        if self.mode == "slow":
+            await asyncio.sleep(1)
+        return True
+
+
+class HealthProberTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = LocalBackend()
+        self.prober = HealthProber(
+            {"redis": self.backend}, interval=0.01, timeout=0.05, failure_threshold=3, success_threshold=2
+        )
+
+    async def probe(self, times):
+        for _ in range(times):
+            await self.prober.probe_once()
+
+    async def test_single_failure_does_not_flap(self):
+        self.backend.mode = "slow"
+        await self.probe(2)
+        self.assertTrue(self.prober.healthy)
+        self.backend.mode = "ok"
+        await self.probe(1)
+        self.assertTrue(self.prober.healthy)
+        self.assertEqual(0, self.prober.backends["redis"].consecutive_failures)
+
+    async def test_unhealthy_after_threshold_and_recovers(self):
+        self.backend.mode = "down"
+        await self.probe(3)
+        self.assertFalse(self.prober.healthy)
+        snapshot = json.loads(self.prober.body)
+        self.assertEqual("unhealthy", snapshot["status"])
+        self.assertIn("connection refused", snapshot["backends"]["redis"]["last_error"])
+        self.backend.mode = "ok"
+        await self.probe(1)
+        self.assertFalse(self.prober.healthy)
+        await self.probe(1)
+        self.assertTrue(self.prober.healthy)
+
+    async def test_timeout_counts_as_failure(self):
+        self.backend.mode = "slow"
+        await self.probe(3)
+        self.assertFalse(self.prober.healthy)
+        self.assertIn("timed out", self.prober.backends["redis"].last_error)
+
+    async def test_background_probing(self):
+        self.prober.start()
+        await asyncio.sleep(0.05)
+        await self.prober.stop()
+        self.assertGreater(self.backend.pings, 1)
+        pings = self.backend.pings
+        await asyncio.sleep(0.03)
+        self.assertEqual(pings, self.backend.pings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+
+from app.core.middleware import ConcurrencyLimiter, ConcurrencyLimitMiddleware
+
+
+class SlowApp:
+    """ASGI app stand-in whose requests take delay seconds"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def __call__(self, scope, receive, send):
+        await asyncio.sleep(self.delay)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+class ConcurrencyLimiterTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_queued_requests_get_released_slots(self):
+        limiter = ConcurrencyLimiter(1, max_queue=1, queue_timeout=1)
+        self.assertIsNone(await limiter.acquire())
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(1, limiter.queued)
+        self.assertEqual("queue_full", await limiter.acquire())
+        limiter.release()
+        self.assertIsNone(await waiting)
+        self.assertEqual(1, limiter.in_flight)
+        self.assertEqual(0, limiter.queued)
+
+    async def test_queue_timeout(self):
+        limiter = ConcurrencyLimiter(1, max_queue=10, queue_timeout=0.01)
+        await limiter.acquire()
+        self.assertEqual("queue_timeout", await limiter.acquire())
+        self.assertEqual(0, limiter.queued)
+        limiter.release()
+        self.assertEqual(0, limiter.in_flight)
+
+    async def test_slot_handed_over_as_the_wait_times_out(self):
+        limiter = ConcurrencyLimiter(1, max_queue=10, queue_timeout=1)
+        await limiter.acquire()
+
+        async def wait_for(waiter, timeout):
+            # The release resolves the waiter and the timeout fires in the same iteration
+            limiter.release()
+            raise asyncio.TimeoutError
+
+        with mock.patch("asyncio.wait_for", wait_for):
+            self.assertIsNone(await limiter.acquire())
+        self.assertEqual(1, limiter.in_flight)
+        self.assertEqual(0, limiter.rejected["queue_timeout"])
+        limiter.release()
+        self.assertEqual(0, limiter.in_flight)
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        limiter = ConcurrencyLimiter(1, max_queue=10, queue_timeout=1)
+        await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        limiter.release()
+        self.assertEqual((0, 0), (limiter.in_flight, limiter.queued))
+
+    def test_aimd(self):
+        limiter = ConcurrencyLimiter(10, adaptive=True, min_limit=2)
+        limiter.observe("/a", 0, 0.01, 200)
+        limiter.observe("/a", 0, 0.1, 200)
+        self.assertAlmostEqual(9.0, limiter.limit)
+        # At most one decrease per baseline latency
+        limiter.observe("/a", 0, 0.1, 200)
+        self.assertAlmostEqual(9.0, limiter.limit)
+        limiter.observe("/a", 0, 0.01, 200)
+        self.assertAlmostEqual(9.0 + 1 / 9, limiter.limit)
+        for _ in range(1000):
+            limiter.observe("/a", 0, 0.01, 200)
+        self.assertEqual(10, limiter.limit)
+
+
+class ConcurrencyLimitMiddlewareTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_sheds_with_retry_after_and_exempts_health(self):
+        limiter = ConcurrencyLimiter(2, max_queue=0)
+        app = ConcurrencyLimitMiddleware(SlowApp(0.05), limiter, exempt_paths=["/health/"])
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            responses = await asyncio.gather(
+                *(client.get("/items") for _ in range(4)), client.get("/health/ready")
+            )
+        statuses = sorted(response.status_code for response in responses[:4])
+        self.assertEqual([200, 200, 503, 503], statuses)
+        self.assertEqual(200, responses[4].status_code)
+        shed = next(response for response in responses if response.status_code == 503)
+        self.assertEqual("1", shed.headers["retry-after"])
+        self.assertEqual(2, limiter.rejected["queue_full"])
+        self.assertEqual(0, limiter.in_flight)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Worker scaling curve for the production launcher.
+
+Starts `python -m app.serve` once per worker count, drives it with keep-alive
+HTTP/1.1 connections at a fixed concurrency and prints the throughput of each run.
+
+    python -m client.load_scaling --workers 1 2 4 --concurrency 64 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+
+async def _request(reader, writer, request):
+    writer.write(request)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def _connection(host, port, path, deadline, counts):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            status = await _request(reader, writer, request)
+            counts["ok" if status < 500 else "errors"] += 1
+    except (OSError, asyncio.IncompleteReadError):
+        counts["errors"] += 1
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, path, concurrency, duration):
+    counts = {"ok": 0, "errors": 0}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(_connection(host, port, path, deadline, counts) for _ in range(concurrency)))
+    return counts["ok"] / duration, counts["errors"]
+
+
+async def wait_for_port(host, port, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"Server did not listen on {host}:{port} within {timeout}s")
+
+
+async def main(args):
+    print(f"{'workers':>8} {'req/s':>12} {'per worker':>12} {'errors':>8}")
+    for workers in args.workers:
+        env = {**os.environ, "WORKERS": str(workers), "INTERNAL_PORT": str(args.port)}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "app.serve"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            await wait_for_port(args.host, args.port)
+            await run_load(args.host, args.port, args.path, args.concurrency, 1.0)  # warm up
+            rate, errors = await run_load(args.host, args.port, args.path, args.concurrency, args.duration)
+            print(f"{workers:>8} {rate:>12.0f} {rate / workers:>12.0f} {errors:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--path", default="/server/version")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    asyncio.run(main(parser.parse_args()))
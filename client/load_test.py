@@ -0,0 +1,499 @@
+"""
+Async load generator and latency regression check.
+
+Drives the service with httpx, either in-process through the ASGI app (the databases are
+replaced by in-memory stand-ins with a fixed round trip latency) or against a live server
+with --url. Each scenario is run on its own and reported with its throughput, errors and
+p50/p90/p99/p999 latency.
+
+closed loop: --concurrency requests are kept in flight, each worker sends its next request
+    when the previous one is answered. Shows the throughput the service sustains.
+open loop: requests are started at a fixed --rps whatever the latency, and each latency is
+    measured from when the request was due. Queueing shows in the tail instead of quietly
+    slowing the load down (coordinated omission).
+
+    python -m client.load_test run --mode closed --concurrency 32 --duration 10 --output run.json
+    python -m client.load_test run --mode open --rps 500 --scenario version status --url http://localhost:8000
+    python -m client.load_test compare run.json --baseline baseline.json --threshold 0.1
+
+compare (or run --baseline) exits with status 1 when a scenario regressed beyond the threshold.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+from fastapi import APIRouter, Request
+
+from app.core.cache import cached
+from app.core.config import get_settings
+from app.core.databases.base_connection_manager import BaseConnectionManager
+from app.core.events import start_health_prober, start_loop_monitor
+from app.core.response_factory import ResponseFactory
+from app.core.status import setup_status_responses
+
+IN_PROCESS_URL = "http://load-test"
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p999": 0.999}
+
+
+class LocalManager(BaseConnectionManager):
+    """
+    In-memory database stand-in. Every round trip sleeps latency seconds and goes through
+    the base manager's deadline, retries and circuit breaker like a real driver call would.
+    """
+
+    def __init__(self, latency=0.0005):
+        super().__init__("load", "test", 0, "load", min_pool_size=1, max_pool_size=1)
+        self.latency = latency
+        self.round_trips = 0
+
+    async def _round_trip(self, result=None):
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+        return result
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def ping(self):
+        return await self._round_trip(True)
+
+
+class LocalRedis(LocalManager):
+    def __init__(self, latency=0.0005):
+        super().__init__(latency)
+        self.data = {}
+
+    def _get_name(self):
+        return "redis"
+
+    async def get(self, key):
+        value = await self.get_bytes(key)
+        return None if value is None else value.decode()
+
+    async def get_bytes(self, key):
+        return await self._call(lambda: self._round_trip(self.data.get(key)), idempotent=True)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return await self._call(lambda: self._round_trip(True), idempotent=True)
+
+    async def delete_by_prefix(self, prefix, batch_size=500):
+        keys = [key for key in self.data if key.startswith(prefix)]
+        for key in keys:
+            del self.data[key]
+        await self._call(self._round_trip, idempotent=True)
+        return len(keys)
+
+
+class LocalPostgres(LocalManager):
+    def __init__(self, latency=0.0005, rows=10000):
+        super().__init__(latency)
+        self.rows = [{"id": i, "name": f"item-{i}", "price": round(i * 0.25, 2), "active": i % 3 != 0}
+                     for i in range(rows)]
+
+    def _get_name(self):
+        return "postgres"
+
+    async def fetch(self, query, *args, idempotent=True):
+        """The rows whose id is in args, whatever the query"""
+        rows = [self.rows[arg] for arg in args if isinstance(arg, int) and 0 <= arg < len(self.rows)]
+        return await self._call(lambda: self._round_trip(rows), idempotent=idempotent)
+
+    async def fetchrow(self, query, *args, idempotent=True):
+        rows = await self.fetch(query, *args, idempotent=idempotent)
+        return rows[0] if rows else None
+
+    async def iter_rows(self, query, *args, prefetch=500, readonly=True):
+        """The first args[0] rows (all without args), one round trip per prefetch rows"""
+        limit = args[0] if args else len(self.rows)
+        async with self._guard():
+            for start in range(0, limit, prefetch):
+                await self._round_trip()
+                for row in self.rows[start:min(start + prefetch, limit)]:
+                    yield row
+
+
+class LocalMongo(LocalManager):
+    def __init__(self, latency=0.0005, documents=10000):
+        super().__init__(latency)
+        self.documents = [{"_id": f"{i:024x}", "name": f"document-{i}", "tags": ["a", "b"], "score": i % 100}
+                          for i in range(documents)]
+
+    def _get_name(self):
+        return "mongo"
+
+    async def find_one(self, collection_name, query, *args, **kwargs):
+        document = next((doc for doc in self.documents if doc["_id"] == query.get("_id")), None)
+        return await self._call(lambda: self._round_trip(document), idempotent=True)
+
+    async def iter_many(self, collection_name, query, projection=None, batch_size=500, limit=0, sort=None, **kwargs):
+        """The first limit documents (all with 0), one round trip per batch_size documents"""
+        documents = self.documents[:limit] if limit else self.documents
+        async with self._guard():
+            for start in range(0, len(documents), batch_size):
+                await self._round_trip()
+                for document in documents[start:start + batch_size]:
+                    yield document
+
+
+# Routes that only exist in-process, they stand for the service's own database backed handlers
+load_router = APIRouter(prefix="/load")
+
+
+@load_router.get("/items/{item_id}")
+@cached(ttl=60, key="load:item:{item_id}")
+async def get_cached_item(item_id: int, request: Request):
+    """Response cached through Redis, computed from Postgres on a miss"""
+    return await request.app.state.postgres.fetchrow("SELECT * FROM items WHERE id = $1", item_id)
+
+
+@load_router.get("/rows/{row_id}")
+async def get_row(row_id: int, request: Request):
+    """A Postgres round trip per request"""
+    return ResponseFactory.json_response(
+        await request.app.state.postgres.fetchrow("SELECT * FROM items WHERE id = $1", row_id)
+    )
+
+
+@load_router.get("/rows")
+async def stream_rows(request: Request, limit: int = 1000):
+    """Postgres server side cursor streamed as CSV"""
+    return ResponseFactory.csv_response(request.app.state.postgres.iter_rows("SELECT * FROM items LIMIT $1", limit))
+
+
+@load_router.get("/documents")
+async def stream_documents(request: Request, limit: int = 1000):
+    """Mongo cursor streamed as NDJSON"""
+    return ResponseFactory.ndjson_response(request.app.state.mongo.iter_many("documents", {}, limit=limit))
+
+
+class Scenario:
+    """
+    A request sent over and over. {n} in the path is replaced by a random integer below
+    key_space on every request. local_only scenarios use the in-process /load routes.
+    """
+
+    def __init__(self, name, path, key_space=1000, local_only=False):
+        self.name = name
+        self.path = path
+        self.key_space = key_space
+        self.local_only = local_only
+
+    def next_path(self):
+        if "{n}" in self.path:
+            return self.path.replace("{n}", str(random.randrange(self.key_space)))
+        return self.path
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (
+    Scenario("version", "/server/version"),
+    Scenario("status", "/server/status"),
+    Scenario("databases", "/server/databases"),
+    Scenario("metrics", "/server/metrics"),
+    Scenario("health_live", "/health/live"),
+    Scenario("health_ready", "/health/ready"),
+    Scenario("cached_item", "/load/items/{n}", local_only=True),
+    Scenario("postgres_row", "/load/rows/{n}", local_only=True),
+    Scenario("postgres_csv_stream", "/load/rows?limit=1000", local_only=True),
+    Scenario("mongo_ndjson_stream", "/load/documents?limit=1000", local_only=True),
+)}
+
+
+@asynccontextmanager
+async def local_app(latency=0.0005):
+    """
+    The service app with its databases replaced by local stand-ins, ready for requests.
+
+    ASGITransport doesn't run the lifespan, and the lifespan would connect to the configured
+    databases anyway, so the parts of startup the routes depend on are done here instead.
+    """
+    if "app.main" not in sys.modules:
+        # app.main configures file logging on import, keep those logs out of the working tree
+        get_settings().log_directory = tempfile.mkdtemp(prefix="load-test-logs-")
+    from app.main import app
+
+    if not any(getattr(route, "path", "").startswith(load_router.prefix) for route in app.routes):
+        app.include_router(load_router)
+    managers = {"redis": LocalRedis(latency), "postgres": LocalPostgres(latency), "mongo": LocalMongo(latency)}
+    for db, manager in managers.items():
+        setattr(app.state, db, manager)
+    app.state.db_ready = True
+    app.state.draining = False
+    setup_status_responses(app)
+    start_health_prober(app)
+    start_loop_monitor(app)
+    try:
+        yield app
+    finally:
+        if app.state.loop_monitor is not None:
+            await app.state.loop_monitor.stop()
+        await app.state.health_prober.stop()
+        for db in managers:
+            setattr(app.state, db, None)
+        app.state.db_ready = False
+
+
+def load_client(app=None, url=None, connections=100, timeout=10.0):
+    """httpx client sending to app in-process, or to the server at url"""
+    if app is not None:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=IN_PROCESS_URL, timeout=timeout)
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    return httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout)
+
+
+def percentile(ordered, fraction):
+    """Nearest rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = min(max(int(fraction * len(ordered) + 0.5), 1), len(ordered))
+    return ordered[rank - 1]
+
+
+class LatencyRecorder:
+    """Latency and outcome of every request of a run. Statuses of 400 and up count as errors."""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+
+    def record(self, latency, status=None, error=None):
+        self.latencies.append(latency)
+        if error is not None:
+            self.errors[error] += 1
+            return
+        self.statuses[status] += 1
+        if status >= 400:
+            self.errors[f"http_{status}"] += 1
+
+    def summary(self, duration):
+        ordered = sorted(self.latencies)
+        requests = len(ordered)
+        errors = sum(self.errors.values())
+        return {
+            "requests": requests,
+            "duration": round(duration, 3),
+            "throughput": round(requests / duration, 1) if duration else 0.0,
+            "errors": errors,
+            "error_rate": round(errors / requests, 6) if requests else 0.0,
+            "error_types": dict(self.errors),
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "latency_ms": {
+                **{name: round(percentile(ordered, fraction) * 1000, 3) for name, fraction in PERCENTILES.items()},
+                "mean": round(sum(ordered) / requests * 1000, 3) if requests else 0.0,
+                "max": round(ordered[-1] * 1000, 3) if requests else 0.0,
+            },
+        }
+
+
+async def _send(client, scenario, recorder, started):
+    try:
+        response = await client.get(scenario.next_path())
+        # Read the whole body, streamed responses are only done once it's received
+        await response.aread()
+    except httpx.HTTPError as exc:
+        recorder.record(time.perf_counter() - started, error=type(exc).__name__)
+        return
+    recorder.record(time.perf_counter() - started, status=response.status_code)
+
+
+async def closed_loop(client, scenario, concurrency, duration):
+    """concurrency workers each sending the next request as soon as the previous one is answered"""
+    recorder = LatencyRecorder()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await _send(client, scenario, recorder, time.perf_counter())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return recorder, time.perf_counter() - started
+
+
+async def open_loop(client, scenario, rps, duration, max_in_flight=10000):
+    """
+    Start rps requests per second on schedule, whether or not earlier ones were answered.
+    Latency is measured from the scheduled start, so a stalled event loop is charged to the
+    requests it delayed. Requests that would exceed max_in_flight are counted as dropped.
+    """
+    recorder = LatencyRecorder()
+    in_flight = set()
+    interval = 1.0 / rps
+    started = time.perf_counter()
+    for i in range(int(rps * duration)):
+        scheduled = started + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            recorder.record(0.0, error="dropped")
+            continue
+        task = asyncio.create_task(_send(client, scenario, recorder, scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return recorder, time.perf_counter() - started
+
+
+async def run_scenario(client, scenario, mode="closed", concurrency=16, rps=200, duration=5.0, warmup=1.0):
+    """Warm up (results discarded) then measure one scenario, returns its summary"""
+    async def run(seconds):
+        if mode == "open":
+            return await open_loop(client, scenario, rps, seconds)
+        return await closed_loop(client, scenario, concurrency, seconds)
+
+    if warmup > 0:
+        await run(warmup)
+    recorder, elapsed = await run(duration)
+    return recorder.summary(elapsed)
+
+
+async def run_load(scenarios, url=None, mode="closed", concurrency=16, rps=200, duration=5.0, warmup=1.0,
+                   latency=0.0005, timeout=10.0):
+    """Run every scenario in turn, in-process when url is None. Returns the JSON-able results."""
+    results = {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": url or "in-process",
+        "mode": mode,
+        "concurrency": concurrency if mode == "closed" else None,
+        "rps": rps if mode == "open" else None,
+        "duration": duration,
+        "python": platform.python_version(),
+        "scenarios": {},
+    }
+    if url is None:
+        async with local_app(latency) as app, load_client(app, timeout=timeout) as client:
+            for scenario in scenarios:
+                results["scenarios"][scenario.name] = await run_scenario(
+                    client, scenario, mode, concurrency, rps, duration, warmup
+                )
+    else:
+        async with load_client(url=url, connections=concurrency, timeout=timeout) as client:
+            for scenario in scenarios:
+                results["scenarios"][scenario.name] = await run_scenario(
+                    client, scenario, mode, concurrency, rps, duration, warmup
+                )
+    return results
+
+
+def compare_results(results, baseline, threshold=0.1, min_delta_ms=0.5, error_threshold=0.001,
+                    metrics=("p50", "p99")):
+    """
+    Regressions of results against baseline, as readable lines (empty when there are none).
+
+    A latency percentile regresses when it grew by more than threshold (a fraction) and by
+    more than min_delta_ms, so sub-millisecond noise doesn't fail a run. Throughput regresses
+    when it fell by more than threshold, the error rate when it rose by more than error_threshold.
+    Scenarios missing from either run are not compared.
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if previous is None:
+            continue
+        for metric in metrics:
+            before, after = previous["latency_ms"][metric], current["latency_ms"][metric]
+            if after > before * (1 + threshold) and after - before > min_delta_ms:
+                regressions.append(f"{name}: {metric} {before:.3f}ms -> {after:.3f}ms")
+        if results.get("mode") == "closed" and current["throughput"] < previous["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {previous['throughput']}/s -> {current['throughput']}/s")
+        if current["error_rate"] > previous["error_rate"] + error_threshold:
+            regressions.append(f"{name}: error rate {previous['error_rate']:.4%} -> {current['error_rate']:.4%}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{results['target']}, {results['mode']} loop, "
+          + (f"{results['concurrency']} concurrent" if results["mode"] == "closed" else f"{results['rps']} rps"))
+    print(f"{'scenario':<22} {'requests':>9} {'req/s':>9} {'errors':>7} "
+          + " ".join(f"{name + ' ms':>9}" for name in PERCENTILES))
+    for name, summary in results["scenarios"].items():
+        latency = summary["latency_ms"]
+        print(f"{name:<22} {summary['requests']:>9} {summary['throughput']:>9.1f} {summary['errors']:>7} "
+              + " ".join(f"{latency[percentile_name]:>9.3f}" for percentile_name in PERCENTILES))
+
+
+def _compare(results, args):
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare_results(results, baseline, args.threshold, args.min_delta_ms, args.error_threshold,
+                                  args.metrics)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regression against {args.baseline}")
+    return 1 if regressions else 0
+
+
+def main(args):
+    if args.command == "compare":
+        with open(args.results) as file:
+            return _compare(json.load(file), args)
+
+    # The app configures logging when it is imported, disabling outlasts that
+    logging.disable(logging.getLevelName(args.log_level) - 1)
+    names = args.scenario or [
+        name for name, scenario in SCENARIOS.items() if args.url is None or not scenario.local_only
+    ]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios {unknown}, choose from {list(SCENARIOS)}")
+    results = asyncio.run(run_load(
+        [SCENARIOS[name] for name in names], url=args.url, mode=args.mode, concurrency=args.concurrency,
+        rps=args.rps, duration=args.duration, warmup=args.warmup, latency=args.db_latency / 1000,
+        timeout=args.timeout
+    ))
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    return _compare(results, args) if args.baseline else 0
+
+
+def _add_compare_arguments(parser, baseline_required):
+    parser.add_argument("--baseline", required=baseline_required, help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Latency growth always allowed")
+    parser.add_argument("--error-threshold", type=float, default=0.001, help="Allowed error rate increase")
+    parser.add_argument("--metrics", nargs="+", default=["p50", "p99"], choices=list(PERCENTILES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run scenarios and report their latency")
+    run_parser.add_argument("--scenario", nargs="+", help=f"Scenarios to run, default all of {list(SCENARIOS)}")
+    run_parser.add_argument("--url", help="Live server, e.g. http://localhost:8000, in-process when not given")
+    run_parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight in closed loop")
+    run_parser.add_argument("--rps", type=float, default=200, help="Requests started per second in open loop")
+    run_parser.add_argument("--duration", type=float, default=5.0, help="Seconds measured per scenario")
+    run_parser.add_argument("--warmup", type=float, default=1.0, help="Seconds run before measuring")
+    run_parser.add_argument("--timeout", type=float, default=10.0)
+    run_parser.add_argument("--db-latency", type=float, default=0.5, help="Stand-in database round trip in ms")
+    run_parser.add_argument("--log-level", default="WARNING", help="Log records below this level are dropped")
+    run_parser.add_argument("--output", help="Write the results JSON here")
+    _add_compare_arguments(run_parser, baseline_required=False)
+
+    compare_parser = commands.add_parser("compare", help="Compare saved results to a baseline")
+    compare_parser.add_argument("results")
+    _add_compare_arguments(compare_parser, baseline_required=True)
+
+    sys.exit(main(parser.parse_args()))
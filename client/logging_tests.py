@@ -0,0 +1,128 @@
+import logging
+import os
+import tempfile
+import threading
+import unittest
+
+from app.core.logging_config import AsyncLogging, load_logging_config, trace_id_from_headers
+
+LOGGER_NAME = "client.logging_tests"
+
+
+class GatedHandler(logging.Handler):
+    """Handler that holds each record until the gate opens, like a stalled stdout or file lock"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+
+    def emit(self, record):
+        self.entered.set()
+        self.gate.wait(5)
+        self.records.append(record.getMessage())
+
+
+class AsyncLoggingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.handler = GatedHandler()
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.logger.handlers = [self.handler]
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, "handlers", [])
+
+    def start(self, policy):
+        async_logging = AsyncLogging(max_size=2, policy=policy, logger_names=(LOGGER_NAME,))
+        async_logging.start()
+        self.addCleanup(async_logging.stop)
+        self.addCleanup(self.handler.gate.set)
+        return async_logging
+
+    def test_full_queue_drops(self):
+        async_logging = self.start("drop")
+        self.logger.info("first")
+        self.assertTrue(self.handler.entered.wait(5))
+        # The listener holds "first", the queue takes two more
+        for i in range(10):
+            self.logger.info("record %s", i)
+        self.assertEqual(8, async_logging.dropped)
+        self.handler.gate.set()
+        async_logging.stop()
+        self.assertEqual(["first", "record 0", "record 1"], self.handler.records)
+        self.assertEqual([self.handler], self.logger.handlers)
+        self.assertEqual(8, async_logging.dropped)
+
+    def test_full_queue_blocks(self):
+        async_logging = self.start("block")
+        logged = threading.Event()
+
+        def log():
+            for i in range(10):
+                self.logger.info("record %s", i)
+            logged.set()
+
+        thread = threading.Thread(target=log)
+        thread.start()
+        self.assertTrue(self.handler.entered.wait(5))
+        self.assertFalse(logged.wait(0.05))
+        self.handler.gate.set()
+        thread.join(5)
+        async_logging.stop()
+        self.assertEqual([f"record {i}" for i in range(10)], self.handler.records)
+        self.assertEqual(0, async_logging.dropped)
+
+    def test_stop_drains_the_queue(self):
+        async_logging = self.start("drop")
+        self.handler.gate.set()
+        for i in range(2):
+            self.logger.info("record %s", i)
+        async_logging.stop()
+        self.assertEqual(["record 0", "record 1"], self.handler.records)
+        self.assertFalse(async_logging.running)
+
+
+class LoadLoggingConfigTestCase(unittest.TestCase):
+    def test_file_handlers_write_to_the_log_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log_directory = os.path.join(directory, "logs")
+            config = load_logging_config(log_directory=log_directory)
+            self.assertTrue(os.path.isdir(log_directory))
+        filenames = [handler["filename"] for handler in config["handlers"].values() if "filename" in handler]
+        self.assertTrue(filenames)
+        for filename in filenames:
+            self.assertEqual(log_directory, os.path.dirname(filename))
+
+
+class TraceIdFromHeadersTestCase(unittest.TestCase):
+    TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+    def test_valid_traceparent(self):
+        traceparent = f"00-{self.TRACE_ID}-00f067aa0ba902b7-01".encode()
+        self.assertEqual(self.TRACE_ID, trace_id_from_headers([(b"traceparent", traceparent)]))
+
+    def test_request_id_wins_over_traceparent(self):
+        headers = [(b"traceparent", f"00-{self.TRACE_ID}-00f067aa0ba902b7-01".encode()), (b"x-request-id", b"abc-1")]
+        self.assertEqual("abc-1", trace_id_from_headers(headers))
+
+    def test_malformed_headers(self):
+        for name, value in (
+            (b"traceparent", b"garbage"),
+            (b"traceparent", b"00-4bf92f3577b34da6-00f067aa0ba902b7-01"),
+            (b"traceparent", b"00-zzf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"),
+            (b"traceparent", b"00-00000000000000000000000000000000-00f067aa0ba902b7-01"),
+            (b"x-request-id", b""),
+            (b"x-request-id", b"a" * 129),
+            (b"x-request-id", b"abc\n1"),
+        ):
+            with self.subTest(name=name, value=value):
+                self.assertIsNone(trace_id_from_headers([(name, value)]))
+
+    def test_missing_headers(self):
+        self.assertIsNone(trace_id_from_headers([]))
+        self.assertIsNone(trace_id_from_headers([(b"accept", b"*/*")]))
+
+
+if __name__ == '__main__':
+    unittest.main()
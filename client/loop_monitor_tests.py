@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+import anyio.to_thread
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+
+from app.core import events
+from app.core.loop_monitor import LoopMonitor
+from app.core.metrics import render_prometheus
+
+
+def blocking_handler():
+    time.sleep(0.2)
+
+
+class LoopMonitorTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.monitor = LoopMonitor(interval=0.01, threshold=0.05, history=2)
+        self.monitor.start()
+        self.addAsyncCleanup(self.monitor.stop)
+
+    async def test_lag_is_sampled(self):
+        await asyncio.sleep(0.1)
+        self.assertGreater(self.monitor.lag.count, 3)
+        self.assertEqual(0, self.monitor.blocked)
+
+    async def test_blocking_stack_is_captured(self):
+        await asyncio.sleep(0.02)
+        blocking_handler()
+        await asyncio.sleep(0.03)
+        self.assertEqual(1, self.monitor.blocked)
+        self.assertGreaterEqual(self.monitor.max_lag, 0.15)
+        stack = "".join(self.monitor.stalls[-1]["stack"])
+        self.assertIn("blocking_handler", stack)
+        self.assertIn("time.sleep(0.2)", stack)
+
+    async def test_threadpool_saturation(self):
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        total_tokens = limiter.total_tokens
+        limiter.total_tokens = 1
+        try:
+            await asyncio.gather(*(run_in_threadpool(time.sleep, 0.05) for _ in range(3)))
+        finally:
+            limiter.total_tokens = total_tokens
+        self.assertGreater(self.monitor.threadpool_saturated, 0)
+
+    async def test_stop_joins_the_watchdog(self):
+        await self.monitor.stop()
+        self.assertIsNone(self.monitor._watchdog)
+        count = self.monitor.lag.count
+        await asyncio.sleep(0.03)
+        self.assertEqual(count, self.monitor.lag.count)
+
+    async def test_metrics(self):
+        await asyncio.sleep(0.03)
+        text = render_prometheus({}, loop_monitor=self.monitor)
+        self.assertIn("event_loop_lag_seconds_count", text)
+        self.assertIn("threadpool_saturated_total 0", text)
+
+
+class LifespanTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_startup_stops_the_monitor(self):
+        app = FastAPI()
+
+        async def startup(app):
+            app.state.async_logging = mock.Mock()
+            raise ConnectionError("database unreachable")
+
+        with mock.patch.object(events, "startup", startup):
+            with self.assertRaises(ConnectionError):
+                async with events.service_lifespan(app):
+                    pass
+        self.assertIsNone(app.state.loop_monitor._task)
+        self.assertNotIn("loop-watchdog", [thread.name for thread in threading.enumerate()])
+        app.state.async_logging.stop.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+
+from app.core import metrics
+from app.core.databases.resilience import CircuitBreaker
+from app.core.metrics import PoolStats, RequestMetrics, render_prometheus
+
+
+class LocalManager:
+    """Connection manager stand-in with fixed pool counters"""
+
+    def __init__(self):
+        self.pool_stats = PoolStats()
+        self.breaker = CircuitBreaker("local", 5, 30.0)
+
+    def stats(self):
+        return {
+            "size": 4, "in_use": self.pool_stats.in_use, "idle": 4 - self.pool_stats.in_use,
+            "waiters": self.pool_stats.waiters, "errors": self.pool_stats.errors, "breaker": self.breaker.to_dict(),
+        }
+
+
+class RenderPrometheusTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(metrics, "request_metrics", RequestMetrics(buckets=(0.1, 1.0)))
+        self.request_metrics = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_request_histograms(self):
+        self.request_metrics.observe("GET", "/items/{item_id}", 200, 0.05)
+        self.request_metrics.observe("GET", "/items/{item_id}", 200, 0.5)
+        self.request_metrics.observe("BREW", "/items/{item_id}", 405, 0.01)
+        self.request_metrics.observe("PROPFIND", "/items/{item_id}", 405, 0.01)
+        lines = render_prometheus({}).splitlines()
+        labels = 'method="GET",route="/items/{item_id}",status="200"'
+        self.assertEqual([
+            "# HELP http_request_duration_seconds HTTP request latency by route template",
+            "# TYPE http_request_duration_seconds histogram",
+            f'http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1',
+            f'http_request_duration_seconds_bucket{{{labels},le="1.0"}} 2',
+            f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+            f"http_request_duration_seconds_sum{{{labels}}} 0.55",
+            f"http_request_duration_seconds_count{{{labels}}} 2",
+        ], lines[:7])
+        # Unknown methods share one series
+        self.assertIn(
+            'http_request_duration_seconds_count{method="other",route="/items/{item_id}",status="405"} 2', lines
+        )
+
+    def test_pool_stats(self):
+        manager = LocalManager()
+        with manager.pool_stats.acquiring():
+            pass
+        with self.assertRaises(TimeoutError), manager.pool_stats.acquiring():
+            raise TimeoutError()
+        lines = render_prometheus({"postgres": manager}).splitlines()
+        for line in (
+            "# TYPE db_pool_size gauge",
+            'db_pool_size{db="postgres"} 4',
+            'db_pool_in_use{db="postgres"} 1',
+            'db_pool_idle{db="postgres"} 3',
+            'db_pool_waiters{db="postgres"} 0',
+            "# TYPE db_pool_errors_total counter",
+            'db_pool_errors_total{db="postgres"} 1',
+            'db_circuit_breaker_open{db="postgres"} 0',
+            'db_pool_acquire_wait_seconds_bucket{db="postgres",le="+Inf"} 2',
+            'db_pool_acquire_wait_seconds_count{db="postgres"} 2',
+        ):
+            self.assertIn(line, lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import unittest
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from app.core.databases.mongo_connection_manager import MongoConnectionManager
+from app.core.databases.resilience import CircuitOpenError
+
+
+class BulkResult:
+    def __init__(self, raw):
+        self.bulk_api_result = raw
+
+
+class LocalCollection:
+    """
+    Collection stand-in whose bulk_write answers with the next of outcomes, an exception to
+    raise or None to succeed, and succeeds once they run out
+    """
+
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.batches = []
+
+    async def bulk_write(self, batch, ordered):
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.batches.append(batch)
+        upserted = [
+            {"index": index, "_id": f"id-{len(self.batches)}-{index}"}
+            for index, operation in enumerate(batch) if isinstance(operation, UpdateOne)
+        ]
+        return BulkResult({
+            "nInserted": sum(isinstance(operation, InsertOne) for operation in batch),
+            "nUpserted": len(upserted),
+            "upserted": upserted,
+        })
+
+
+class LocalClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def build_manager(*outcomes, **options):
+    manager = MongoConnectionManager("user", "password", 27017, "test", **options)
+    manager.client = LocalClient()
+    manager.db = {"items": LocalCollection(outcomes)}
+    return manager
+
+
+class MongoBulkWriterTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_batches_by_count_and_bytes(self):
+        manager = build_manager()
+        writer = manager.bulk_writer("items", max_batch_ops=2)
+        for i in range(5):
+            writer.insert({"i": i})
+        summary = await writer.flush()
+        self.assertEqual([2, 2, 1], [len(batch) for batch in manager.db["items"].batches])
+        self.assertEqual(5, summary.inserted_count)
+        self.assertEqual(0, len(writer))
+
+        writer = manager.bulk_writer("items", max_batch_bytes=100)
+        for i in range(3):
+            writer.insert({"payload": "x" * 60})
+        self.assertEqual(3, (await writer.flush()).batches)
+
+    async def test_transient_error_requeues_the_batches(self):
+        manager = build_manager(AutoReconnect("connection reset"))
+        writer = manager.bulk_writer("items", ordered=True, max_batch_ops=2)
+        for i in range(3):
+            writer.insert({"i": i})
+        with self.assertRaises(AutoReconnect):
+            await writer.flush()
+        self.assertEqual(3, len(writer))
+        summary = await writer.flush()
+        self.assertEqual(3, summary.inserted_count)
+        self.assertEqual(0, len(writer))
+        self.assertEqual(3, writer.totals.inserted_count)
+
+    async def test_unordered_failure_doesnt_abort_other_batches(self):
+        manager = build_manager(None, AutoReconnect("connection reset"), None)
+        writer = manager.bulk_writer("items", max_batch_ops=2, max_concurrency=1)
+        for i in range(6):
+            writer.insert({"i": i})
+        with self.assertRaises(AutoReconnect):
+            await writer.flush()
+        self.assertEqual(4, writer.totals.inserted_count)
+        self.assertEqual([{"i": 2}, {"i": 3}], [operation._doc for operation in writer._operations])
+
+    async def test_each_failed_batch_is_kept_or_dropped_by_its_own_error(self):
+        for outcomes in (
+            (AutoReconnect("connection reset"), ValueError("not encodable")),
+            (ValueError("not encodable"), AutoReconnect("connection reset")),
+        ):
+            manager = build_manager(*outcomes)
+            writer = manager.bulk_writer("items", max_batch_ops=2, max_concurrency=1)
+            for i in range(4):
+                writer.insert({"i": i})
+            with self.assertRaises(type(outcomes[0])):
+                await writer.flush()
+            transient = 0 if isinstance(outcomes[0], AutoReconnect) else 1
+            self.assertEqual(
+                [{"i": 2 * transient}, {"i": 2 * transient + 1}], [operation._doc for operation in writer._operations]
+            )
+            self.assertEqual(2, writer.totals.unprocessed_count)
+
+    async def test_write_errors_are_not_requeued(self):
+        details = {"nInserted": 1, "writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}]}
+        manager = build_manager(BulkWriteError(details))
+        writer = manager.bulk_writer("items", ordered=True, max_batch_ops=2)
+        for i in range(4):
+            writer.insert({"i": i})
+        summary = await writer.flush()
+        self.assertFalse(summary.ok)
+        self.assertEqual(2, summary.unprocessed_count)
+        self.assertEqual(0, len(writer))
+        # Write errors count as the backend answering
+        self.assertEqual("closed", manager.breaker.state)
+
+    async def test_totals_offset_upserted_ids_and_errors(self):
+        details = {"writeErrors": [{"index": 0, "code": 11000, "errmsg": "duplicate key"}]}
+        manager = build_manager(None, BulkWriteError(details))
+        writer = manager.bulk_writer("items")
+        writer.insert({"i": 0})
+        writer.upsert({"i": 1}, {"$set": {"i": 1}})
+        await writer.flush()
+        writer.insert({"i": 2})
+        await writer.flush()
+        self.assertEqual(1, writer.totals.upserted_count)
+        self.assertEqual({1: "id-1-1"}, writer.totals.upserted_ids)
+        self.assertEqual([2], [error["index"] for error in writer.totals.write_errors])
+
+    async def test_open_breaker_keeps_operations_queued(self):
+        manager = build_manager(AutoReconnect("connection refused"), breaker_failure_threshold=1)
+        writer = manager.bulk_writer("items")
+        writer.insert({"i": 0})
+        with self.assertRaises(AutoReconnect):
+            await writer.flush()
+        with self.assertRaises(CircuitOpenError):
+            await writer.flush()
+        self.assertEqual(1, len(writer))
+        self.assertEqual([], manager.db["items"].batches)
+
+    async def test_close_drains_every_writer_and_closes_the_client(self):
+        manager = build_manager(ValueError("not encodable"))
+        client = manager.client
+        failing = manager.write_behind("items", flush_interval=60)
+        failing.insert({"i": 0})
+        draining = manager.write_behind("items", flush_interval=60)
+        draining.insert({"i": 1})
+        await manager.close()
+        self.assertTrue(client.closed)
+        self.assertIsNone(manager.client)
+        self.assertEqual(0, len(draining))
+        self.assertEqual(1, failing.totals.unprocessed_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
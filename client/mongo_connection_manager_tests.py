@@ -0,0 +1,89 @@
+import unittest
+
+from pymongo.errors import AutoReconnect
+
+from app.core.databases.mongo_connection_manager import MongoConnectionManager
+
+
+class LocalCursor:
+    """Motor cursor stand-in serving documents batch_size at a time, failing after fail_after when set"""
+
+    def __init__(self, documents, batch_size, fail_after=None):
+        self.documents = documents
+        self.batch_size = batch_size
+        self.fail_after = fail_after
+        self.fetched = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        for index, document in enumerate(self.documents):
+            if index == self.fail_after:
+                raise AutoReconnect("connection reset")
+            if index == self.fetched:
+                self.fetched += len(self.documents[index:index + self.batch_size])
+            yield document
+
+    async def close(self):
+        self.closed = True
+
+
+class LocalCollection:
+    def __init__(self, documents, fail_after=None):
+        self.documents = documents
+        self.fail_after = fail_after
+        self.cursors = []
+        self.find_calls = []
+
+    def find(self, query, projection=None, limit=0, batch_size=0, **kwargs):
+        self.find_calls.append({"query": query, "projection": projection, "limit": limit, "batch_size": batch_size,
+                                **kwargs})
+        documents = self.documents[:limit] if limit else self.documents
+        self.cursors.append(LocalCursor(documents, batch_size, self.fail_after))
+        return self.cursors[-1]
+
+
+def build_manager(documents, **options):
+    manager = MongoConnectionManager("user", "password", 27017, "test")
+    manager.db = {"items": LocalCollection(documents, **options)}
+    return manager
+
+
+class IterManyTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.documents = [{"_id": i, "name": f"item-{i}"} for i in range(100)]
+
+    async def test_options_are_passed_to_the_server(self):
+        manager = build_manager(self.documents)
+        documents = [document async for document in manager.iter_many(
+            "items", {"active": True}, projection={"name": 1}, batch_size=20, limit=50, sort=[("_id", 1)]
+        )]
+        self.assertEqual(self.documents[:50], documents)
+        collection = manager.db["items"]
+        self.assertEqual(
+            {"query": {"active": True}, "projection": {"name": 1}, "limit": 50, "batch_size": 20, "sort": [("_id", 1)]},
+            collection.find_calls[0]
+        )
+        self.assertTrue(collection.cursors[0].closed)
+
+    async def test_stopping_early_closes_the_cursor(self):
+        manager = build_manager(self.documents)
+        documents = manager.iter_many("items", {}, batch_size=10)
+        async for document in documents:
+            if document["_id"] == 2:
+                break
+        await documents.aclose()
+        cursor = manager.db["items"].cursors[0]
+        self.assertTrue(cursor.closed)
+        self.assertEqual(10, cursor.fetched)
+
+    async def test_transient_error_closes_the_cursor_and_counts_against_the_breaker(self):
+        manager = build_manager(self.documents, fail_after=15)
+        with self.assertRaises(AutoReconnect):
+            async for _ in manager.stream("items", {}, batch_size=10):
+                pass
+        self.assertTrue(manager.db["items"].cursors[0].closed)
+        self.assertEqual(1, manager.breaker.consecutive_failures)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import asyncio
+import itertools
+import unittest
+
+from app.core.databases.postgres_connection_manager import PostgresConnectionManager
+
+
+class LocalStatement:
+    def __init__(self, query):
+        self.query = query
+
+    async def fetchval(self, *args):
+        await asyncio.sleep(0)
+        return args[0] if args else None
+
+    async def executemany(self, args):
+        return f"EXECUTEMANY {len(list(args))}"
+
+
+class LocalTransaction:
+    def __init__(self, connection, options):
+        self.connection = connection
+        self.options = options
+
+    async def __aenter__(self):
+        self.connection.events.append("begin")
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.connection.events.append("commit" if exc_type is None else "rollback")
+
+
+class LocalCursor:
+    def __init__(self, connection, rows, prefetch):
+        self.connection = connection
+        self.rows = rows
+        self.prefetch = prefetch
+
+    async def __aiter__(self):
+        for start in range(0, len(self.rows), self.prefetch):
+            self.connection.fetched += len(self.rows[start:start + self.prefetch])
+            for row in self.rows[start:start + self.prefetch]:
+                yield row
+
+
+class LocalConnection:
+    """asyncpg connection stand-in recording what runs on it"""
+
+    pids = itertools.count(100)
+
+    def __init__(self):
+        self.pid = next(self.pids)
+        self.prepared = []
+        self.events = []
+        self.fetched = 0
+        self._termination_listeners = []
+
+    def get_server_pid(self):
+        return self.pid
+
+    async def prepare(self, query):
+        self.prepared.append(query)
+        return LocalStatement(query)
+
+    def add_termination_listener(self, callback):
+        self._termination_listeners.append(callback)
+
+    def terminate(self):
+        for callback in self._termination_listeners:
+            callback(self)
+
+    async def execute(self, query, *args):
+        self.events.append(query)
+        return "INSERT 0 1"
+
+    async def executemany(self, query, args):
+        self.events.append(f"executemany {len(list(args))}")
+
+    async def copy_records_to_table(self, table_name, records, columns=None, schema_name=None):
+        records = list(records)
+        self.events.append(f"copy {len(records)} to {table_name}")
+        return f"COPY {len(records)}"
+
+    def transaction(self, **options):
+        return LocalTransaction(self, options)
+
+    def cursor(self, query, *args, prefetch=None):
+        return LocalCursor(self, list(range(args[0])), prefetch)
+
+
+class LocalPool:
+    """asyncpg pool stand-in, opens a connection (running the init hook) when none is idle"""
+
+    def __init__(self, init):
+        self.init = init
+        self.connections = []
+        self.idle = []
+
+    async def acquire(self, timeout=None):
+        if self.idle:
+            return self.idle.pop()
+        connection = LocalConnection()
+        await self.init(connection)
+        self.connections.append(connection)
+        return connection
+
+    async def release(self, connection):
+        self.idle.append(connection)
+
+    def get_size(self):
+        return len(self.connections)
+
+    async def close(self):
+        pass
+
+
+def build_manager():
+    manager = PostgresConnectionManager("user", "password", 5432, "test")
+    manager.pool = LocalPool(manager._init_connection)
+    return manager
+
+
+class PostgresConnectionManagerTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.manager = build_manager()
+        self.pool = self.manager.pool
+
+    def assertReleased(self):
+        self.assertEqual(len(self.pool.connections), len(self.pool.idle))
+        self.assertEqual(0, self.manager.pool_stats.in_use)
+
+    async def test_queries_are_prepared_once_per_connection(self):
+        self.manager.register_query("echo", "SELECT $1::int")
+        self.assertEqual([1, 2], await asyncio.gather(
+            self.manager.fetchval_prepared("echo", 1), self.manager.fetchval_prepared("echo", 2)
+        ))
+        for _ in range(3):
+            self.assertEqual(3, await self.manager.fetchval_prepared("echo", 3))
+        self.assertEqual(2, len(self.pool.connections))
+        for connection in self.pool.connections:
+            self.assertEqual(["SELECT $1::int"], connection.prepared)
+        self.assertEqual({connection.pid for connection in self.pool.connections}, set(self.manager._prepared))
+        self.assertReleased()
+
+    async def test_query_registered_later_is_prepared_on_first_use(self):
+        await self.manager.execute("SELECT 1")
+        self.manager.register_query("echo", "SELECT $1::int")
+        await self.manager.fetchval_prepared("echo", 1)
+        await self.manager.fetchval_prepared("echo", 1)
+        self.assertEqual(["SELECT $1::int"], self.pool.connections[0].prepared)
+
+    async def test_terminated_connection_drops_its_statements(self):
+        self.manager.register_query("echo", "SELECT $1::int")
+        await self.manager.fetchval_prepared("echo", 1)
+        connection = self.pool.connections[0]
+        self.assertIn(connection.pid, self.manager._prepared)
+        connection.terminate()
+        self.assertEqual({}, self.manager._prepared)
+
+    async def test_bulk_operations_pin_one_connection(self):
+        self.manager.register_query("insert", "INSERT INTO items VALUES ($1)")
+        await self.manager.executemany("INSERT INTO items VALUES ($1)", [(1,), (2,)])
+        self.assertEqual("EXECUTEMANY 3", await self.manager.executemany_prepared("insert", [(1,), (2,), (3,)]))
+        self.assertEqual("COPY 3", await self.manager.copy_records_to_table("items", [(1,), (2,), (3,)]))
+        self.assertEqual(1, len(self.pool.connections))
+        self.assertEqual(["executemany 2", "copy 3 to items"], self.pool.connections[0].events)
+        self.assertReleased()
+
+    async def test_transaction_commits_or_rolls_back(self):
+        async with self.manager.transaction() as connection:
+            await connection.execute("UPDATE items SET price = 1")
+            await connection.execute("UPDATE items SET price = 2")
+        with self.assertRaises(ValueError):
+            async with self.manager.transaction() as connection:
+                raise ValueError("bad row")
+        self.assertEqual(
+            ["begin", "UPDATE items SET price = 1", "UPDATE items SET price = 2", "commit", "begin", "rollback"],
+            connection.events
+        )
+        self.assertReleased()
+
+    async def test_iter_rows_reads_ahead_by_prefetch(self):
+        rows = [row async for row in self.manager.iter_rows("SELECT generate_series(0, $1 - 1)", 25, prefetch=10)]
+        self.assertEqual(list(range(25)), rows)
+        self.assertEqual(["begin", "commit"], self.pool.connections[0].events)
+        self.assertReleased()
+
+    async def test_stopping_iter_rows_early_releases_the_connection(self):
+        rows = self.manager.iter_rows("SELECT generate_series(0, $1 - 1)", 1000, prefetch=10)
+        async for row in rows:
+            if row == 2:
+                break
+        await rows.aclose()
+        connection = self.pool.connections[0]
+        self.assertEqual(10, connection.fetched)
+        self.assertEqual(["begin", "rollback"], connection.events)
+        self.assertReleased()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.middleware import ProfilerMiddleware
+from app.core.profiler import LOOP_BUSY, WAITING, ProfileStore, RequestProfiler
+from app.core.response_factory import ResponseFactory
+
+TOKEN = "secret-token"
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def build_app(store, **options):
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        spin(0.03)
+        await asyncio.sleep(0.03)
+        return ResponseFactory.json_response({"done": True})
+
+    @app.get("/fast")
+    async def fast():
+        return ResponseFactory.json_response({"done": True})
+
+    app.add_middleware(ProfilerMiddleware, store=store, interval=0.002, **options)
+    return app
+
+
+def names(profile, stack):
+    frames = profile["shared"]["frames"]
+    return [frames[index]["name"] for index in stack]
+
+
+class RequestProfilerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_running_and_waiting_samples(self):
+        async def request():
+            spin(0.03)
+            await asyncio.sleep(0.03)
+
+        task = asyncio.ensure_future(request())
+        profiler = RequestProfiler(task, interval=0.002)
+        profiler.start()
+        await task
+        profiler.stop()
+        profiler.join()
+        profile = profiler.to_speedscope("request")
+        stacks = [names(profile, stack) for stack in profile["profiles"][0]["samples"]]
+        self.assertTrue(any(stack[-1] == "spin" for stack in stacks))
+        self.assertTrue(any(stack[-1] == WAITING[0] for stack in stacks))
+        # Running samples start at the task's coroutine, not in the event loop internals
+        self.assertTrue(all(stack[0].endswith("request") for stack in stacks))
+        self.assertAlmostEqual(profiler.duration, sum(profile["profiles"][0]["weights"]), delta=0.01)
+
+    async def test_queued_behind_another_task(self):
+        async def request():
+            await asyncio.sleep(0.005)
+
+        async def other():
+            await asyncio.sleep(0)
+            spin(0.03)
+
+        task = asyncio.ensure_future(request())
+        profiler = RequestProfiler(task, interval=0.002)
+        profiler.start()
+        await asyncio.gather(task, other())
+        profiler.stop()
+        profiler.join()
+        self.assertIn(LOOP_BUSY, [stack[-1] for stack in profiler.samples])
+
+
+class ProfileStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ProfileStore(self.directory.name, max_profiles=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ring_buffer_keeps_the_newest(self):
+        saved = []
+        for i in range(3):
+            name = self.store.new_name(f"trace-{i}")
+            self.store.save(name, {"i": i})
+            saved.append(name)
+            time.sleep(0.002)
+        self.assertEqual(saved[1:], self.store.list())
+
+    def test_names_are_checked(self):
+        name = self.store.new_name("abc/../../etc")
+        self.assertEqual(os.path.join(self.directory.name, name), self.store.path(name))
+        self.assertIsNone(self.store.path("../secrets.speedscope.json"))
+        self.assertIsNone(self.store.path("settings.py"))
+
+
+class ProfilerMiddlewareTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ProfileStore(self.directory.name, max_profiles=5)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def get(self, path, headers=None, **options):
+        transport = httpx.ASGITransport(app=build_app(self.store, **options))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    async def test_not_triggered(self):
+        response = await self.get("/slow", token=TOKEN)
+        self.assertNotIn("x-profile-id", response.headers)
+        response = await self.get("/slow", headers={"X-Profile": "wrong"}, token=TOKEN)
+        self.assertNotIn("x-profile-id", response.headers)
+        self.assertEqual([], self.store.list())
+
+    async def test_header_with_token(self):
+        response = await self.get("/slow", headers={"X-Profile": TOKEN}, token=TOKEN)
+        self.assertEqual(200, response.status_code)
+        name = response.headers["x-profile-id"]
+        self.assertEqual([name], self.store.list())
+        with open(self.store.path(name)) as file:
+            profile = json.load(file)
+        self.assertEqual("GET /slow", profile["name"])
+        stacks = [names(profile, stack) for stack in profile["profiles"][0]["samples"]]
+        self.assertTrue(any("spin" in stack for stack in stacks))
+
+    async def test_route_sampling_rate(self):
+        await self.get("/fast", route_rates={"/slow": 1.0})
+        self.assertEqual([], self.store.list())
+        response = await self.get("/slow", route_rates={"/slow": 1.0})
+        self.assertEqual([response.headers["x-profile-id"]], self.store.list())
+        await self.get("/slow", route_rates={"/slow": 0.0})
+        self.assertEqual(1, len(self.store.list()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import asyncio
+import unittest
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.core.databases.redis_connection_manager import RedisConnectionManager
+
+
+class LocalPipeline:
+    def __init__(self, client, transaction):
+        self.client = client
+        self.transaction = transaction
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    def set(self, key, value, ex=None):
+        self.commands.append(("SET", key, value, ex))
+
+    def __len__(self):
+        return len(self.commands)
+
+    async def execute(self):
+        self.client.calls.append(("PIPELINE", list(self.commands)))
+        for _, key, value, _ in self.commands:
+            self.client.data[key] = value
+        return [True] * len(self.commands)
+
+
+class LocalClient:
+    """redis.asyncio.Redis stand-in recording every round trip"""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+        self.error = None
+
+    async def mget(self, keys):
+        self.calls.append(("MGET", list(keys)))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return [self.data.get(key) for key in keys]
+
+    async def get(self, key):
+        self.calls.append(("GET", key))
+        return self.data.get(key)
+
+    async def mset(self, mapping):
+        self.calls.append(("MSET", dict(mapping)))
+        self.data.update(mapping)
+        return True
+
+    def pipeline(self, transaction=False):
+        return LocalPipeline(self, transaction)
+
+
+def build_manager(**options):
+    manager = RedisConnectionManager(None, None, 6379, "0", retry_attempts=1, **options)
+    manager.client = LocalClient()
+    return manager
+
+
+class GetBatcherTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.manager = build_manager(auto_batch=True)
+        self.client = self.manager.client
+        self.client.data = {"a": "1", "b": "2", "c": "3"}
+
+    async def test_concurrent_gets_share_one_mget(self):
+        values = await asyncio.gather(*(self.manager.get(key) for key in ("a", "b", "a", "missing")))
+        self.assertEqual(["1", "2", "1", None], values)
+        self.assertEqual([("MGET", ["a", "b", "missing"])], self.client.calls)
+
+    async def test_batches_are_split_at_max_batch(self):
+        self.manager._batcher.max_batch = 2
+        self.assertEqual(["1", "2", "3"], await asyncio.gather(*(self.manager.get(key) for key in "abc")))
+        self.assertEqual([("MGET", ["a", "b"]), ("MGET", ["c"])], self.client.calls)
+
+    async def test_gets_in_later_ticks_are_new_batches(self):
+        self.assertEqual("1", await self.manager.get("a"))
+        self.assertEqual("2", await self.manager.get("b"))
+        self.assertEqual([("MGET", ["a"]), ("MGET", ["b"])], self.client.calls)
+
+    async def test_error_reaches_every_waiter(self):
+        self.client.error = RedisConnectionError("connection reset")
+        results = await asyncio.gather(*(self.manager.get(key) for key in ("a", "b", "a")), return_exceptions=True)
+        self.assertEqual(3, len(results))
+        for result in results:
+            self.assertIs(self.client.error, result)
+        self.client.error = None
+        self.assertEqual("1", await self.manager.get("a"))
+
+    async def test_without_auto_batch_gets_are_sent_as_they_are(self):
+        manager = build_manager()
+        manager.client.data = {"a": "1"}
+        self.assertEqual(["1", None], await asyncio.gather(manager.get("a"), manager.get("b")))
+        self.assertEqual([("GET", "a"), ("GET", "b")], manager.client.calls)
+
+
+class MultiKeyTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.manager = build_manager()
+        self.client = self.manager.client
+
+    async def test_mget(self):
+        self.client.data = {"a": "1"}
+        self.assertEqual(["1", None], await self.manager.mget("a", "b"))
+        self.assertEqual([], await self.manager.mget())
+        self.assertEqual([("MGET", ["a", "b"])], self.client.calls)
+
+    async def test_mset(self):
+        self.assertTrue(await self.manager.mset({"a": "1", "b": "2"}))
+        self.assertTrue(await self.manager.mset({}))
+        self.assertEqual([("MSET", {"a": "1", "b": "2"})], self.client.calls)
+
+    async def test_mset_with_expiry_pipelines_sets(self):
+        self.assertTrue(await self.manager.mset({"a": "1", "b": "2"}, ex=60))
+        self.assertEqual([("PIPELINE", [("SET", "a", "1", 60), ("SET", "b", "2", 60)])], self.client.calls)
+        self.assertEqual({"a": "1", "b": "2"}, self.client.data)
+
+    async def test_pipeline_results(self):
+        async with self.manager.pipeline() as pipe:
+            pipe.set("a", "1")
+            pipe.set("b", "2")
+            self.assertEqual(2, len(pipe))
+        self.assertEqual([True, True], pipe.results)
+        async with self.manager.pipeline() as pipe:
+            pass
+        self.assertEqual([], pipe.results)
+        self.assertEqual(1, len(self.client.calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
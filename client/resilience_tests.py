@@ -0,0 +1,133 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from app.core.databases.base_connection_manager import BaseConnectionManager
+from app.core.databases.resilience import CircuitBreaker, CircuitOpenError, OperationTimeoutError
+
+
+class LocalBackend:
+    """Backend stand-in that fails, hangs or answers on demand"""
+
+    def __init__(self):
+        self.failures = 0
+        self.delay = 0
+        self.calls = 0
+
+    async def query(self):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionResetError("connection reset by peer")
+        await asyncio.sleep(self.delay)
+        return "row"
+
+    async def bad_query(self):
+        self.calls += 1
+        raise ValueError("syntax error")
+
+
+class LocalConnectionManager(BaseConnectionManager):
+    def _get_name(self):
+        return "local"
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def ping(self):
+        return True
+
+
+class ResilienceTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = LocalBackend()
+        self.manager = LocalConnectionManager(
+            None, None, 0, "local", operation_timeout=0.2, retry_attempts=3, retry_base_delay=0.001,
+            retry_max_delay=0.01, breaker_failure_threshold=3, breaker_reset_timeout=0.05
+        )
+
+    async def test_idempotent_operations_are_retried(self):
+        self.backend.failures = 2
+        self.assertEqual("row", await self.manager._call(self.backend.query, idempotent=True))
+        self.assertEqual(3, self.backend.calls)
+        self.assertEqual("closed", self.manager.breaker.state)
+
+    async def test_other_operations_are_not_retried(self):
+        self.backend.failures = 1
+        with self.assertRaises(ConnectionResetError):
+            await self.manager._call(self.backend.query)
+        self.assertEqual(1, self.backend.calls)
+
+    async def test_retries_give_up_after_attempts(self):
+        self.backend.failures = 5
+        with self.assertRaises(ConnectionResetError):
+            await self.manager._call(self.backend.query, idempotent=True)
+        self.assertEqual(3, self.backend.calls)
+
+    async def test_deadline(self):
+        self.backend.delay = 1
+        with self.assertRaises(OperationTimeoutError):
+            await self.manager._call(self.backend.query, idempotent=True, timeout=0.05)
+
+    async def test_breaker_fails_fast_then_recovers(self):
+        self.backend.failures = 3
+        for _ in range(3):
+            with self.assertRaises(ConnectionResetError):
+                await self.manager._call(self.backend.query)
+        self.assertEqual("open", self.manager.breaker.state)
+        with self.assertRaises(CircuitOpenError):
+            await self.manager._call(self.backend.query, idempotent=True)
+        self.assertEqual(3, self.backend.calls)
+        self.assertEqual("open", self.manager.stats()["breaker"]["state"])
+
+        await asyncio.sleep(0.06)
+        self.assertEqual("row", await self.manager._call(self.backend.query))
+        self.assertEqual("closed", self.manager.breaker.state)
+
+    async def test_failed_trial_reopens(self):
+        self.manager.breaker.record_failure()
+        self.manager.breaker.record_failure()
+        self.manager.breaker.record_failure()
+        await asyncio.sleep(0.06)
+        self.backend.failures = 1
+        with self.assertRaises(ConnectionResetError):
+            await self.manager._call(self.backend.query, idempotent=True)
+        self.assertEqual(1, self.backend.calls)
+        self.assertEqual("open", self.manager.breaker.state)
+
+    async def test_query_errors_do_not_trip_the_breaker(self):
+        for _ in range(5):
+            with self.assertRaises(ValueError):
+                await self.manager._call(self.backend.bad_query, idempotent=True)
+        self.assertEqual(5, self.backend.calls)
+        self.assertEqual("closed", self.manager.breaker.state)
+
+    async def test_pile_up_is_bounded_by_the_breaker(self):
+        self.backend.delay = 1
+        results = await asyncio.gather(
+            *(self.manager._call(self.backend.query, timeout=0.02) for _ in range(3)), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, OperationTimeoutError) for result in results))
+        with self.assertRaises(CircuitOpenError):
+            await self.manager._call(self.backend.query)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def test_half_open_allows_one_trial(self):
+        breaker = CircuitBreaker("local", failure_threshold=1, reset_timeout=10)
+        breaker.record_failure()
+        with mock.patch("app.core.databases.resilience.time.monotonic", return_value=breaker._opened_at + 11):
+            breaker.before_call()
+            self.assertEqual("half_open", breaker.state)
+            with self.assertRaises(CircuitOpenError):
+                breaker.before_call()
+            breaker.record_cancelled()
+            breaker.before_call()
+        self.assertEqual(1, breaker.rejected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import PurePosixPath
+
+import orjson
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.core.response_factory import ResponseFactory, dumps_json
+
+
+class JSONEncodingTestCase(unittest.TestCase):
+    def test_types_orjson_doesnt_know(self):
+        object_id = ObjectId()
+        body = {
+            "_id": object_id,
+            "price": Decimal("1.50"),
+            "count": Decimal("3"),
+            "tags": {"a"},
+            "path": PurePosixPath("/srv/data"),
+            "ttl": timedelta(seconds=90),
+        }
+        self.assertEqual(
+            {"_id": str(object_id), "price": 1.5, "count": 3, "tags": ["a"], "path": "/srv/data", "ttl": 90.0},
+            orjson.loads(dumps_json(body))
+        )
+
+    def test_bytes_that_are_not_utf8(self):
+        self.assertEqual({"raw": "ok\ufffd"}, orjson.loads(dumps_json({"raw": b"ok\xff"})))
+
+    def test_unknown_types_fail(self):
+        class Unknown:
+            __slots__ = ()
+
+        with self.assertRaises(ValueError):
+            dumps_json({"value": Unknown()})
+
+
+class ErrorResponseTestCase(unittest.TestCase):
+    def test_raises_the_http_exception(self):
+        with self.assertRaises(HTTPException) as raised:
+            ResponseFactory.error_response(status_code=429, detail="Slow down", headers={"Retry-After": "1"})
+        self.assertEqual(429, raised.exception.status_code)
+        self.assertEqual("Slow down", raised.exception.detail)
+        self.assertEqual({"Retry-After": "1"}, raised.exception.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
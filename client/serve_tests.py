@@ -0,0 +1,51 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import httpx
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServeTestCase(unittest.TestCase):
+    """python -m app.serve as the container runs it, with two workers"""
+
+    def test_two_workers_answer(self):
+        port = free_port()
+        with tempfile.TemporaryDirectory() as log_directory:
+            env = {
+                **os.environ, "WORKERS": "2", "INTERNAL_PORT": str(port), "LOG_DIRECTORY": log_directory,
+                "LIMIT_MAX_REQUESTS": "1000", "LIMIT_MAX_REQUESTS_JITTER": "100",
+            }
+            server = subprocess.Popen(
+                [sys.executable, "-m", "app.serve"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                response = None
+                deadline = time.perf_counter() + 30
+                while response is None and time.perf_counter() < deadline:
+                    try:
+                        response = httpx.get(f"http://127.0.0.1:{port}/health/live")
+                    except httpx.TransportError:
+                        time.sleep(0.2)
+                self.assertIsNotNone(response, "the server didn't answer within 30s")
+                self.assertEqual(200, response.status_code)
+            finally:
+                server.terminate()
+                server.wait(30)
+            with open(os.path.join(log_directory, "app.log")) as file:
+                log = file.read()
+        self.assertIn("Starting 2 worker(s)", log)
+        self.assertEqual(2, log.count("Started server process"))
+
+
+if __name__ == '__main__':
+    unittest.main()
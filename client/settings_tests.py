@@ -0,0 +1,41 @@
+import os
+import unittest
+from unittest import mock
+
+from app.models.settings import Settings
+
+
+class DatabaseSettingsTestCase(unittest.TestCase):
+    def test_options_come_from_the_database_prefix(self):
+        settings = Settings(
+            postgres_port="5432", postgres_user="service", postgres_db="items",
+            postgres_host="db.internal", postgres_max_pool_size="20", postgres_keepalive="false",
+            redis_port="6379", redis_auto_batch="true",
+        )
+        postgres = settings.databases["postgres"]
+        self.assertEqual((5432, "service", "items", "db.internal"),
+                         (postgres.port, postgres.user, postgres.db_name, postgres.host))
+        self.assertEqual(20, postgres.max_pool_size)
+        self.assertFalse(postgres.keepalive)
+        self.assertTrue(settings.databases["redis"].auto_batch)
+        self.assertNotIn("mongo", settings.databases)
+
+    def test_defaults_ignore_bare_environment_variables(self):
+        with mock.patch.dict(os.environ, {"HOST": "elsewhere", "KEEPALIVE": "false", "MAX_POOL_SIZE": "1"}):
+            settings = Settings(redis_port="6379")
+        redis = settings.databases["redis"]
+        self.assertEqual("redis", redis.db_name)
+        self.assertEqual({
+            "min_pool_size": 5, "max_pool_size": 10, "acquire_timeout": 10.0, "idle_timeout": 300.0,
+            "statement_cache_size": 100, "keepalive": True, "operation_timeout": 10.0, "retry_attempts": 3,
+            "retry_base_delay": 0.05, "retry_max_delay": 1.0, "breaker_failure_threshold": 5,
+            "breaker_reset_timeout": 30.0,
+        }, redis.manager_options())
+
+    def test_pool_bounds_are_checked(self):
+        with self.assertRaises(ValueError):
+            Settings(postgres_port="5432", postgres_min_pool_size="20", postgres_max_pool_size="10")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import signal
+import time
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.core.events import restore_signal_handlers, setup_signal_handlers, shutdown
+from app.core.middleware import in_flight_requests
+
+
+class GracefulShutdownTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.app = FastAPI()
+        self.app.state.draining = False
+        self.app.state.signal_forwarded = False
+        # The server's own handler, which stops accepting connections
+        self.forwarded = []
+        self.addCleanup(signal.signal, signal.SIGTERM, signal.getsignal(signal.SIGTERM))
+        signal.signal(signal.SIGTERM, lambda sig, frame: self.forwarded.append(time.perf_counter()))
+        patcher = mock.patch.multiple(settings, shutdown_delay=0.1, shutdown_drain_timeout=2.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        setup_signal_handlers(self.app)
+        self.addCleanup(restore_signal_handlers, self.app)
+
+    async def test_signal_is_forwarded_after_the_delay(self):
+        signaled = time.perf_counter()
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(0.01)
+        # Readiness fails at once, the server keeps accepting until shutdown_delay passed
+        self.assertTrue(self.app.state.draining)
+        self.assertEqual([], self.forwarded)
+        await asyncio.sleep(0.15)
+        self.assertEqual(1, len(self.forwarded))
+        self.assertGreaterEqual(self.forwarded[0] - signaled, 0.1)
+
+    async def test_second_signal_goes_straight_through(self):
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(0.01)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(0.01)
+        self.assertEqual(1, len(self.forwarded))
+        await asyncio.sleep(0.15)
+        # The delayed forward sees the signal was passed on already
+        self.assertEqual(1, len(self.forwarded))
+
+    async def test_shutdown_waits_for_in_flight_requests(self):
+        in_flight_requests.started()
+        asyncio.get_running_loop().call_later(0.1, in_flight_requests.finished)
+        started = time.perf_counter()
+        with self.assertLogs("app.core.events", "INFO") as logs:
+            await shutdown(self.app)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.1)
+        self.assertEqual(0, in_flight_requests.count)
+        self.assertTrue(any("Drained in flight requests" in line for line in logs.output))
+        # The server's handler is back in place
+        self.assertNotIn(signal.SIGTERM, self.app.state.previous_signal_handlers)
+
+    async def test_shutdown_gives_up_after_the_drain_timeout(self):
+        settings.shutdown_drain_timeout = 0.05
+        in_flight_requests.started()
+        self.addCleanup(in_flight_requests.finished)
+        with self.assertLogs("app.core.events", "WARNING") as logs:
+            await shutdown(self.app)
+        self.assertIn("Gave up on 1 in flight requests", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()